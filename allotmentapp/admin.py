@@ -1,5 +1,8 @@
 from django.contrib import admin
-from .models import Student, Department, Pathway, Course,Batch,CoursePreference,Course_type,CourseAllotment
+from .models import Student, Department, Pathway, Course,Batch,CoursePreference,Course_type,CourseAllotment,BatchWaitlist,AllocationRun,ActiveAllocationRun,AllocationRunPhase,BatchCutoff,BackgroundJob,SwapRequest,SwapHistory,CourseChangeRequest,CourseChangeHistory,SpotRound,SpotClaim
+from .runs import publish_run
+from .integrity import reconcile_allotments
+from django.core.exceptions import ValidationError
 from import_export import resources, fields
 from import_export.admin import ImportExportModelAdmin
 from django.contrib import admin
@@ -44,12 +47,90 @@ class StudentResource(resources.ModelResource):
 class StudentAdmin(ImportExportModelAdmin):
     resource_class = StudentResource
 
+
+class AllocationRunPhaseInline(admin.TabularInline):
+    model = AllocationRunPhase
+    extra = 0
+    readonly_fields = ('position', 'name', 'seconds', 'queries', 'rows_read', 'rows_written', 'allotments', 'peak_memory_kb')
+    can_delete = False
+
+
+@admin.register(AllocationRun)
+class AllocationRunAdmin(admin.ModelAdmin):
+    list_display = ('id', 'semester', 'academic_year', 'status', 'strategy', 'total_allotments', 'passes_saved', 'created_at', 'published_at')
+    list_filter = ('status', 'strategy', 'semester', 'academic_year')
+    inlines = [AllocationRunPhaseInline]
+    actions = ['publish_selected_run']
+
+    @admin.action(description="Publish selected run")
+    def publish_selected_run(self, request, queryset):
+        if queryset.count() != 1:
+            self.message_user(request, "Select exactly one run to publish.", level='error')
+            return
+        try:
+            publish_run(queryset.get())
+            self.message_user(request, "Run published.")
+        except ValidationError as e:
+            self.message_user(request, "; ".join(e.messages), level='error')
+
+@admin.register(Batch)
+class BatchAdmin(admin.ModelAdmin):
+    list_display = ('course', 'year', 'part', 'status', 'seats_taken')
+    list_filter = ('year', 'part', 'status')
+    actions = ['reconcile_seats']
+
+    @admin.action(description="Recount seats and remove duplicate allotments")
+    def reconcile_seats(self, request, queryset):
+        result = reconcile_allotments(batches=queryset, fix=True)
+        self.message_user(
+            request,
+            f"Recounted {len(result['drift'])} drifted batch(es) and removed "
+            f"{len(result['duplicates'])} duplicate allotment(s)."
+        )
+
+@admin.register(BackgroundJob)
+class BackgroundJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'kind', 'status', 'progress', 'phase', 'attempts', 'created_at', 'finished_at')
+    list_filter = ('kind', 'status')
+    readonly_fields = ('progress', 'phase', 'result', 'error', 'attempts', 'started_at', 'heartbeat_at', 'finished_at')
+
+@admin.register(SwapRequest)
+class SwapRequestAdmin(admin.ModelAdmin):
+    list_display = ('id', 'student', 'paper_no', 'offered_batch', 'wanted_batch', 'status', 'created_at', 'resolved_at')
+    list_filter = ('status', 'offered_batch__course__semester')
+    search_fields = ('student__admission_number', 'student__name')
+
+@admin.register(SwapHistory)
+class SwapHistoryAdmin(admin.ModelAdmin):
+    list_display = ('cycle', 'student', 'paper_no', 'old_batch', 'new_batch', 'swapped_by', 'swapped_at')
+    search_fields = ('student__admission_number', 'student__name')
+
+@admin.register(CourseChangeRequest)
+class CourseChangeRequestAdmin(admin.ModelAdmin):
+    list_display = ('id', 'student', 'paper_no', 'current_batch', 'new_batch', 'status', 'outcome', 'created_at')
+    list_filter = ('status', 'current_batch__course__semester')
+    search_fields = ('student__admission_number', 'student__name')
+
+@admin.register(CourseChangeHistory)
+class CourseChangeHistoryAdmin(admin.ModelAdmin):
+    list_display = ('student', 'paper_no', 'old_batch', 'new_batch', 'changed_by', 'changed_at')
+    search_fields = ('student__admission_number', 'student__name')
+
+@admin.register(SpotClaim)
+class SpotClaimAdmin(admin.ModelAdmin):
+    list_display = ('spot_round', 'student', 'paper_no', 'batch', 'claimed_at')
+    list_filter = ('spot_round',)
+    search_fields = ('student__admission_number', 'student__name')
+
 # Register each model
 
 admin.site.register(Department)
 admin.site.register(Pathway)
 admin.site.register(Course)
-admin.site.register(Batch)
 admin.site.register(CoursePreference)
 admin.site.register(Course_type)
 admin.site.register(CourseAllotment)
+admin.site.register(BatchWaitlist)
+admin.site.register(ActiveAllocationRun)
+admin.site.register(BatchCutoff)
+admin.site.register(SpotRound)
@@ -0,0 +1,1041 @@
+"""
+In-memory course allocation engine.
+
+The cohort (students, preferences, batches, seat limits and quota settings) is
+loaded once into an AllocationSnapshot. AllocationEngine then runs the same
+paper-by-paper passes as the original per-student implementation in plain
+Python structures, and save_allocation() writes the outcome into a new
+AllocationRun with bulk inserts; the run goes live when it is published.
+A run's strategy picks its engine from ALLOCATION_ENGINES; the greedy
+AllocationEngine is the default.
+
+The parts of a course in one academic year share their seats: a student who
+gets any part of the course is seated in its least-filled open part, so new
+sections can be opened for an oversubscribed course without anyone
+re-ranking their preferences.
+
+Direct papers on which every student lists a single batch are written by the
+database itself: one INSERT ... SELECT seats each batch's students in
+admission number order up to its free seats with a window function, and a
+second one waitlists the rest (see save_direct_paper()).
+"""
+import heapq
+import time
+from collections import Counter
+from contextlib import contextmanager
+from functools import partial
+
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+from django.db.models import Case, Count, F, IntegerField, Q, Value, When, Window
+from django.db.models.functions import RowNumber
+
+from .models import (
+    Student, CoursePreference, Batch, CourseAllotment, AllocationSettings,
+    BatchWaitlist, AllocationRun, BatchCutoff
+)
+from .decisions import ALLOTTED, FALLBACK, FULL, HELD, INACTIVE, UNPLACED, DecisionLog
+from .events import STUDENT_EVENT_EVERY, AllocationEventReporter
+from .profiling import AllocationProfiler
+from .ranking import CohortRanking, get_merit_marks
+from .streaming import iter_rows
+from .runs import get_active_run, publish_run
+
+BULK_BATCH_SIZE = 1000
+
+# allocate_quota_paper used to filter with ``admission_category__in="General"``,
+# which Django expands character by character and therefore never matches a
+# student. The group is kept as-is so allocation results stay identical.
+GENERAL_QUOTA_CATEGORIES = tuple("General")
+SC_ST_QUOTA_CATEGORIES = ("SC", "ST")
+OTHER_QUOTA_CATEGORIES = ("EWS", "Sports", "Management")
+QUOTA_CATEGORY_GROUPS = (GENERAL_QUOTA_CATEGORIES, SC_ST_QUOTA_CATEGORIES, OTHER_QUOTA_CATEGORIES)
+
+
+def get_target_admission_year(semester, academic_year):
+    """Admission year of the cohort that sits `semester` in `academic_year`"""
+    start_year = int(academic_year.split('-')[0])
+    return start_year - (semester - 1) // 2
+
+
+def get_allocation_phases(semester):
+    """
+    Ordered allocation phases for a semester as (kind, paper numbers).
+    'direct' papers go in admission number order, 'merit' papers in merit
+    order and 'quota' papers through the department quota pass.
+    """
+    if semester in [1, 2]:
+        return [('direct', [1]), ('merit', [2, 3]), ('quota', [4])]
+    elif semester == 3:
+        return [('direct', [1, 2]), ('merit', [3, 4]), ('quota', [5, 6])]
+    return []
+
+
+def get_fallback_course_type(semester, paper_no):
+    """Course type prefix used to place students whose quota preferences are full"""
+    if (semester in [1, 2] and paper_no == 4) or (semester == 3 and paper_no == 5):
+        return 'MDC'
+    elif semester == 3 and paper_no == 6:
+        return 'VAC'
+    return ''
+
+
+def get_quota_categories(setting):
+    """Admission category groups and their seat quota for one department"""
+    return list(zip(QUOTA_CATEGORY_GROUPS, (
+        setting.calculate_general_quota(),
+        setting.calculate_sc_st_quota(),
+        setting.calculate_other_quota(),
+    )))
+
+
+class StudentState:
+    """Fields of a Student that allocation decisions depend on"""
+    __slots__ = (
+        'id', 'admission_number', 'name', 'department_id', 'admission_category',
+        'normalized_marks', 'first_sem_marks',
+    )
+
+    def __init__(self, id, admission_number, name, department_id, admission_category,
+                 normalized_marks, first_sem_marks):
+        self.id = id
+        self.admission_number = admission_number
+        self.name = name
+        self.department_id = department_id
+        self.admission_category = admission_category
+        self.normalized_marks = normalized_marks
+        self.first_sem_marks = first_sem_marks
+
+
+class BatchState:
+    """Fields of a Batch (and its course) that allocation decisions depend on"""
+    __slots__ = (
+        'id', 'course_id', 'course_code', 'course_name', 'year', 'part',
+        'status', 'seats_taken', 'seat_limit', 'course_type', 'semester',
+    )
+
+    def __init__(self, id, course_id, course_code, course_name, year, part,
+                 status, seats_taken, seat_limit, course_type, semester):
+        self.id = id
+        self.course_id = course_id
+        self.course_code = course_code
+        self.course_name = course_name
+        self.year = year
+        self.part = part
+        self.status = status
+        self.seats_taken = seats_taken
+        self.seat_limit = seat_limit
+        self.course_type = course_type
+        self.semester = semester
+
+    def copy(self):
+        return BatchState(*(getattr(self, field) for field in self.__slots__))
+
+
+BATCH_STATE_FIELDS = (
+    'id', 'course_id', 'course__course_code', 'course__course_name',
+    'year', 'part', 'status', 'seats_taken', 'course__seat_limit',
+    'course__course_type__name', 'course__semester'
+)
+
+
+class AllocationCatalog:
+    """
+    Every batch with its course and the allocation settings, loaded once and
+    shared by the snapshots of several cohorts. Snapshots take copies of the
+    batches, so the catalog itself never changes.
+    """
+
+    def __init__(self, batches, settings):
+        # {batch_id: BatchState} in id order
+        self.batches = batches
+        # AllocationSettings rows in primary key order
+        self.settings = settings
+
+    @classmethod
+    def load(cls):
+        batches = {
+            row[0]: BatchState(*row)
+            for row in Batch.objects.order_by('id').values_list(*BATCH_STATE_FIELDS)
+        }
+        return cls(batches, list(AllocationSettings.objects.order_by('pk')))
+
+
+class AllocationSnapshot:
+    """
+    Read-only copy of everything one allocation run needs.
+
+    By default the snapshot reflects the state allocate_courses() starts from:
+    allotments of the cohort for this semester and academic year are left out
+    and the semester's batches for that year start with no seats taken.
+    Nothing in the database is modified by loading it.
+    """
+
+    def __init__(self, semester, academic_year, students, preferences, batches,
+                 existing_allotments, settings):
+        self.semester = semester
+        self.academic_year = academic_year
+        # Students in admission number order
+        self.students = students
+        # {(student_id, paper_no): [batch_id, ...]} in preference order
+        self.preferences = preferences
+        # {batch_id: BatchState}
+        self.batches = batches
+        # [(student_id, paper_no, batch_id)] the run starts with
+        self.existing_allotments = existing_allotments
+        # AllocationSettings rows in primary key order
+        self.settings = settings
+        # Database rows the snapshot holds
+        self.rows_read = (
+            len(students) + sum(len(batch_ids) for batch_ids in preferences.values()) +
+            len(existing_allotments) + len(batches) + len(settings)
+        )
+        # Merit order and preference matrices, built once per cohort
+        self.ranking = CohortRanking(semester, students, preferences)
+        # {batch_id: (batch_id, ...)} of every part of its course and year,
+        # for courses split into more than one part
+        parts = {}
+        for batch in batches.values():
+            parts.setdefault((batch.course_id, batch.year), []).append(batch.id)
+        self.course_parts = {
+            batch_id: batch_ids
+            for batch_ids in map(tuple, parts.values()) if len(batch_ids) > 1
+            for batch_id in batch_ids
+        }
+
+    @classmethod
+    def load(cls, semester, academic_year, reset=True, catalog=None):
+        """
+        :param reset: If False, keep the cohort's allotments for this academic
+            year and the current seat counts instead of starting from scratch
+        :param catalog: Optional AllocationCatalog to take batches and settings
+            from instead of querying them
+        """
+        target_admission_year = get_target_admission_year(semester, academic_year)
+
+        # Cohort rows are read in keyset chunks so only the compact state
+        # below grows with the cohort, never a cached queryset
+        students = [
+            StudentState(student_id, admission_number, *fields)
+            for admission_number, student_id, *fields in iter_rows(
+                Student.objects.filter(
+                    current_sem=semester,
+                    admission_year=target_admission_year
+                ).values_list(
+                    'admission_number', 'id', 'name', 'department_id',
+                    'admission_category', 'normalized_marks', 'first_sem_marks'
+                ),
+                key='admission_number'
+            )
+        ]
+
+        cohort_preferences = CoursePreference.objects.filter(
+            student__current_sem=semester,
+            student__admission_year=target_admission_year
+        )
+        preferences = {}
+        for _, student_id, paper_no, preference_number, batch_id in iter_rows(
+            cohort_preferences.values_list('id', 'student_id', 'paper_no', 'preference_number', 'batch_id')
+        ):
+            preferences.setdefault((student_id, paper_no), []).append((preference_number, batch_id))
+        for key, ranked in preferences.items():
+            ranked.sort()
+            preferences[key] = [batch_id for preference_number, batch_id in ranked]
+
+        existing_allotments = CourseAllotment.objects.filter(
+            student__current_sem=semester,
+            student__admission_year=target_admission_year,
+            batch__course__semester=semester
+        )
+        # Seats the live run holds outside the semester's own batches are
+        # handed back too, since publishing the new run replaces all of them
+        replaced_seats = {}
+        if reset:
+            existing_allotments = existing_allotments.exclude(batch__year=academic_year)
+            active_run = get_active_run(semester, academic_year)
+            if active_run:
+                existing_allotments = existing_allotments.exclude(run=active_run)
+                replaced_seats = dict(
+                    active_run.allotments.exclude(batch__course__semester=semester, batch__year=academic_year)
+                    .order_by().values_list('batch_id').annotate(count=Count('id'))
+                )
+        existing_allotments = list(existing_allotments.values_list('student_id', 'paper_no', 'batch_id'))
+
+        if catalog is None:
+            cohort_batches = (
+                BatchState(*row) for row in Batch.objects.filter(
+                    Q(course__semester=semester) |
+                    Q(id__in=cohort_preferences.values('batch_id'))
+                ).order_by('id').values_list(*BATCH_STATE_FIELDS)
+            )
+            settings = list(AllocationSettings.objects.order_by('pk'))
+        else:
+            listed = {batch_id for batch_ids in preferences.values() for batch_id in batch_ids}
+            cohort_batches = (
+                batch.copy() for batch in catalog.batches.values()
+                if batch.semester == semester or batch.id in listed
+            )
+            settings = catalog.settings
+
+        batches = {}
+        for batch in cohort_batches:
+            if reset and batch.semester == semester and batch.year == academic_year:
+                batch.seats_taken = 0
+            elif batch.id in replaced_seats:
+                batch.seats_taken -= replaced_seats[batch.id]
+            batches[batch.id] = batch
+
+        return cls(semester, academic_year, students, preferences, batches,
+                   existing_allotments, settings)
+
+
+class AllocationEngine:
+    """
+    Runs the allocation passes for one snapshot without touching the database.
+    Seat counts and allotments are tracked on the engine, so one snapshot can
+    back any number of engines.
+
+    :param seat_limits: Optional {course_id: seat_limit} overriding Course.seat_limit
+    :param settings: Optional AllocationSettings list replacing the snapshot's
+    :param profiler: Optional AllocationProfiler recording every pass
+    :param decision_log: Optional DecisionLog recording every decision
+    :param events: Optional AllocationEventReporter told about passes, progress and full batches
+    """
+
+    def __init__(self, snapshot, seat_limits=None, settings=None, profiler=None, decision_log=None, events=None):
+        self.snapshot = snapshot
+        self.profiler = profiler or AllocationProfiler(enabled=False)
+        self.decision_log = decision_log
+        self.events = events
+        self.semester = snapshot.semester
+        self.ranking = snapshot.ranking
+        self.settings = snapshot.settings if settings is None else settings
+        self.seat_limits = {
+            batch_id: batch.seat_limit
+            for batch_id, batch in snapshot.batches.items()
+        }
+        if seat_limits:
+            for batch_id, batch in snapshot.batches.items():
+                if batch.course_id in seat_limits:
+                    self.seat_limits[batch_id] = seat_limits[batch.course_id]
+        self.seats_taken = {
+            batch_id: batch.seats_taken
+            for batch_id, batch in snapshot.batches.items()
+        }
+        # Papers and batches held by each student, indexed by cohort position
+        count = len(snapshot.students)
+        self.allotted_papers = [set() for _ in range(count)]
+        self.allotted_batches = [set() for _ in range(count)]
+        positions = self.ranking.positions
+        for student_id, paper_no, batch_id in snapshot.existing_allotments:
+            self.allotted_papers[positions[student_id]].add(paper_no)
+            self.allotted_batches[positions[student_id]].add(batch_id)
+        # New allotments as (student_id, batch_id, paper_no), in allocation order
+        self.allotments = []
+        # Full batches students passed over, as (student_id, batch_id, paper_no,
+        # preference_rank) in the order the allocation reached them
+        self.waitlist = []
+        self._waitlisted = set()
+        # {course type prefix: (heap of (seats_taken, batch_id), {batch_id, ...})}
+        self._fallback_heaps = {}
+        # The same for the active parts of split courses, by their course_parts tuple
+        self._part_heaps = {}
+        self._quota_order = None
+
+    def passes(self):
+        """Ordered (name, callable) passes of a full run, one per profiled phase"""
+        ranking = self.ranking
+        for kind, papers in get_allocation_phases(self.semester):
+            for paper_no in papers:
+                if kind == 'quota':
+                    yield f"Paper {paper_no} quota", partial(self.quota_pass, paper_no)
+                    yield f"Paper {paper_no} fallback", partial(self.fallback_pass, paper_no)
+                else:
+                    order = ranking.direct_order if kind == 'direct' else ranking.merit_order
+                    yield f"Paper {paper_no} {kind}", partial(self.paper_pass, paper_no, order)
+
+    def run(self, start=0, on_pass=None):
+        """
+        :param start: Number of passes already applied, e.g. by replay()
+        :param on_pass: Optional callable(passes_done, name) run after every pass
+        """
+        passes = list(self.passes())
+        for done, (name, allocate) in enumerate(passes, start=1):
+            if done <= start:
+                continue
+            if self.decision_log:
+                self.decision_log.start_pass(done)
+            if self.events:
+                self.events.phase_started(done, len(passes), name)
+            with self._phase(name):
+                allocate()
+            if on_pass:
+                on_pass(done, name)
+        return self
+
+    @contextmanager
+    def _phase(self, name):
+        made = len(self.allotments)
+        with self.profiler.phase(name) as record:
+            yield record
+            record['allotments'] = len(self.allotments) - made
+
+    def paper_pass(self, paper_no, order):
+        for index in self._tracked(order):
+            self.allocate_paper(index, paper_no)
+
+    def quota_pass(self, paper_no):
+        """Department quotas for an MDC/VAC paper"""
+        for index in self._tracked(self.quota_order()):
+            self.allocate_paper(index, paper_no)
+
+    def fallback_pass(self, paper_no):
+        """Everyone left after the quotas, falling back to any open batch of the type"""
+        for index in self._tracked(self.ranking.merit_order):
+            self.allocate_paper(index, paper_no, allow_any_available=True)
+
+    def _tracked(self, order):
+        """A pass's cohort positions, reporting every STUDENT_EVENT_EVERY students when events are on"""
+        if self.events is None:
+            return order
+        return self._iter_tracked(order)
+
+    def _iter_tracked(self, order):
+        students = len(order)
+        for processed, index in enumerate(order, start=1):
+            yield index
+            if processed % STUDENT_EVENT_EVERY == 0 or processed == students:
+                self.events.students_processed(processed, students)
+
+    def replay(self, allotments, waitlist):
+        """
+        Re-apply the allotments and waitlist entries an earlier engine made on
+        the same snapshot, as (student_id, batch_id, paper_no) and
+        (student_id, batch_id, paper_no, preference_rank) in their original order.
+        """
+        positions = self.ranking.positions
+        for student_id, batch_id, paper_no in allotments:
+            self._assign(positions[student_id], batch_id, paper_no)
+        for student_id, batch_id, paper_no, rank in waitlist:
+            self._waitlist(positions[student_id], batch_id, paper_no, rank)
+        return self
+
+    def quota_order(self):
+        """
+        Cohort positions the quota pass visits: for each settings row and
+        category group, the department's top students of that group by merit,
+        up to the group's quota. The cohort is bucketed by (department,
+        category group) in one merit-ordered pass and reused for every quota paper.
+        """
+        if self._quota_order is None:
+            students = self.snapshot.students
+            groups_of = {}
+            buckets = {}
+            for index in self.ranking.merit_order:
+                student = students[index]
+                category = student.admission_category
+                if category not in groups_of:
+                    groups_of[category] = [
+                        group for group, categories in enumerate(QUOTA_CATEGORY_GROUPS)
+                        if category in categories
+                    ]
+                for group in groups_of[category]:
+                    buckets.setdefault((student.department_id, group), []).append(index)
+
+            self._quota_order = []
+            for setting in self.settings:
+                for group, (_, quota) in enumerate(get_quota_categories(setting)):
+                    if quota > 0:
+                        self._quota_order.extend(buckets.get((setting.department_id, group), ())[:quota])
+        return self._quota_order
+
+    def allocate_paper(self, index, paper_no, allow_any_available=False):
+        """
+        Allocate a specific paper for a student
+        :param index: Student position in the cohort
+        :param paper_no: Paper number (1-6)
+        :param allow_any_available: If True, can allocate any available course of the correct type
+        """
+        if paper_no in self.allotted_papers[index]:
+            return True
+
+        allotted_batch_ids = self._held_batches(index)
+        batches = self.snapshot.batches
+        log = self.decision_log
+        student_id = self.ranking.student_ids[index]
+
+        for rank, batch_id in enumerate(self.ranking.preferences_for(index, paper_no), start=1):
+            batch = batches[batch_id]
+            seats_left = self.seat_limits[batch_id] - self.seats_taken[batch_id]
+            if not batch.status or batch_id in allotted_batch_ids:
+                if log:
+                    log.record(student_id, batch_id, seats_left, paper_no, rank,
+                               HELD if batch.status else INACTIVE)
+                continue
+            seat_id = self._seat_for(batch_id, allotted_batch_ids)
+            if seat_id != batch_id:
+                seats_left = self.seat_limits[seat_id] - self.seats_taken[seat_id]
+            if self._takes_seat(index, batch_id, seats_left):
+                if log:
+                    log.record(student_id, seat_id, seats_left, paper_no, rank, ALLOTTED)
+                self._assign(index, seat_id, paper_no)
+                return True
+            if log:
+                log.record(student_id, batch_id, seats_left, paper_no, rank, FULL)
+            self._waitlist(index, batch_id, paper_no, rank)
+
+        if allow_any_available:
+            course_type_prefix = get_fallback_course_type(self.semester, paper_no)
+            if course_type_prefix:
+                best = self._least_loaded_batch(course_type_prefix, allotted_batch_ids)
+                if best is not None:
+                    if log:
+                        log.record(student_id, best, self.seat_limits[best] - self.seats_taken[best],
+                                   paper_no, 0, FALLBACK)
+                    self._assign(index, best, paper_no)
+                    return True
+
+        if log:
+            log.record(student_id, 0, 0, paper_no, 0, UNPLACED)
+        return False
+
+    def _takes_seat(self, index, batch_id, seats_left):
+        """Whether a student gets an open batch they may take; greedily, any seat left will do"""
+        return seats_left > 0
+
+    def _held_batches(self, index):
+        """
+        Batches a student cannot be seated in: the ones they hold and every
+        other part of those batches' courses
+        """
+        held = self.allotted_batches[index]
+        course_parts = self.snapshot.course_parts
+        split = [course_parts[batch_id] for batch_id in held if batch_id in course_parts]
+        return held.union(*split) if split else held
+
+    def _seat_for(self, batch_id, excluded):
+        """
+        Batch that takes a seat given for `batch_id`: the least-filled open part
+        of its course outside `excluded`, or the batch itself when its course
+        has a single part or every other part is full
+        """
+        if batch_id not in self.snapshot.course_parts:
+            return batch_id
+        best = self._least_loaded(self._part_heap(batch_id), excluded)
+        return batch_id if best is None else best
+
+    def _part_heap(self, batch_id):
+        """Min-heap of (seats_taken, batch_id) over the active parts of a split course, with their ids"""
+        parts = self.snapshot.course_parts[batch_id]
+        entry = self._part_heaps.get(parts)
+        if entry is None:
+            batch_ids = {part_id for part_id in parts if self.snapshot.batches[part_id].status}
+            heap = [(self.seats_taken[part_id], part_id) for part_id in batch_ids]
+            heapq.heapify(heap)
+            entry = self._part_heaps[parts] = (heap, batch_ids)
+        return entry
+
+    def _fallback_heap(self, course_type_prefix):
+        """
+        Min-heap of (seats_taken, batch_id) over the semester's active batches
+        whose course type has the given prefix, with the set of its batch ids
+        """
+        entry = self._fallback_heaps.get(course_type_prefix)
+        if entry is None:
+            batch_ids = {
+                batch_id for batch_id, batch in self.snapshot.batches.items()
+                if batch.semester == self.semester and batch.status and
+                batch.course_type.startswith(course_type_prefix)
+            }
+            heap = [(self.seats_taken[batch_id], batch_id) for batch_id in batch_ids]
+            heapq.heapify(heap)
+            entry = self._fallback_heaps[course_type_prefix] = (heap, batch_ids)
+        return entry
+
+    def _least_loaded_batch(self, course_type_prefix, excluded):
+        """Open batch of a course type with the fewest seats taken that is not in `excluded`"""
+        return self._least_loaded(self._fallback_heap(course_type_prefix), excluded)
+
+    def _least_loaded(self, entry, excluded):
+        """
+        Open batch of a heap with the fewest seats taken, lowest id first on
+        ties, that is not in `excluded`; None if there is none.
+
+        Heap entries are refreshed lazily: an entry whose seat count is out of
+        date is re-pushed with the current count when it reaches the top, and
+        full batches are dropped until _free_seat() puts them back.
+        """
+        heap, batch_ids = entry
+        skipped = []
+        best = None
+        while heap:
+            seats_taken, batch_id = heap[0]
+            current = self.seats_taken[batch_id]
+            if seats_taken != current:
+                heapq.heapreplace(heap, (current, batch_id))
+            elif current >= self.seat_limits[batch_id]:
+                heapq.heappop(heap)
+            elif batch_id in excluded:
+                skipped.append(heapq.heappop(heap))
+            else:
+                best = batch_id
+                break
+        for item in skipped:
+            heapq.heappush(heap, item)
+        return best
+
+    def _free_seat(self, batch_id):
+        """Give a seat back to a batch and return it to the heaps it belongs to"""
+        self.seats_taken[batch_id] -= 1
+        for heap, batch_ids in (*self._fallback_heaps.values(), *self._part_heaps.values()):
+            if batch_id in batch_ids:
+                heapq.heappush(heap, (self.seats_taken[batch_id], batch_id))
+
+    def _waitlist(self, index, batch_id, paper_no, rank):
+        key = (index, batch_id, paper_no)
+        if key not in self._waitlisted:
+            self._waitlisted.add(key)
+            self.waitlist.append((self.ranking.student_ids[index], batch_id, paper_no, rank))
+
+    def _assign(self, index, batch_id, paper_no):
+        self.allotments.append((self.ranking.student_ids[index], batch_id, paper_no))
+        self.allotted_papers[index].add(paper_no)
+        self.allotted_batches[index].add(batch_id)
+        self.seats_taken[batch_id] += 1
+        if self.events and self.seats_taken[batch_id] == self.seat_limits[batch_id]:
+            self.events.batch_filled(self.snapshot.batches[batch_id], self.seat_limits[batch_id])
+
+    def changed_batch_ids(self):
+        """Batches whose seat count differs from the snapshot"""
+        return [
+            batch_id for batch_id, batch in self.snapshot.batches.items()
+            if self.seats_taken[batch_id] != batch.seats_taken
+        ]
+
+
+class DeferredAcceptanceEngine(AllocationEngine):
+    """
+    Student-proposing deferred acceptance for the preference passes.
+
+    A direct, merit or quota pass is settled before anything is recorded:
+    students propose down their preference lists and every batch keeps the
+    proposers it ranks highest in a heap bounded by its free seats, bouncing
+    its lowest-ranked holder when a better proposal arrives. Each preference
+    is proposed to at most once, so a pass is one sweep over the proposals
+    with a heap operation each. The settled matching is then recorded in the
+    pass order through allocate_paper(), so waitlists, decision logs and
+    events mean what they do for the greedy engine. The fallback pass, which
+    ignores preferences, stays greedy.
+
+    The parts of a split course hold their proposers in one heap bounded by
+    the free seats of all its parts; recording then seats each student in the
+    least-filled part, as the greedy engine does.
+
+    Batches rank students with batch_priority(). By default that is the pass
+    order for every batch, for which deferred acceptance settles on exactly
+    the greedy engine's allotments; subclasses override it to let batches
+    rank students their own way.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # {cohort position: batch_id} settled for the pass being recorded
+        self._matched = None
+
+    def batch_priority(self, batch_id, position, index):
+        """Rank of the student at cohort position `index` for a batch, lower first"""
+        return position
+
+    def paper_pass(self, paper_no, order):
+        self._matched = self.settle(paper_no, order)
+        try:
+            super().paper_pass(paper_no, order)
+        finally:
+            self._matched = None
+
+    def quota_pass(self, paper_no):
+        self._matched = self.settle(paper_no, self.quota_order())
+        try:
+            super().quota_pass(paper_no)
+        finally:
+            self._matched = None
+
+    def _takes_seat(self, index, batch_id, seats_left):
+        if self._matched is None:
+            return super()._takes_seat(index, batch_id, seats_left)
+        return seats_left > 0 and self._matched.get(index) == batch_id
+
+    def settle(self, paper_no, order):
+        """{cohort position: batch_id} the pass's students hold once no proposal is left"""
+        # First position of every student still without the paper
+        positions = {}
+        for position, index in enumerate(order):
+            if index not in positions and paper_no not in self.allotted_papers[index]:
+                positions[index] = position
+
+        batches = self.snapshot.batches
+        course_parts = self.snapshot.course_parts
+        preferences_for = self.ranking.preferences_for
+        # {batch_id or course_parts tuple: heap of (-priority, index)}, the lowest-ranked holder on top
+        holders = {}
+        matched = {}
+        next_rank = dict.fromkeys(positions, 0)
+        proposing = list(positions)
+        while proposing:
+            index = proposing.pop()
+            preferences = preferences_for(index, paper_no)
+            allotted_batch_ids = self._held_batches(index)
+            rank = next_rank[index]
+            while rank < len(preferences):
+                batch_id = preferences[rank]
+                rank += 1
+                if not batches[batch_id].status or batch_id in allotted_batch_ids:
+                    continue
+                parts = course_parts.get(batch_id)
+                if parts is None:
+                    seats = self.seat_limits[batch_id] - self.seats_taken[batch_id]
+                else:
+                    seats = sum(
+                        max(self.seat_limits[part_id] - self.seats_taken[part_id], 0)
+                        for part_id in parts if batches[part_id].status
+                    )
+                if seats <= 0:
+                    continue
+                heap = holders.setdefault(parts or batch_id, [])
+                entry = (-self.batch_priority(batch_id, positions[index], index), index)
+                if len(heap) < seats:
+                    heapq.heappush(heap, entry)
+                elif entry > heap[0]:
+                    bumped = heapq.heapreplace(heap, entry)[1]
+                    del matched[bumped]
+                    proposing.append(bumped)
+                else:
+                    continue
+                matched[index] = batch_id
+                break
+            next_rank[index] = rank
+        return matched
+
+
+# Engines a run can be built with, by AllocationRun.strategy
+ALLOCATION_ENGINES = {
+    AllocationRun.GREEDY: AllocationEngine,
+    AllocationRun.DEFERRED_ACCEPTANCE: DeferredAcceptanceEngine,
+}
+
+
+def get_allocation_engine(strategy):
+    """Engine class of a strategy name"""
+    try:
+        return ALLOCATION_ENGINES[strategy]
+    except KeyError:
+        raise ValueError(f"Unknown allocation strategy {strategy!r}")
+
+
+def build_allocation_report(engine):
+    """
+    Summarise an engine's outcome: seat fill of every batch in the semester
+    and the students left without one or more papers.
+    """
+    snapshot = engine.snapshot
+    batches = []
+    for batch in snapshot.batches.values():
+        seats_taken = engine.seats_taken[batch.id]
+        seat_limit = engine.seat_limits[batch.id]
+        in_scope = batch.semester == snapshot.semester and batch.year == snapshot.academic_year
+        if not in_scope and seats_taken == batch.seats_taken:
+            continue
+        batches.append({
+            'course_code': batch.course_code,
+            'course_name': batch.course_name,
+            'year': batch.year,
+            'part': batch.part,
+            'status': batch.status,
+            'seats_taken': seats_taken,
+            'seat_limit': seat_limit,
+            'fill_percentage': round(seats_taken / seat_limit * 100, 2) if seat_limit else 0,
+        })
+    batches.sort(key=lambda row: (row['course_code'], row['year'], row['part']))
+
+    papers = [paper_no for kind, paper_nos in get_allocation_phases(snapshot.semester) for paper_no in paper_nos]
+    unallocated = []
+    for index, student in enumerate(snapshot.students):
+        missing = [paper_no for paper_no in papers if paper_no not in engine.allotted_papers[index]]
+        if missing:
+            unallocated.append({
+                'admission_number': student.admission_number,
+                'name': student.name,
+                'missing_papers': missing,
+            })
+
+    return {
+        'semester': snapshot.semester,
+        'academic_year': snapshot.academic_year,
+        'total_students': len(snapshot.students),
+        'total_allotments': len(engine.allotments),
+        'batches': batches,
+        'unallocated': unallocated,
+    }
+
+
+def simulate_allocation(semester, academic_year, strategy=AllocationRun.GREEDY):
+    """
+    Run the full allocation for a semester against a read-only snapshot.
+    Nothing is written; the report from build_allocation_report() is returned
+    with load and allocation timings in seconds.
+    """
+    started = time.perf_counter()
+    snapshot = AllocationSnapshot.load(semester, academic_year)
+    loaded = time.perf_counter()
+    engine = get_allocation_engine(strategy)(snapshot).run()
+    finished = time.perf_counter()
+
+    report = build_allocation_report(engine)
+    report['load_seconds'] = round(loaded - started, 3)
+    report['allocation_seconds'] = round(finished - loaded, 3)
+    return report
+
+
+def get_set_based_papers(engine):
+    """
+    Direct papers the database can allocate on its own, as a set: every
+    student lists one batch for the paper, outside any split course, and
+    holds neither the paper nor that batch already. The pass then seats the
+    students of each open batch in admission number order while seats last
+    and waitlists the rest, which a window function does in one statement.
+    """
+    if type(engine) not in ALLOCATION_ENGINES.values():
+        return set()
+    snapshot = engine.snapshot
+    held_papers = {(student_id, paper_no) for student_id, paper_no, batch_id in snapshot.existing_allotments}
+    held = {(student_id, batch_id) for student_id, paper_no, batch_id in snapshot.existing_allotments}
+    papers = set()
+    for kind, paper_nos in get_allocation_phases(snapshot.semester):
+        if kind != 'direct':
+            continue
+        for paper_no in paper_nos:
+            listed = [
+                (student_id, batch_ids) for (student_id, listed_paper), batch_ids in snapshot.preferences.items()
+                if listed_paper == paper_no
+            ]
+            if all(
+                len(batch_ids) == 1 and batch_ids[0] not in snapshot.course_parts and
+                (student_id, paper_no) not in held_papers and (student_id, batch_ids[0]) not in held
+                for student_id, batch_ids in listed
+            ):
+                papers.add(paper_no)
+            # A later direct paper must not list a batch this one may seat the student in
+            held |= {(student_id, batch_ids[0]) for student_id, batch_ids in listed if batch_ids}
+    return papers
+
+
+def save_direct_paper(engine, run, paper_no, allotments, waitlist):
+    """
+    Write a set-based direct paper's pass with two INSERT ... SELECT
+    statements, then check the database seated exactly the students the
+    engine did: preferences changed since the snapshot was loaded fail the run.
+
+    :param allotments: The engine's (student_id, batch_id, paper_no) rows for the paper
+    :param waitlist: The engine's (position, (student_id, batch_id, paper_no, rank)) rows for the paper
+    """
+    snapshot = engine.snapshot
+    direct_papers = {
+        number for kind, paper_nos in get_allocation_phases(snapshot.semester)
+        if kind == 'direct' for number in paper_nos
+    }
+    # Seats taken when the pass started, including earlier direct papers'
+    taken = Counter(
+        batch_id for student_id, batch_id, number in engine.allotments
+        if number in direct_papers and number < paper_no
+    )
+    listed = {
+        batch_ids[0] for (student_id, number), batch_ids in snapshot.preferences.items() if number == paper_no
+    }
+    free_seats = [
+        When(batch_id=batch_id, then=Value(max(
+            engine.seat_limits[batch_id] - snapshot.batches[batch_id].seats_taken - taken[batch_id], 0
+        )))
+        for batch_id in sorted(listed) if snapshot.batches[batch_id].status
+    ]
+    if free_seats:
+        ranked = CoursePreference.objects.filter(
+            student__current_sem=snapshot.semester,
+            student__admission_year=get_target_admission_year(snapshot.semester, snapshot.academic_year),
+            paper_no=paper_no,
+            batch__status=True
+        ).values(
+            ranked_student=F('student_id'),
+            ranked_batch=F('batch_id'),
+            admission=F('student__admission_number'),
+            seat=Window(RowNumber(), partition_by=[F('batch_id')], order_by=F('student__admission_number').asc()),
+            free=Case(*free_seats, default=Value(0), output_field=IntegerField()),
+        )
+        inner, params = ranked.query.get_compiler(connection=connection).as_sql()
+        quote = connection.ops.quote_name
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {quote(CourseAllotment._meta.db_table)} "
+                f"({quote('student_id')}, {quote('batch_id')}, {quote('paper_no')}, {quote('run_id')}) "
+                f"SELECT ranked_student, ranked_batch, %s, %s FROM ({inner}) ranked "
+                f"WHERE seat <= free ORDER BY admission",
+                [paper_no, run.pk, *params]
+            )
+            first_position = waitlist[0][0] if waitlist else 1
+            cursor.execute(
+                f"INSERT INTO {quote(BatchWaitlist._meta.db_table)} "
+                f"({quote('student_id')}, {quote('batch_id')}, {quote('paper_no')}, {quote('position')}, "
+                f"{quote('preference_rank')}, {quote('run_id')}) "
+                f"SELECT ranked_student, ranked_batch, %s, %s + ROW_NUMBER() OVER (ORDER BY admission), 1, %s "
+                f"FROM ({inner}) ranked WHERE seat > free ORDER BY admission",
+                [paper_no, first_position - 1, run.pk, *params]
+            )
+
+    written = set(CourseAllotment.all_runs.filter(run=run, paper_no=paper_no).values_list(
+        'student_id', 'batch_id', 'paper_no'
+    ))
+    waitlisted = set(BatchWaitlist.all_runs.filter(run=run, paper_no=paper_no).values_list(
+        'position', 'student_id', 'batch_id', 'paper_no', 'preference_rank'
+    ))
+    if written != set(allotments) or waitlisted != {(position, *row) for position, row in waitlist}:
+        raise ValidationError(
+            f"Preferences for paper {paper_no} changed while the run was being built; allocate again"
+        )
+
+
+def save_allocation(engine, run, saved_allotments=0, saved_waitlist=0):
+    """
+    Write an engine's allotments and waitlists into a run, skipping the given
+    number of each that were written before. Set-based direct papers are
+    written by save_direct_paper(), everything else with bulk inserts.
+    """
+    allotments = engine.allotments[saved_allotments:]
+    waitlist = list(enumerate(engine.waitlist[saved_waitlist:], start=saved_waitlist + 1))
+    set_based = get_set_based_papers(engine) & {paper_no for student_id, batch_id, paper_no in allotments}
+    for paper_no in sorted(set_based):
+        save_direct_paper(
+            engine, run, paper_no,
+            [row for row in allotments if row[2] == paper_no],
+            [(position, row) for position, row in waitlist if row[2] == paper_no]
+        )
+
+    CourseAllotment.objects.bulk_create([
+        CourseAllotment(student_id=student_id, batch_id=batch_id, paper_no=paper_no, run=run)
+        for student_id, batch_id, paper_no in allotments if paper_no not in set_based
+    ], batch_size=BULK_BATCH_SIZE)
+
+    BatchWaitlist.objects.bulk_create([
+        BatchWaitlist(student_id=student_id, batch_id=batch_id, paper_no=paper_no,
+                      position=position, preference_rank=rank, run=run)
+        for position, (student_id, batch_id, paper_no, rank) in waitlist if paper_no not in set_based
+    ], batch_size=BULK_BATCH_SIZE)
+
+
+def compute_cutoffs(engine):
+    """
+    {(batch_id, paper_no, admission_category): [admitted, last merit rank, last marks]}
+    over the seats an engine filled from preferences on merit-ordered papers.
+    Direct papers go in admission order and fallback seats ignore preferences,
+    so neither says anything about the marks a batch needed.
+    """
+    snapshot = engine.snapshot
+    ranking = engine.ranking
+    merit_papers = {
+        paper_no for kind, papers in get_allocation_phases(snapshot.semester)
+        if kind != 'direct' for paper_no in papers
+    }
+    cutoffs = {}
+    for student_id, batch_id, paper_no in engine.allotments:
+        if paper_no not in merit_papers:
+            continue
+        index = ranking.positions[student_id]
+        if batch_id not in ranking.preferences_for(index, paper_no):
+            continue
+        student = snapshot.students[index]
+        key = (batch_id, paper_no, student.admission_category)
+        rank = ranking.merit_rank[index] + 1
+        cutoff = cutoffs.get(key)
+        if cutoff is None:
+            cutoffs[key] = [1, rank, get_merit_marks(snapshot.semester, student)]
+        else:
+            cutoff[0] += 1
+            if rank > cutoff[1]:
+                cutoff[1:] = [rank, get_merit_marks(snapshot.semester, student)]
+    return cutoffs
+
+
+def save_cutoffs(engine, run):
+    BatchCutoff.objects.bulk_create([
+        BatchCutoff(run=run, batch_id=batch_id, paper_no=paper_no, admission_category=category,
+                    admitted=admitted, last_rank=last_rank, last_marks=last_marks)
+        for (batch_id, paper_no, category), (admitted, last_rank, last_marks) in compute_cutoffs(engine).items()
+    ], batch_size=BULK_BATCH_SIZE)
+
+
+def save_run_students(engine, run):
+    """Record the students whose preferences a run allocated; returns how many"""
+    student_ids = sorted({student_id for student_id, paper_no in engine.snapshot.preferences})
+    AllocationRun.students.through.objects.bulk_create([
+        AllocationRun.students.through(allocationrun_id=run.pk, student_id=student_id)
+        for student_id in student_ids
+    ], batch_size=BULK_BATCH_SIZE)
+    return len(student_ids)
+
+
+def finish_allocation_run(run, engine, profiler):
+    """Save an engine's outcome into a building run and mark the run ready"""
+    with profiler.phase("Save run") as phase:
+        save_allocation(engine, run)
+        save_cutoffs(engine, run)
+        members = save_run_students(engine, run)
+        phase['rows_written'] = len(engine.allotments) + len(engine.waitlist) + members
+    run.status = AllocationRun.READY
+    run.total_allotments = len(engine.allotments)
+    run.save(update_fields=['status', 'total_allotments'])
+
+
+def build_allocation_run(semester, academic_year, profiler=None, strategy=AllocationRun.GREEDY):
+    """
+    Allocate a semester into a new AllocationRun without touching the live
+    allotments. Returns the run, ready to publish, or marks it failed and
+    re-raises if anything goes wrong. The profiled phases are stored with it.
+    """
+    profiler = profiler or AllocationProfiler()
+    engine_class = get_allocation_engine(strategy)
+    run = AllocationRun.objects.create(semester=semester, academic_year=academic_year, strategy=strategy)
+    events = AllocationEventReporter(semester, academic_year)
+    events.started(run)
+    engine = None
+    try:
+        with transaction.atomic():
+            with profiler.phase("Load cohort") as phase:
+                snapshot = AllocationSnapshot.load(semester, academic_year)
+                phase['rows_read'] = snapshot.rows_read
+            engine = engine_class(snapshot, profiler=profiler, events=events)
+            engine.decision_log = DecisionLog.for_run(run, engine)
+            engine.run()
+            finish_allocation_run(run, engine, profiler)
+    except Exception as e:
+        run.status = AllocationRun.FAILED
+        run.save(update_fields=['status'])
+        events.failed(e)
+        raise
+    finally:
+        if engine is not None and engine.decision_log:
+            engine.decision_log.close()
+        profiler.save(run)
+    events.finished(run)
+    return run
+
+
+def allocate_courses(semester, academic_year, strategy=AllocationRun.GREEDY):
+    """Allocate courses for students in the given semester and academic year"""
+    profiler = AllocationProfiler()
+
+    # 1. Load the cohort once, allocate every paper in memory and write a new run
+    run = build_allocation_run(semester, academic_year, profiler=profiler, strategy=strategy)
+
+    # 2. Make it live; the run it replaces is kept for rollback
+    with profiler.phase("Publish"):
+        publish_run(run)
+    profiler.save(run)
+    return run
@@ -0,0 +1,221 @@
+"""
+Checkpointed allocation builds that survive an interrupted worker.
+
+build_allocation_run() writes a run in one transaction, so a worker killed
+halfway loses everything. A checkpointed build commits the allotments and
+waitlist entries of every pass (each paper pass, quota pass and fallback pass)
+into its AllocationRun as soon as the pass finishes, and records the number
+of passes saved. The run stays in the building state, invisible to the live
+allotments, until every pass is saved; only then is it marked ready and,
+unless asked not to, published.
+
+Resuming reloads the same cohort snapshot, replays the saved rows into a
+fresh engine and carries on from the first unsaved pass. The engine is
+deterministic, so the resumed run is the run an uninterrupted build would
+have produced, provided the cohort's preferences and batches did not change
+in between.
+
+A build holds its run on a lease: it claims the run by bumping
+build_attempts and renews heartbeat_at from its heartbeats and checkpoints.
+Only a build whose heartbeat is older than LEASE_TIMEOUT counts as
+interrupted, so a build still running in another process (a run_jobs worker
+or the allocate_checkpointed command) is neither resumed nor failed, and
+every write is conditional on the claim, so a build that lost its run stops
+at its next heartbeat. Runs of build_allocation_run() hold no lease and are
+never resumed.
+"""
+import time
+from datetime import timedelta
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .allocation import (
+    AllocationSnapshot, get_allocation_engine, save_allocation, save_cutoffs, save_run_students
+)
+from .decisions import DecisionLog
+from .events import AllocationEventReporter
+from .models import AllocationRun, BatchWaitlist, CourseAllotment
+from .profiling import AllocationProfiler
+from .runs import publish_run
+
+
+# Seconds without a heartbeat after which a build counts as interrupted
+LEASE_TIMEOUT = 600
+# Least seconds between two heartbeats that are not checkpoints
+HEARTBEAT_EVERY = 30
+
+
+def get_stale_builds(semester, academic_year, timeout=LEASE_TIMEOUT):
+    """Checkpointed builds of a semester whose build stopped sending heartbeats"""
+    return AllocationRun.objects.filter(
+        semester=semester,
+        academic_year=academic_year,
+        status=AllocationRun.BUILDING,
+        heartbeat_at__lt=timezone.now() - timedelta(seconds=timeout)
+    )
+
+
+def get_interrupted_run(semester, academic_year, timeout=LEASE_TIMEOUT):
+    """
+    Latest checkpointed build of a semester that stopped before finishing, or
+    None. A build killed before its first checkpoint has no passes saved and
+    resumes from the start.
+    """
+    return get_stale_builds(semester, academic_year, timeout).first()
+
+
+def fail_abandoned_builds(semester, academic_year, resumed, timeout=LEASE_TIMEOUT):
+    """Mark the semester's older interrupted builds failed, so collect_superseded_runs() removes them"""
+    return get_stale_builds(semester, academic_year, timeout).exclude(pk=resumed.pk).update(
+        status=AllocationRun.FAILED
+    )
+
+
+class RunLease:
+    """
+    A build's claim on its run. write() saves fields of the run only while the
+    claim stands and raises ValidationError once another build has taken the
+    run over; heartbeat() renews the lease at most every HEARTBEAT_EVERY seconds.
+    """
+
+    def __init__(self, run):
+        self.run = run
+        self.last_heartbeat = time.monotonic()
+
+    @classmethod
+    def claim(cls, run):
+        """Take a building run over from whichever build held it last"""
+        claimed = AllocationRun.objects.filter(
+            pk=run.pk, status=AllocationRun.BUILDING, build_attempts=run.build_attempts
+        ).update(build_attempts=F('build_attempts') + 1, heartbeat_at=timezone.now())
+        if not claimed:
+            raise ValidationError(f"Run {run.pk} was resumed by another build")
+        run.refresh_from_db(fields=['build_attempts', 'heartbeat_at', 'passes_saved'])
+        return cls(run)
+
+    def write(self, **fields):
+        written = AllocationRun.objects.filter(
+            pk=self.run.pk, status=AllocationRun.BUILDING, build_attempts=self.run.build_attempts
+        ).update(heartbeat_at=timezone.now(), **fields)
+        if not written:
+            raise ValidationError(f"Run {self.run.pk} was taken over by another build")
+        self.last_heartbeat = time.monotonic()
+
+    def heartbeat(self):
+        if time.monotonic() - self.last_heartbeat >= HEARTBEAT_EVERY:
+            self.write()
+
+
+def build_checkpointed_run(semester, academic_year, run=None, profiler=None, progress=None,
+                           strategy=AllocationRun.GREEDY, heartbeat=None):
+    """
+    Allocate a semester into a run, committing after every pass.
+    Pass an interrupted run to resume it from its last saved pass, with the
+    strategy it was started with.
+
+    :param progress: Optional callable(passes_saved, total_passes, name) run with every
+        checkpoint, inside its transaction, so an exception from it discards the checkpoint
+    :param heartbeat: Optional callable run every STUDENT_EVENT_EVERY students of a pass
+    """
+    profiler = profiler or AllocationProfiler()
+    if run is None:
+        get_allocation_engine(strategy)
+        run = AllocationRun.objects.create(
+            semester=semester, academic_year=academic_year, strategy=strategy,
+            build_attempts=1, heartbeat_at=timezone.now()
+        )
+        lease = RunLease(run)
+    elif run.status != AllocationRun.BUILDING:
+        raise ValidationError(f"Run {run.pk} is {run.get_status_display().lower()} and cannot be resumed")
+    else:
+        lease = RunLease.claim(run)
+
+    with profiler.phase("Load cohort") as phase:
+        snapshot = AllocationSnapshot.load(semester, academic_year)
+        phase['rows_read'] = snapshot.rows_read
+    engine = get_allocation_engine(run.strategy)(snapshot, profiler=profiler)
+
+    if run.passes_saved:
+        with profiler.phase("Replay checkpoint") as phase:
+            allotments = list(
+                CourseAllotment.all_runs.filter(run=run).order_by('id')
+                .values_list('student_id', 'batch_id', 'paper_no')
+            )
+            waitlist = list(
+                BatchWaitlist.all_runs.filter(run=run).order_by('position')
+                .values_list('student_id', 'batch_id', 'paper_no', 'preference_rank')
+            )
+            try:
+                engine.replay(allotments, waitlist)
+            except KeyError:
+                raise ValidationError(
+                    f"The cohort of run {run.pk} changed since it was interrupted; start a new run"
+                )
+            phase['rows_read'] = len(allotments) + len(waitlist)
+
+    saved = [len(engine.allotments), len(engine.waitlist)]
+    total_passes = len(list(engine.passes()))
+    engine.decision_log = DecisionLog.for_run(run, engine, resume=bool(run.passes_saved))
+    def renew_lease():
+        lease.heartbeat()
+        if heartbeat:
+            heartbeat()
+
+    # Attached after the replay, which would report the saved passes' full batches again
+    engine.events = events = AllocationEventReporter(semester, academic_year, heartbeat=renew_lease)
+    events.started(run)
+
+    def checkpoint(passes_done, name):
+        engine.decision_log.flush()
+        with transaction.atomic():
+            save_allocation(engine, run, *saved)
+            saved[:] = [len(engine.allotments), len(engine.waitlist)]
+            run.passes_saved = passes_done
+            run.total_allotments = len(engine.allotments)
+            lease.write(passes_saved=run.passes_saved, total_allotments=run.total_allotments)
+            profiler.save(run)
+            if progress:
+                progress(passes_done, total_passes, name)
+
+    try:
+        engine.run(start=run.passes_saved, on_pass=checkpoint)
+    except Exception as e:
+        events.failed(e)
+        raise
+    finally:
+        engine.decision_log.close()
+
+    with transaction.atomic():
+        save_cutoffs(engine, run)
+        save_run_students(engine, run)
+        lease.write(status=AllocationRun.READY)
+        run.status = AllocationRun.READY
+    profiler.save(run)
+    events.finished(run)
+    return run
+
+
+def allocate_courses_checkpointed(semester, academic_year, publish=True, progress=None,
+                                  strategy=AllocationRun.GREEDY, heartbeat=None):
+    """
+    Checkpointed counterpart of allocate_courses(): resumes the semester's
+    latest interrupted build if there is one, otherwise starts a new run.
+    Older interrupted builds are marked failed; builds that are still
+    sending heartbeats are left alone.
+    """
+    profiler = AllocationProfiler()
+    interrupted = get_interrupted_run(semester, academic_year)
+    if interrupted:
+        fail_abandoned_builds(semester, academic_year, interrupted)
+    run = build_checkpointed_run(
+        semester, academic_year, run=interrupted,
+        profiler=profiler, progress=progress, strategy=strategy, heartbeat=heartbeat
+    )
+    if publish:
+        with profiler.phase("Publish"):
+            publish_run(run)
+        profiler.save(run)
+    return run
@@ -0,0 +1,131 @@
+"""
+Batch processing of post-allotment course change requests.
+
+Admins queue CourseChangeRequests one student at a time; processing a
+semester settles all of its pending requests together. Requests are taken in
+the same merit order as allocation. Seat availability is checked against an
+in-memory ledger of the involved batches' seats_taken, which every accepted
+change updates on both sides, so a seat given up by one change is offered to
+the next request in merit order straight away. Requests that found their batch
+full get another pass as long as the previous pass accepted something, since
+a lower-ranked student leaving may have opened a seat for them.
+
+Accepted changes are written with one bulk update of CourseAllotment, one of
+Batch.seats_taken and one bulk insert of CourseChangeHistory.
+"""
+from collections import Counter
+
+from django.db import transaction
+from django.utils import timezone
+
+from .allocation import BULK_BATCH_SIZE
+from .models import Batch, CourseAllotment, CourseChangeHistory, CourseChangeRequest
+from .ranking import merit_sort_key
+
+
+@transaction.atomic
+def process_course_change_requests(semester, academic_year, changed_by=None):
+    """
+    Approve every pending course change of a semester that has a free seat,
+    in merit order, and reject the rest with the reason.
+    Returns the numbers of requests approved and rejected.
+    """
+    requests = list(
+        CourseChangeRequest.objects.select_for_update().filter(
+            status=CourseChangeRequest.PENDING,
+            current_batch__course__semester=semester,
+            current_batch__year=academic_year
+        ).select_related('student').order_by('student__admission_number', 'id')
+    )
+    # Stable sort, so ties keep admission number order as in allocation
+    merit_key = merit_sort_key(semester)
+    requests.sort(key=lambda request: merit_key(request.student))
+
+    allotments = {
+        (allotment.student_id, allotment.paper_no): allotment
+        for allotment in CourseAllotment.objects.filter(
+            student__in={request.student_id for request in requests},
+            batch__course__semester=semester,
+            batch__year=academic_year
+        ).select_related('batch')
+    }
+    # {(student_id, course_id, year): papers held in any part of the course}
+    holdings = Counter(
+        (student_id, allotment.batch.course_id, allotment.batch.year)
+        for (student_id, paper_no), allotment in allotments.items()
+    )
+
+    # The seat ledger: {batch_id: Batch} with seats_taken kept current in memory
+    batch_ids = {request.current_batch_id for request in requests} | {request.new_batch_id for request in requests}
+    batches = Batch.objects.select_for_update().select_related('course').in_bulk(batch_ids)
+    changed_batches = set()
+
+    accepted = []
+    rejected = []
+    waiting = []
+    for request in requests:
+        allotment = allotments.get((request.student_id, request.paper_no))
+        if allotment is None or allotment.batch_id != request.current_batch_id:
+            request.outcome = "The student no longer holds the batch being changed"
+            rejected.append(request)
+        elif not batches[request.new_batch_id].status:
+            request.outcome = "The new batch is closed for allocations"
+            rejected.append(request)
+        else:
+            waiting.append((request, allotment))
+
+    while waiting:
+        full = []
+        for request, allotment in waiting:
+            new_batch = batches[request.new_batch_id]
+            old_batch = batches[request.current_batch_id]
+            # Moving between parts of one course is allowed; holding it for another paper is not
+            old_course = (request.student_id, old_batch.course_id, old_batch.year)
+            new_course = (request.student_id, new_batch.course_id, new_batch.year)
+            held_elsewhere = holdings[new_course] - (old_course == new_course)
+            if held_elsewhere:
+                request.outcome = "The student already holds the new course for another paper"
+                rejected.append(request)
+            elif new_batch.seats_taken >= new_batch.seat_limit:
+                full.append((request, allotment))
+            else:
+                new_batch.seats_taken += 1
+                old_batch.seats_taken = max(old_batch.seats_taken - 1, 0)
+                changed_batches.update((new_batch.id, old_batch.id))
+                holdings[old_course] -= 1
+                holdings[new_course] += 1
+                allotment.batch_id = new_batch.id
+                accepted.append((request, allotment))
+        if len(full) == len(waiting):
+            break
+        waiting = full
+
+    for request, allotment in waiting:
+        request.outcome = f"No seat left in {batches[request.new_batch_id].course.course_code}"
+        rejected.append(request)
+
+    now = timezone.now()
+    CourseAllotment.objects.bulk_update(
+        [allotment for request, allotment in accepted], ['batch'], batch_size=BULK_BATCH_SIZE
+    )
+    Batch.objects.bulk_update(
+        [batches[batch_id] for batch_id in changed_batches], ['seats_taken'], batch_size=BULK_BATCH_SIZE
+    )
+    CourseChangeHistory.objects.bulk_create([
+        CourseChangeHistory(
+            request=request, student_id=request.student_id, allotment=allotment,
+            paper_no=request.paper_no, old_batch_id=request.current_batch_id,
+            new_batch_id=request.new_batch_id, reason=request.reason, changed_by=changed_by
+        )
+        for request, allotment in accepted
+    ], batch_size=BULK_BATCH_SIZE)
+    CourseChangeRequest.objects.filter(pk__in=[request.pk for request, allotment in accepted]).update(
+        status=CourseChangeRequest.APPROVED, resolved_at=now
+    )
+    for request in rejected:
+        request.status = CourseChangeRequest.REJECTED
+        request.resolved_at = now
+    CourseChangeRequest.objects.bulk_update(
+        rejected, ['status', 'outcome', 'resolved_at'], batch_size=BULK_BATCH_SIZE
+    )
+    return {'approved': len(accepted), 'rejected': len(rejected)}
@@ -0,0 +1,165 @@
+"""
+Append-only log of the decisions an allocation run makes.
+
+Every preference AllocationEngine.allocate_paper() looks at is recorded with
+its outcome and the seats the batch had left at that moment, followed by the
+fallback seat or the absence of one. Records are fixed-size binary structs
+buffered in memory and appended to one file per run, so logging costs a
+tuple pack per decision and no queries.
+
+File layout::
+
+    MAGIC
+    4-byte little-endian length + JSON header (run, passes, students, batches)
+    RECORD * n
+
+The header carries the names of students and batches, so replay_log() can
+explain any student's path through the run from the file alone. A pass
+marker precedes the records of every pass; when a checkpointed build resumes,
+the pass it was interrupted in is logged again and the later copy wins.
+"""
+import json
+import os
+import struct
+
+from django.conf import settings
+
+MAGIC = b'ALOG1\n'
+HEADER_LENGTH = struct.Struct('<I')
+# student_id, batch_id, seats_left, paper_no, preference rank (0 for fallback), outcome
+RECORD = struct.Struct('<IIhBBB')
+FLUSH_EVERY = 4096
+
+PASS = 0
+ALLOTTED = 1
+FULL = 2
+INACTIVE = 3
+HELD = 4
+FALLBACK = 5
+UNPLACED = 6
+OUTCOMES = {
+    ALLOTTED: "allotted",
+    FULL: "full, waitlisted",
+    INACTIVE: "batch inactive",
+    HELD: "already holds this batch",
+    FALLBACK: "allotted by fallback to the least-filled batch",
+    UNPLACED: "no seat in this pass",
+}
+
+
+def get_decision_log_path(run):
+    return os.path.join(settings.ALLOCATION_LOG_DIR, f"run_{run.pk}.alog")
+
+
+def delete_decision_logs(run_ids):
+    """Remove the logs of deleted runs, so a run that reuses a pk never inherits one"""
+    for run_id in run_ids:
+        try:
+            os.remove(os.path.join(settings.ALLOCATION_LOG_DIR, f"run_{run_id}.alog"))
+        except FileNotFoundError:
+            pass
+
+
+class DecisionLog:
+    """
+    Writer for one run's decision log; the file is only ever appended to.
+    With resume=False an existing file is started afresh.
+    """
+
+    def __init__(self, path, header, resume=False):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.file = open(path, 'ab' if resume else 'wb')
+        if self.file.tell() == 0:
+            encoded = json.dumps(header, separators=(',', ':')).encode()
+            self.file.write(MAGIC + HEADER_LENGTH.pack(len(encoded)) + encoded)
+        self.buffer = []
+
+    @classmethod
+    def for_run(cls, run, engine, resume=False):
+        snapshot = engine.snapshot
+        header = {
+            'run': run.pk,
+            'semester': snapshot.semester,
+            'academic_year': snapshot.academic_year,
+            'passes': [name for name, allocate in engine.passes()],
+            'students': {
+                student.id: [student.admission_number, student.name] for student in snapshot.students
+            },
+            'batches': {
+                batch.id: [batch.course_code, batch.year, batch.part] for batch in snapshot.batches.values()
+            },
+        }
+        return cls(get_decision_log_path(run), header, resume)
+
+    def start_pass(self, number):
+        self.record(0, 0, 0, number, 0, PASS)
+
+    def record(self, student_id, batch_id, seats_left, paper_no, rank, outcome):
+        self.buffer.append(RECORD.pack(student_id, batch_id, seats_left, paper_no, rank, outcome))
+        if len(self.buffer) >= FLUSH_EVERY:
+            self.flush()
+
+    def flush(self):
+        self.file.write(b''.join(self.buffer))
+        self.file.flush()
+        self.buffer = []
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+
+def read_decision_log(path):
+    """
+    Return the header and {pass number: [record, ...]}, records being
+    (student_id, batch_id, seats_left, paper_no, rank, outcome) tuples
+    """
+    with open(path, 'rb') as log:
+        if log.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not an allocation decision log")
+        length, = HEADER_LENGTH.unpack(log.read(HEADER_LENGTH.size))
+        header = json.loads(log.read(length))
+        data = log.read()
+
+    passes = {}
+    current = None
+    usable = len(data) - len(data) % RECORD.size
+    for record in RECORD.iter_unpack(data[:usable]):
+        if record[5] == PASS:
+            current = passes[record[3]] = []
+        elif current is not None:
+            current.append(record)
+    return header, passes
+
+
+def replay_log(path, admission_number=None):
+    """Lines describing every decision of a run, or of one student, in the order they were made"""
+    header, passes = read_decision_log(path)
+    students = header['students']
+    batches = header['batches']
+    student_id = None
+    if admission_number is not None:
+        student_id = next(
+            (int(key) for key, (number, name) in students.items() if number == admission_number), None
+        )
+        if student_id is None:
+            raise ValueError(f"Student {admission_number} is not in run {header['run']}")
+
+    lines = []
+    for number in sorted(passes):
+        pass_name = header['passes'][number - 1]
+        for record_student, batch_id, seats_left, paper_no, rank, outcome in passes[number]:
+            if student_id is not None and record_student != student_id:
+                continue
+            admission, name = students[str(record_student)]
+            if outcome == UNPLACED:
+                lines.append(f"{pass_name}: {admission} {name} paper {paper_no}: {OUTCOMES[outcome]}")
+                continue
+            course_code, year, part = batches[str(batch_id)]
+            target = f"{course_code} {year} part {part} ({seats_left} seats left)"
+            choice = f"preference {rank}" if rank else "fallback"
+            lines.append(
+                f"{pass_name}: {admission} {name} paper {paper_no} {choice} {target}: {OUTCOMES[outcome]}"
+            )
+    return lines
@@ -1,11 +1,29 @@
 from django.shortcuts import redirect
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
+from asgiref.sync import iscoroutinefunction, sync_to_async
 from functools import wraps
 
 def group_required(group_name):
     """Decorator to check if a user belongs to a specific group."""
     def decorator(view_func):
+        if iscoroutinefunction(view_func):
+            # Async views must not touch the database synchronously
+            @wraps(view_func)
+            async def _wrapped_async_view(request, *args, **kwargs):
+                user = await request.auser()
+                if not user.is_authenticated:
+                    await sync_to_async(messages.error)(request, "You must be logged in to access this page.")
+                    return redirect('/login/')
+
+                if not await user.groups.filter(name=group_name).aexists():
+                    await sync_to_async(messages.error)(request, "You are not authorized to access this page.")
+                    return redirect('/login/')
+
+                return await view_func(request, *args, **kwargs)
+
+            return _wrapped_async_view
+
         @wraps(view_func)
         def _wrapped_view(request, *args, **kwargs):
             if not request.user.is_authenticated:
@@ -0,0 +1,115 @@
+"""
+Differences between two allocation runs.
+
+Both sides are streamed from the database sorted by (student, paper) and
+walked together in one merge, so a diff costs two ordered scans and one
+batch lookup whatever the cohort size, with only the differences kept in
+memory. Seat-count deltas per batch are tallied during the same merge.
+"""
+from collections import Counter
+
+from django.core.exceptions import ValidationError
+
+from .models import ActiveAllocationRun, Batch, CourseAllotment
+from .streaming import STREAM_CHUNK_SIZE
+
+MOVED = 'moved'
+ADDED = 'added'
+REMOVED = 'removed'
+
+
+def get_run_allotments(run):
+    return CourseAllotment.all_runs.filter(run=run)
+
+
+def get_published_runs(semester, academic_year):
+    """(previous run, live run) of a semester and academic year"""
+    pointer = ActiveAllocationRun.objects.select_related('run', 'previous_run').filter(
+        semester=semester, academic_year=academic_year
+    ).first()
+    if pointer is None or pointer.previous_run is None:
+        raise ValidationError(f"Semester {semester} {academic_year} has no earlier run to compare with")
+    return pointer.previous_run, pointer.run
+
+
+def iter_sorted_allotments(allotments):
+    """(student_id, paper_no, batch_id, admission_number, name) rows in (student, paper) order"""
+    return allotments.order_by('student_id', 'paper_no', 'batch_id').values_list(
+        'student_id', 'paper_no', 'batch_id', 'student__admission_number', 'student__name'
+    ).iterator(chunk_size=STREAM_CHUNK_SIZE)
+
+
+class AllotmentDiff:
+    """
+    Merge of two CourseAllotment querysets. Iterate changes() once; the
+    seat deltas and counts are complete when it is exhausted.
+    """
+
+    def __init__(self, old_allotments, new_allotments):
+        self.old_allotments = old_allotments
+        self.new_allotments = new_allotments
+        # {batch_id: new seats - old seats}
+        self.seat_deltas = Counter()
+        self.unchanged = 0
+        self.students = set()
+
+    def changes(self):
+        """Yield (kind, admission_number, name, paper_no, old batch_id, new batch_id) per changed seat"""
+        old_rows = iter_sorted_allotments(self.old_allotments)
+        new_rows = iter_sorted_allotments(self.new_allotments)
+        old = next(old_rows, None)
+        new = next(new_rows, None)
+        while old is not None or new is not None:
+            if new is None or (old is not None and old[:2] < new[:2]):
+                change = (REMOVED, old, old[2], None)
+                old = next(old_rows, None)
+            elif old is None or new[:2] < old[:2]:
+                change = (ADDED, new, None, new[2])
+                new = next(new_rows, None)
+            else:
+                if old[2] == new[2]:
+                    self.unchanged += 1
+                    change = None
+                else:
+                    change = (MOVED, new, old[2], new[2])
+                old = next(old_rows, None)
+                new = next(new_rows, None)
+
+            if change:
+                kind, row, old_batch_id, new_batch_id = change
+                student_id, paper_no, batch_id, admission_number, name = row
+                if old_batch_id:
+                    self.seat_deltas[old_batch_id] -= 1
+                if new_batch_id:
+                    self.seat_deltas[new_batch_id] += 1
+                self.students.add(student_id)
+                yield kind, admission_number, name, paper_no, old_batch_id, new_batch_id
+
+    def batch_deltas(self):
+        """(batch_id, delta) for every batch whose seat count differs, by batch id"""
+        return sorted((batch_id, delta) for batch_id, delta in self.seat_deltas.items() if delta)
+
+
+def get_batch_labels():
+    """{batch_id: 'CODE YEAR part N'} for labelling diffs"""
+    return {
+        batch_id: f"{course_code} {year} part {part}"
+        for batch_id, course_code, year, part in Batch.objects.values_list(
+            'id', 'course__course_code', 'year', 'part'
+        )
+    }
+
+
+def iter_diff_rows(diff):
+    """CSV rows of a diff: one per changed seat, then the seat change of every batch"""
+    labels = get_batch_labels()
+    yield ['Change', 'Admission Number', 'Name', 'Paper', 'Old Batch', 'New Batch']
+    for kind, admission_number, name, paper_no, old_batch_id, new_batch_id in diff.changes():
+        yield [
+            kind, admission_number, name, paper_no,
+            labels.get(old_batch_id, ''), labels.get(new_batch_id, ''),
+        ]
+    yield []
+    yield ['Batch', 'Seat Change']
+    for batch_id, delta in diff.batch_deltas():
+        yield [labels[batch_id], f"{delta:+d}"]
@@ -0,0 +1,134 @@
+"""
+In-process channel carrying live allocation events to server-sent-event streams.
+
+AllocationEngine reports through an AllocationEventReporter: a pass started,
+N students of the pass processed, a batch filled. The reporter publishes to
+allocation_events, which hands each event to the asyncio queue of every
+subscribed stream with call_soon_threadsafe(). Nothing touches the database,
+and publishing to a topic nobody watches costs a lock and a dict lookup, so
+allocations report whether or not anyone is watching.
+
+Events only reach streams served by the process that runs the allocation:
+under ASGI, set JOB_WORKER_IN_PROCESS so queued jobs run in a thread of the
+server (see jobqueue.start_worker_thread()).
+"""
+import asyncio
+import threading
+
+# Students between two progress events of a pass
+STUDENT_EVENT_EVERY = 200
+# Events a slow stream may fall behind by before it starts losing them
+SUBSCRIBER_QUEUE_SIZE = 1000
+# Idle seconds after which a stream sends a keepalive comment
+SSE_KEEPALIVE_SECONDS = 15
+
+STARTED = 'started'
+PHASE = 'phase'
+PROGRESS = 'progress'
+BATCH_FILLED = 'batch_filled'
+FINISHED = 'finished'
+FAILED = 'failed'
+END_EVENTS = (FINISHED, FAILED)
+
+
+def get_event_topic(semester, academic_year):
+    return f"{semester}:{academic_year}"
+
+
+def _offer(queue, event):
+    # Runs on the subscriber's loop; a stream that stopped reading loses events, not memory
+    try:
+        queue.put_nowait(event)
+    except asyncio.QueueFull:
+        pass
+
+
+class AllocationEventChannel:
+    """Thread-safe publish/subscribe of event dicts by topic"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # {topic: {queue: loop}}
+        self._subscribers = {}
+        # {topic: [run event, last phase event, last progress event]} for streams joining mid-run
+        self._current = {}
+
+    def subscribe(self, topic):
+        """Queue receiving the topic's events; call from the event loop that will read it"""
+        queue = asyncio.Queue(SUBSCRIBER_QUEUE_SIZE)
+        with self._lock:
+            self._subscribers.setdefault(topic, {})[queue] = asyncio.get_running_loop()
+            for event in self._current.get(topic, ()):
+                if event:
+                    queue.put_nowait(event)
+        return queue
+
+    def unsubscribe(self, topic, queue):
+        with self._lock:
+            subscribers = self._subscribers.get(topic, {})
+            subscribers.pop(queue, None)
+            if not subscribers:
+                self._subscribers.pop(topic, None)
+
+    def publish(self, topic, event):
+        with self._lock:
+            kind = event['event']
+            if kind == STARTED:
+                self._current[topic] = [event, None, None]
+            elif kind in END_EVENTS:
+                self._current.pop(topic, None)
+            elif kind in (PHASE, PROGRESS) and topic in self._current:
+                self._current[topic][1 if kind == PHASE else 2] = event
+            subscribers = list(self._subscribers.get(topic, {}).items())
+        for queue, loop in subscribers:
+            try:
+                loop.call_soon_threadsafe(_offer, queue, event)
+            except RuntimeError:  # The stream's loop has closed
+                self.unsubscribe(topic, queue)
+
+
+allocation_events = AllocationEventChannel()
+
+
+class AllocationEventReporter:
+    """
+    Publishes one allocation's events to the channel topic of its semester
+
+    :param heartbeat: Optional callable run with every progress event, e.g. a job's heartbeat
+    """
+
+    def __init__(self, semester, academic_year, channel=allocation_events, heartbeat=None):
+        self.topic = get_event_topic(semester, academic_year)
+        self.channel = channel
+        self.heartbeat = heartbeat
+        self.semester = semester
+        self.academic_year = academic_year
+        self.pass_number = 0
+        self.total_passes = 0
+
+    def send(self, kind, **data):
+        self.channel.publish(self.topic, {'event': kind, **data})
+
+    def started(self, run):
+        self.send(STARTED, run=run.pk, semester=self.semester, academic_year=self.academic_year)
+
+    def phase_started(self, number, total, name):
+        self.pass_number = number
+        self.total_passes = total
+        self.send(PHASE, number=number, total=total, name=name)
+
+    def students_processed(self, processed, students):
+        if self.heartbeat:
+            self.heartbeat()
+        self.send(PROGRESS, number=self.pass_number, total=self.total_passes,
+                  processed=processed, students=students)
+
+    def batch_filled(self, batch, seat_limit):
+        self.send(BATCH_FILLED, batch=batch.id, course_code=batch.course_code,
+                  year=batch.year, part=batch.part, seat_limit=seat_limit)
+
+    def finished(self, run):
+        self.send(FINISHED, run=run.pk, total_allotments=run.total_allotments)
+
+    def failed(self, error):
+        self.send(FAILED, error=str(error))
@@ -4,7 +4,7 @@ from django.core.validators import MinValueValidator, MaxValueValidator, RegexVa
 from datetime import date, datetime
 from .models import (
     Student, Course, Course_type, Department, Batch, 
-    CourseAllotment, AllocationSettings, HOD
+    CourseAllotment, AllocationSettings, HOD, SwapRequest
 )
 
 class StudentForm(forms.ModelForm):
@@ -477,6 +477,58 @@ class BulkStudentUploadForm(forms.Form):
         validators=[FileExtensionValidator(allowed_extensions=['csv'])]
     )
 
+class SwapRequestForm(forms.Form):
+    admission_number = forms.CharField(
+        max_length=20,
+        widget=forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Enter admission number'})
+    )
+    paper_no = forms.IntegerField(
+        min_value=1,
+        max_value=6,
+        widget=forms.NumberInput(attrs={'class': 'form-control'})
+    )
+    wanted_batch = forms.ModelChoiceField(
+        queryset=Batch.objects.none(),
+        widget=forms.Select(attrs={'class': 'form-control'})
+    )
+
+    def __init__(self, *args, semester, academic_year, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.semester = semester
+        self.academic_year = academic_year
+        self.fields['wanted_batch'].queryset = Batch.objects.filter(
+            course__semester=semester, year=academic_year, status=True
+        ).select_related('course')
+
+    def clean(self):
+        cleaned_data = super().clean()
+        admission_number = cleaned_data.get('admission_number')
+        paper_no = cleaned_data.get('paper_no')
+        wanted_batch = cleaned_data.get('wanted_batch')
+        if not (admission_number and paper_no and wanted_batch):
+            return cleaned_data
+
+        allotment = CourseAllotment.objects.filter(
+            student__admission_number=admission_number,
+            paper_no=paper_no,
+            batch__course__semester=self.semester,
+            batch__year=self.academic_year
+        ).select_related('student', 'batch__course').first()
+        if allotment is None:
+            raise ValidationError(f"{admission_number} holds no batch for paper {paper_no} this semester")
+        if SwapRequest.objects.filter(
+            student=allotment.student, paper_no=paper_no, status=SwapRequest.PENDING
+        ).exists():
+            raise ValidationError(f"{admission_number} already has a pending swap for paper {paper_no}")
+
+        swap = SwapRequest(
+            student=allotment.student, paper_no=paper_no,
+            offered_batch=allotment.batch, wanted_batch=wanted_batch
+        )
+        swap.clean()
+        cleaned_data['swap'] = swap
+        return cleaned_data
+
 class StudentEditForm(forms.ModelForm):
     class Meta:
         model = Student
@@ -0,0 +1,171 @@
+"""
+Bulk creation of students and their logins from the upload CSV.
+
+Runs in the job worker, so a large file no longer holds an HTTP request open;
+the upload view only checks the headers and queues the rows. Rows are first
+validated and their passwords hashed, which is where the time goes and what
+progress is reported for; the valid rows are then created in one
+transaction, so a failed or re-queued import never leaves part of a file.
+"""
+from datetime import date, datetime
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Group, User
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from .models import Department, Pathway, Student
+
+REQUIRED_COLUMNS = [
+    "Admission Number", "Name", "Date of Birth (DD/MM/YYYY)",
+    "Email", "Department", "Pathway"
+]
+PROGRESS_EVERY = 50
+
+
+def import_students(rows, progress=None):
+    """
+    Create a student and user for every CSV row (as dicts) not already present,
+    all in one transaction. Returns the created and skipped counts and the
+    per-row errors; rows with errors are left out.
+
+    :param progress: Optional callable(percent, phase)
+    """
+    rows = list(rows)
+    student_group = Group.objects.get_or_create(name="Student")[0]
+    existing_count = 0
+    errors = []
+    valid = []
+    # Rows earlier in the file count as taken, as they would once created
+    seen_admission_numbers, seen_emails, seen_phone_numbers = set(), set(), set()
+
+    for row_num, row in enumerate(rows, start=2):  # Start at 2 for header row
+        if progress and row_num % PROGRESS_EVERY == 0:
+            progress(round(row_num * 100 / (len(rows) + 1)), f"Row {row_num} of {len(rows) + 1}")
+        try:
+            # Validate required fields
+            admission_number = row["Admission Number"].strip()
+            if not admission_number:
+                raise ValidationError("Admission Number is required")
+
+            if admission_number in seen_admission_numbers or Student.objects.filter(admission_number=admission_number).exists():
+                existing_count += 1
+                continue
+
+            # Parse and validate date
+            dob_str = row["Date of Birth (DD/MM/YYYY)"].strip()
+            try:
+                dob = datetime.strptime(dob_str, "%d/%m/%Y").date()
+                if dob > date.today():
+                    raise ValidationError("Date of Birth cannot be in the future")
+            except ValueError:
+                raise ValidationError("Invalid date format. Use DD/MM/YYYY")
+
+            # Validate email
+            email = row["Email"].strip().lower()
+            if not email or "@" not in email:
+                raise ValidationError("Valid email is required")
+            if email in seen_emails or Student.objects.filter(email=email).exists():
+                raise ValidationError("Email already exists")
+
+            # Validate phone number if provided
+            phone_number = row.get("Phone Number", "").strip()
+            if phone_number:
+                if not phone_number.isdigit() or len(phone_number) != 10:
+                    raise ValidationError("Phone number must be 10 digits")
+                if phone_number in seen_phone_numbers or Student.objects.filter(phone_number=phone_number).exists():
+                    raise ValidationError("Phone number already exists")
+
+            # Validate and get foreign key relationships
+            department = Department.objects.get(
+                name__iexact=row["Department"].strip()
+            )
+            pathway = Pathway.objects.get(
+                name__iexact=row["Pathway"].strip()
+            )
+
+            # Validate admission category
+            admission_category = row.get("Admission Category", "General").strip()
+            valid_categories = dict(Student.CATEGORY)
+            if admission_category not in valid_categories:
+                raise ValidationError(f"Invalid admission category. Valid options: {', '.join(valid_categories.keys())}")
+
+            # Validate admission year
+            admission_year = row.get("Admission Year", str(date.today().year)).strip()
+            try:
+                admission_year = int(admission_year)
+                if not (2000 <= admission_year <= date.today().year):
+                    raise ValidationError(f"Admission year must be between 2000 and {date.today().year}")
+            except ValueError:
+                raise ValidationError("Admission year must be a number")
+
+            # Validate current semester
+            current_sem = row.get("Current Semester", "1").strip()
+            try:
+                current_sem = int(current_sem)
+                if not (1 <= current_sem <= 8):
+                    raise ValidationError("Current semester must be between 1 and 8")
+            except ValueError:
+                raise ValidationError("Current semester must be a number")
+
+            # Validate normalized marks
+            normalized_marks = row.get("PlusTwo Marks(normalized)", "0").strip()
+            try:
+                normalized_marks = int(normalized_marks)
+                if not (0 <= normalized_marks <= 2000):
+                    raise ValidationError("Normalized marks must be between 0 and 100")
+            except ValueError:
+                raise ValidationError("Normalized marks must be a number")
+
+            student = Student(
+                admission_number=admission_number,
+                name=row["Name"].strip(),
+                dob=dob,
+                email=email,
+                phone_number=phone_number or None,
+                department=department,
+                admission_category=admission_category,
+                admission_year=admission_year,
+                pathway=pathway,
+                current_sem=current_sem,
+                normalized_marks=normalized_marks,
+            )
+            # Hash here rather than inside the transaction; it is the slow part
+            valid.append((row_num, student, make_password(dob.strftime('%d/%m/%y'))))
+            seen_admission_numbers.add(admission_number)
+            seen_emails.add(email)
+            if phone_number:
+                seen_phone_numbers.add(phone_number)
+
+        except Exception as e:
+            errors.append(f"Row {row_num}: {str(e)}")
+            continue
+
+    if progress:
+        progress(99, f"Saving {len(valid)} students")
+    success_count = 0
+    with transaction.atomic():
+        for row_num, student, password in valid:
+            # A savepoint per row, so a row the database rejects is reported
+            # like any other invalid row instead of undoing the file
+            try:
+                with transaction.atomic():
+                    # Check if user already exists
+                    user = User.objects.filter(username=student.admission_number).first()
+                    if user is None:
+                        user = User.objects.create(
+                            username=student.admission_number, email=student.email, password=password
+                        )
+                        user.groups.add(student_group)
+                    student.user = user
+                    student.save()
+            except Exception as e:
+                errors.append(f"Row {row_num}: {str(e)}")
+                continue
+            success_count += 1
+
+    return {
+        'created': success_count,
+        'existing': existing_count,
+        'errors': errors,
+    }
@@ -0,0 +1,239 @@
+"""
+Incremental allocation for students who submit preferences after a run.
+
+A student is late when the semester's live run did not allocate their
+preferences: every run records the students it allocated, and late students
+are added to it once inserted. Every paper a late student has preferences for
+but no allotment in is pending, and pending papers are inserted into the
+existing allocation instead of re-running the whole cohort. On merit papers a
+late student may take a seat in a full batch from the lowest-ranked holder
+they outrank; that holder then continues down their own preference list from
+the next option, possibly displacing someone else. Only this displacement
+chain is recomputed, and only the rows it changes are written.
+
+Direct papers and quota papers (MDC/VAC) never displace anyone: late students
+take a free seat from their preferences, falling back to the least-filled
+batch of the right type on quota papers like the regular remainder pass.
+
+Students who were in the run and still have a paper unallotted lost out to
+merit there and are not pending, or they could displace the holders who beat
+them; the preference views do not let them submit again either. Without a
+live run (allotments made before runs existed) nothing tells late and
+unplaced students apart, so every unallotted paper is pending.
+"""
+from django.db import transaction
+from django.db.models import F
+
+from .allocation import (
+    AllocationEngine, AllocationSnapshot, BULK_BATCH_SIZE, get_allocation_phases, get_target_admission_year
+)
+from .models import Batch, CourseAllotment, CoursePreference
+from .runs import get_active_run
+
+
+class IncrementalAllocationEngine(AllocationEngine):
+    """Allocation engine that starts from the cohort's current allotments"""
+
+    def __init__(self, snapshot):
+        super().__init__(snapshot)
+        positions = self.ranking.positions
+        # {paper_no: batch_id} held this academic year, per cohort position
+        self.holdings = [{} for _ in snapshot.students]
+        # {(batch_id, paper_no): {position, ...}}
+        self.holders = {}
+        for student_id, paper_no, batch_id in snapshot.existing_allotments:
+            if snapshot.batches[batch_id].year != snapshot.academic_year:
+                continue
+            index = positions[student_id]
+            self.holdings[index][paper_no] = batch_id
+            self.holders.setdefault((batch_id, paper_no), set()).add(index)
+        self.initial_holdings = [dict(holding) for holding in self.holdings]
+        # (position, paper_no) pairs touched by the insertion
+        self.changed = set()
+
+    def pending_papers(self, late_student_ids=None):
+        """
+        {paper_no: {position, ...}} of papers listed in preferences but not yet
+        allotted, for the students in late_student_ids (every student if None)
+        """
+        students = range(len(self.holdings))
+        if late_student_ids is not None:
+            student_ids = self.ranking.student_ids
+            students = [index for index in students if student_ids[index] in late_student_ids]
+        pending = {}
+        for kind, papers in get_allocation_phases(self.semester):
+            for paper_no in papers:
+                pending[paper_no] = {
+                    index for index in students
+                    if paper_no not in self.allotted_papers[index] and
+                    self.ranking.preferences_for(index, paper_no)
+                }
+        return pending
+
+    def insert(self, pending):
+        """Allocate the pending papers phase by phase, in the order of a full run"""
+        for kind, papers in get_allocation_phases(self.semester):
+            order = self.ranking.direct_order if kind == 'direct' else self.ranking.merit_order
+            for paper_no in papers:
+                waiting = pending.get(paper_no)
+                if not waiting:
+                    continue
+                for index in order:
+                    if index not in waiting:
+                        continue
+                    if kind == 'merit':
+                        self.claim_paper(index, paper_no)
+                    else:
+                        self.allocate_paper(index, paper_no, allow_any_available=kind == 'quota')
+        return self
+
+    def claim_paper(self, index, paper_no):
+        """
+        Allocate a merit paper, displacing lower-ranked holders of full batches.
+        Returns False if the student who started the chain got no seat.
+        """
+        if paper_no in self.allotted_papers[index]:
+            return True
+
+        start = 0
+        claimant = index
+        while claimant is not None:
+            preferences = self.ranking.preferences_for(claimant, paper_no)
+            rank = self.ranking.merit_rank[claimant]
+            held = self._held_batches(claimant)
+            displaced = None
+            for position in range(start, len(preferences)):
+                batch_id = preferences[position]
+                if not self.snapshot.batches[batch_id].status or batch_id in held:
+                    continue
+                seat_id = self._seat_for(batch_id, held)
+                if self.seat_limits[seat_id] > self.seats_taken[seat_id]:
+                    self._assign(claimant, seat_id, paper_no)
+                    break
+                displaced = self._lowest_holder(batch_id, paper_no, rank)
+                if displaced is not None:
+                    self._release(displaced, paper_no)
+                    self._assign(claimant, batch_id, paper_no)
+                    start = list(self.ranking.preferences_for(displaced, paper_no)).index(batch_id) + 1
+                    break
+            claimant = displaced
+
+        return paper_no in self.allotted_papers[index]
+
+    def _lowest_holder(self, batch_id, paper_no, rank):
+        """Lowest-ranked holder below `rank` who chose this batch for the paper"""
+        lowest = None
+        for holder in self.holders.get((batch_id, paper_no), ()):
+            holder_rank = self.ranking.merit_rank[holder]
+            if (holder_rank > rank and
+                    batch_id in self.ranking.preferences_for(holder, paper_no) and
+                    (lowest is None or holder_rank > self.ranking.merit_rank[lowest])):
+                lowest = holder
+        return lowest
+
+    def _assign(self, index, batch_id, paper_no):
+        super()._assign(index, batch_id, paper_no)
+        self.holdings[index][paper_no] = batch_id
+        self.holders.setdefault((batch_id, paper_no), set()).add(index)
+        self.changed.add((index, paper_no))
+
+    def _release(self, index, paper_no):
+        batch_id = self.holdings[index].pop(paper_no)
+        self.holders[(batch_id, paper_no)].discard(index)
+        self.allotted_papers[index].discard(paper_no)
+        self.allotted_batches[index].discard(batch_id)
+        self._free_seat(batch_id)
+        self.changed.add((index, paper_no))
+
+    def changes(self):
+        """[(position, paper_no, old batch_id, new batch_id)] for seats that moved"""
+        changes = []
+        for index, paper_no in sorted(self.changed):
+            old = self.initial_holdings[index].get(paper_no)
+            new = self.holdings[index].get(paper_no)
+            if old != new:
+                changes.append((index, paper_no, old, new))
+        return changes
+
+
+def save_incremental_allocation(engine):
+    """Apply an incremental engine's changes to CourseAllotment and Batch.seats_taken"""
+    snapshot = engine.snapshot
+    student_ids = engine.ranking.student_ids
+    changes = engine.changes()
+    run = get_active_run(snapshot.semester, snapshot.academic_year)
+
+    moved_student_ids = [student_ids[index] for index, paper_no, old, new in changes if old is not None]
+    allotment_ids = {
+        (student_id, paper_no, batch_id): allotment_id
+        for allotment_id, student_id, paper_no, batch_id in CourseAllotment.objects.filter(
+            student_id__in=moved_student_ids,
+            batch__course__semester=snapshot.semester,
+            batch__year=snapshot.academic_year
+        ).values_list('id', 'student_id', 'paper_no', 'batch_id')
+    }
+
+    to_create, to_update, to_delete = [], [], []
+    for index, paper_no, old, new in changes:
+        student_id = student_ids[index]
+        if old is None:
+            to_create.append(CourseAllotment(student_id=student_id, batch_id=new, paper_no=paper_no, run=run))
+        elif new is None:
+            to_delete.append(allotment_ids[(student_id, paper_no, old)])
+        else:
+            to_update.append(CourseAllotment(pk=allotment_ids[(student_id, paper_no, old)], batch_id=new))
+
+    CourseAllotment.objects.bulk_create(to_create, batch_size=BULK_BATCH_SIZE)
+    CourseAllotment.objects.bulk_update(to_update, ['batch'], batch_size=BULK_BATCH_SIZE)
+    CourseAllotment.objects.filter(id__in=to_delete).delete()
+
+    for batch_id in engine.changed_batch_ids():
+        Batch.objects.filter(pk=batch_id).update(
+            seats_taken=F('seats_taken') + engine.seats_taken[batch_id] - snapshot.batches[batch_id].seats_taken
+        )
+
+    return {
+        'created': len(to_create),
+        'moved': len(to_update),
+        'removed': len(to_delete),
+    }
+
+
+def get_late_student_ids(semester, academic_year):
+    """Students of the cohort with preferences its live run did not allocate, or None without a live run"""
+    run = get_active_run(semester, academic_year)
+    if run is None:
+        return None
+    return set(CoursePreference.objects.filter(
+        student__current_sem=semester,
+        student__admission_year=get_target_admission_year(semester, academic_year)
+    ).exclude(student__allocation_runs=run).values_list('student_id', flat=True))
+
+
+def is_in_live_run(student, academic_year):
+    """Whether the live run of the student's current semester allocated their preferences"""
+    run = get_active_run(student.current_sem, academic_year)
+    return run is not None and run.students.filter(pk=student.pk).exists()
+
+
+@transaction.atomic
+def allocate_late_students(semester, academic_year):
+    """
+    Insert preferences submitted after a run into the existing allocation for
+    a semester, touching only the seats their insertion moves.
+    """
+    snapshot = AllocationSnapshot.load(semester, academic_year, reset=False)
+    engine = IncrementalAllocationEngine(snapshot)
+    late_student_ids = get_late_student_ids(semester, academic_year)
+    pending = engine.pending_papers(late_student_ids)
+    engine.insert(pending)
+
+    report = save_incremental_allocation(engine)
+    if late_student_ids:
+        # Inserted once: from now on they keep their seats like the rest of the run
+        get_active_run(semester, academic_year).students.add(*late_student_ids)
+    report['pending_students'] = sorted({
+        snapshot.students[index].admission_number
+        for waiting in pending.values() for index in waiting
+    })
+    return report
@@ -0,0 +1,70 @@
+"""
+Seat-count and duplicate-allotment checks.
+
+Batch.seats_taken is kept in step with the allotment rows by incremental
+updates in several places, and CourseAllotment has had no unique constraint
+on student and paper since migration 0013, so both can drift. Only live
+allotments count, as everywhere else. Batches whose seats_taken differs from
+their live allotments are found with one grouped aggregate, and duplicate
+student/paper/semester allotments with one windowed query; fixing deletes
+the duplicates, keeping the earliest row of each, and recounts every
+affected batch in one UPDATE.
+"""
+from django.db import transaction
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+
+from .allocation import BULK_BATCH_SIZE
+from .models import Batch, CourseAllotment
+from .runs import live_seats_taken
+
+
+def find_seat_drift(batches=None):
+    """[(batch_id, seats_taken, live allotments)] for the batches whose count has drifted"""
+    batches = Batch.objects.all() if batches is None else batches
+    return list(
+        batches.annotate(counted=live_seats_taken()).exclude(seats_taken=F('counted'))
+        .order_by('id').values_list('id', 'seats_taken', 'counted')
+    )
+
+
+def find_duplicate_allotments(allotments=None):
+    """
+    [(allotment_id, student_id, paper_no, batch_id)] of live allotments that
+    repeat an earlier one for the same student, paper and semester
+    """
+    allotments = CourseAllotment.objects.all() if allotments is None else allotments
+    return list(
+        allotments.annotate(copy=Window(
+            RowNumber(),
+            partition_by=[F('student_id'), F('paper_no'), F('batch__course__semester')],
+            order_by=F('id').asc()
+        )).filter(copy__gt=1).order_by('id').values_list('id', 'student_id', 'paper_no', 'batch_id')
+    )
+
+
+@transaction.atomic
+def reconcile_allotments(batches=None, fix=False):
+    """
+    Check live allotments against the seat counts of `batches` (every batch
+    by default), limiting the duplicate check to the students holding a seat
+    in them. With fix=True the duplicates are deleted and the counts of the
+    drifted batches and of those that held duplicates are recounted.
+    Returns the drift and duplicates found before fixing.
+    """
+    allotments = CourseAllotment.objects.all()
+    if batches is not None:
+        allotments = allotments.filter(
+            student__in=CourseAllotment.objects.filter(batch__in=batches).values('student_id')
+        )
+    drift = find_seat_drift(batches)
+    duplicates = find_duplicate_allotments(allotments)
+
+    if fix and (drift or duplicates):
+        duplicate_ids = [row[0] for row in duplicates]
+        for start in range(0, len(duplicate_ids), BULK_BATCH_SIZE):
+            CourseAllotment.all_runs.filter(id__in=duplicate_ids[start:start + BULK_BATCH_SIZE]).delete()
+        Batch.objects.filter(
+            id__in={row[0] for row in drift} | {row[3] for row in duplicates}
+        ).update(seats_taken=live_seats_taken())
+    return {'drift': drift, 'duplicates': duplicates}
@@ -0,0 +1,226 @@
+"""
+Database-backed queue for work too long for an HTTP request.
+
+Views enqueue a BackgroundJob and return at once; the run_jobs command polls
+the table, claims the oldest queued job with a conditional UPDATE (so several
+workers never take the same job, on any database) and runs its handler.
+Handlers report a percentage and the current phase, which job_status serves
+as JSON for the admin pages to poll; allocations also send heartbeats from
+inside their passes.
+
+Enqueueing the same work while an identical job is still queued or running
+returns that job, found by a digest of its params (an import's carry the
+whole CSV), so a resubmitted form does not double the load. A job
+whose worker stops sending heartbeats is queued again; allocation jobs use
+checkpointed builds and pick up from their last saved pass. Every write a
+worker makes is conditional on the job still carrying the attempt number it
+claimed, so a worker whose job was queued again and claimed by another
+stops at its next heartbeat instead of building the same semester twice.
+
+With JOB_WORKER_IN_PROCESS the ASGI server runs jobs itself on a thread, which
+lets /allocation-events/ stream an allocation's live events (see events.py).
+"""
+import csv
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import F
+from django.utils import timezone
+
+from .checkpoints import allocate_courses_checkpointed
+from .imports import import_students
+from .models import AllocationRun, BackgroundJob, Student
+from .streaming import STREAM_CHUNK_SIZE, iter_allotment_csv_rows
+
+MAX_ATTEMPTS = 3
+# Seconds without a heartbeat after which a running job counts as abandoned
+STALL_TIMEOUT = 600
+# Least seconds between two heartbeats that are not progress reports
+HEARTBEAT_EVERY = 30
+
+
+class JobLost(Exception):
+    """The job was queued again and claimed by another worker while this one ran it"""
+
+
+def enqueue_job(kind, **params):
+    """Queue a job, or return the identical job that is already queued or running"""
+    digest = hashlib.sha256(json.dumps(params, sort_keys=True).encode()).hexdigest()
+    pending = BackgroundJob.objects.filter(
+        kind=kind, params_digest=digest, status__in=[BackgroundJob.QUEUED, BackgroundJob.RUNNING]
+    ).first()
+    if pending:
+        return pending
+    return BackgroundJob.objects.create(kind=kind, params=params, params_digest=digest)
+
+
+def claim_next_job():
+    """Mark the oldest queued job running and return it, or None if the queue is empty"""
+    for job_id in BackgroundJob.objects.filter(status=BackgroundJob.QUEUED).order_by('created_at').values_list('id', flat=True)[:10]:
+        now = timezone.now()
+        claimed = BackgroundJob.objects.filter(pk=job_id, status=BackgroundJob.QUEUED).update(
+            status=BackgroundJob.RUNNING, started_at=now, heartbeat_at=now, attempts=F('attempts') + 1
+        )
+        if claimed:
+            return BackgroundJob.objects.get(pk=job_id)
+    return None
+
+
+def requeue_stalled_jobs(timeout=STALL_TIMEOUT):
+    """Queue abandoned running jobs again, or fail them once they have used every attempt"""
+    stalled = BackgroundJob.objects.filter(
+        status=BackgroundJob.RUNNING, heartbeat_at__lt=timezone.now() - timedelta(seconds=timeout)
+    )
+    failed = stalled.filter(attempts__gte=MAX_ATTEMPTS).update(
+        status=BackgroundJob.FAILED, error="The worker stopped responding", finished_at=timezone.now()
+    )
+    requeued = stalled.update(status=BackgroundJob.QUEUED)
+    return requeued, failed
+
+
+class JobProgress:
+    """
+    Progress reporter handed to job handlers: call it with a percentage and
+    phase, or call heartbeat() from long loops. Both raise JobLost once the
+    job no longer carries the attempt this worker claimed.
+    """
+
+    def __init__(self, job):
+        self.job = job
+        self.last_heartbeat = time.monotonic()
+
+    def claim(self):
+        """The job's row, while this worker's claim on it stands"""
+        return BackgroundJob.objects.filter(
+            pk=self.job.pk, status=BackgroundJob.RUNNING, attempts=self.job.attempts
+        )
+
+    def write(self, **fields):
+        if not self.claim().update(heartbeat_at=timezone.now(), **fields):
+            raise JobLost(f"Job {self.job.pk} was claimed again by another worker")
+        self.last_heartbeat = time.monotonic()
+
+    def __call__(self, percent, phase):
+        self.write(progress=min(percent, 99), phase=phase[:100])
+
+    def heartbeat(self):
+        if time.monotonic() - self.last_heartbeat >= HEARTBEAT_EVERY:
+            self.write()
+
+
+def run_job(job):
+    """Run a claimed job's handler and store its result or error, unless another worker took it over"""
+    progress = JobProgress(job)
+    try:
+        result = JOB_HANDLERS[job.kind](job, progress)
+    except JobLost:
+        pass
+    except Exception:
+        progress.claim().update(
+            status=BackgroundJob.FAILED, error=traceback.format_exc(), finished_at=timezone.now()
+        )
+    else:
+        progress.claim().update(
+            status=BackgroundJob.DONE, progress=100, phase="Finished", result=result, finished_at=timezone.now()
+        )
+    job.refresh_from_db()
+    return job
+
+
+def start_worker_thread(poll_interval=2.0):
+    """
+    Run queued jobs on a daemon thread of this process instead of a run_jobs
+    worker, so an ASGI server can stream the live events of its own allocations
+    """
+    def work():
+        while True:
+            try:
+                requeue_stalled_jobs()
+                job = claim_next_job()
+                if job is not None:
+                    run_job(job)
+            except Exception:
+                # A lost database connection must not stop the thread for good
+                traceback.print_exc()
+                job = None
+            finally:
+                close_old_connections()
+            if job is None:
+                time.sleep(poll_interval)
+
+    thread = threading.Thread(target=work, name='job-worker', daemon=True)
+    thread.start()
+    return thread
+
+
+def get_job_output_path(job):
+    return os.path.join(settings.JOB_OUTPUT_DIR, f"job_{job.pk}.csv")
+
+
+def run_allocation_job(job, progress):
+    params = job.params
+
+    def report(passes_saved, total_passes, name):
+        progress(round(passes_saved * 95 / total_passes), name)
+
+    progress(0, "Loading cohort")
+    run = allocate_courses_checkpointed(
+        params['semester'], params['academic_year'], progress=report, heartbeat=progress.heartbeat,
+        strategy=params.get('strategy', AllocationRun.GREEDY)
+    )
+    return {
+        'run': run.pk,
+        'total_allotments': run.total_allotments,
+        'message': f"Allotted {run.total_allotments} seats in run {run.pk}",
+    }
+
+
+def run_export_job(job, progress):
+    semester = job.params['semester']
+    total = max(Student.objects.filter(courseallotment__batch__course__semester=semester).distinct().count(), 1)
+    os.makedirs(settings.JOB_OUTPUT_DIR, exist_ok=True)
+    path = get_job_output_path(job)
+    written = 0
+    with open(path, 'w', newline='') as output:
+        writer = csv.writer(output)
+        for row in iter_allotment_csv_rows(semester):
+            writer.writerow(row)
+            written += 1
+            if written % STREAM_CHUNK_SIZE == 0:
+                progress(round(written * 100 / total), f"{written} of {total} students written")
+    return {
+        'rows': written - 1,
+        'filename': f"semester_{semester}_allotments.csv",
+        'message': f"Exported {written - 1} students",
+    }
+
+
+def run_import_job(job, progress):
+    rows = csv.DictReader(io.StringIO(job.params['csv']))
+    result = import_students(rows, progress=progress)
+    summary = []
+    if result['created']:
+        summary.append(f"Successfully created {result['created']} students")
+    if result['existing']:
+        summary.append(f"Skipped {result['existing']} existing students")
+    if result['errors']:
+        summary.append(f"{len(result['errors'])} rows had errors")
+    result['message'] = "; ".join(summary) or "No new students were created"
+    # Keep the stored result small; the first errors are enough to fix a file
+    result['errors'] = result['errors'][:10]
+    return result
+
+
+JOB_HANDLERS = {
+    BackgroundJob.ALLOCATE: run_allocation_job,
+    BackgroundJob.EXPORT_ALLOTMENTS: run_export_job,
+    BackgroundJob.IMPORT_STUDENTS: run_import_job,
+}
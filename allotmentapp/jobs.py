@@ -0,0 +1,153 @@
+"""
+Allocation jobs covering several cohorts in one go.
+
+A job allocates any number of (semester, academic_year) cohorts. Batches,
+courses and allocation settings are read once into an AllocationCatalog that
+every cohort's snapshot draws from. Cohorts whose snapshots can reach a common
+batch are placed in the same group and allocated one after another, each one
+starting from the seats the previous ones took; a failure only stops the
+rest of its own group.
+
+Groups share no batches but are still allocated one after another, in one
+thread. Allocation is CPU-bound Python, so threads would take turns on the
+GIL and gain nothing, while their connections would queue for SQLite's single
+writer under IMMEDIATE transactions. Processes would each reload the catalog,
+and saving the runs, which takes most of a job's time, would still go
+through that one writer.
+
+A cohort's run is created when its allocation starts, so cohorts that never
+start leave no run behind. Runs are written and published once every group
+has finished. If any cohort fails, its run is marked failed and nothing is
+published; the runs that were built stay ready for `allocation_runs publish`.
+"""
+from django.db import transaction
+
+from .allocation import (
+    AllocationCatalog, AllocationSnapshot, finish_allocation_run, get_allocation_engine,
+    get_target_admission_year
+)
+from .decisions import DecisionLog
+from .events import AllocationEventReporter
+from .models import AllocationRun, CoursePreference
+from .profiling import AllocationProfiler
+from .runs import publish_run
+
+
+class CohortAllocation:
+    """One cohort of a job with its profiler, event reporter and, once started, run and engine"""
+
+    def __init__(self, semester, academic_year, strategy=AllocationRun.GREEDY):
+        self.semester = semester
+        self.academic_year = academic_year
+        self.strategy = strategy
+        self.engine_class = get_allocation_engine(strategy)
+        self.profiler = AllocationProfiler()
+        self.events = AllocationEventReporter(semester, academic_year)
+        self.run = None
+        self.engine = None
+        self.error = None
+
+    def start_run(self):
+        self.run = AllocationRun.objects.create(
+            semester=self.semester, academic_year=self.academic_year, strategy=self.strategy
+        )
+        return self.run
+
+    def reachable_batch_ids(self, catalog):
+        """Batches the cohort's allocation may read or take seats in"""
+        listed = set(CoursePreference.objects.filter(
+            student__current_sem=self.semester,
+            student__admission_year=get_target_admission_year(self.semester, self.academic_year)
+        ).values_list('batch_id', flat=True).distinct())
+        return {
+            batch.id for batch in catalog.batches.values()
+            if batch.semester == self.semester or batch.id in listed
+        }
+
+
+def group_cohorts(cohorts, catalog):
+    """Split cohorts into lists that share batches, keeping the given order inside each"""
+    groups = []
+    for cohort in cohorts:
+        batch_ids = cohort.reachable_batch_ids(catalog)
+        overlapping = [group for group in groups if group[1] & batch_ids]
+        merged = ([], batch_ids)
+        for group in overlapping:
+            merged[0].extend(group[0])
+            merged[1].update(group[1])
+            groups.remove(group)
+        merged[0].append(cohort)
+        groups.append(merged)
+    return [sorted(members, key=cohorts.index) for members, batch_ids in groups]
+
+
+def allocate_group(group, catalog):
+    """Load and allocate a group's cohorts in order, carrying seat counts between them"""
+    seat_changes = {}
+    for cohort in group:
+        try:
+            with cohort.profiler.phase("Load cohort") as phase:
+                snapshot = AllocationSnapshot.load(cohort.semester, cohort.academic_year, catalog=catalog)
+                phase['rows_read'] = snapshot.rows_read
+            for batch_id, change in seat_changes.items():
+                if batch_id in snapshot.batches:
+                    snapshot.batches[batch_id].seats_taken += change
+            cohort.events.started(cohort.start_run())
+            cohort.engine = cohort.engine_class(snapshot, profiler=cohort.profiler, events=cohort.events)
+            cohort.engine.decision_log = DecisionLog.for_run(cohort.run, cohort.engine)
+            try:
+                cohort.engine.run()
+            finally:
+                cohort.engine.decision_log.close()
+        except Exception as e:
+            # Later cohorts of the group would start from the wrong seats
+            cohort.error = e
+            return
+        for batch_id in cohort.engine.changed_batch_ids():
+            change = cohort.engine.seats_taken[batch_id] - snapshot.batches[batch_id].seats_taken
+            seat_changes[batch_id] = seat_changes.get(batch_id, 0) + change
+
+
+def run_allocation_job(cohorts, publish=True, strategy=AllocationRun.GREEDY):
+    """
+    Allocate several (semester, academic_year) cohorts, publishing them all
+    if every one succeeds. Returns the CohortAllocation of each cohort.
+    """
+    catalog = AllocationCatalog.load()
+    cohorts = [
+        CohortAllocation(semester, academic_year, strategy)
+        for semester, academic_year in dict.fromkeys(cohorts)
+    ]
+    for group in group_cohorts(cohorts, catalog):
+        allocate_group(group, catalog)
+
+    failed = None
+    for cohort in cohorts:
+        if cohort.engine is not None and cohort.error is None:
+            try:
+                with transaction.atomic():
+                    finish_allocation_run(cohort.run, cohort.engine, cohort.profiler)
+            except Exception as e:
+                cohort.error = e
+        if cohort.engine is None or cohort.error is not None:
+            if cohort.run is not None:
+                cohort.run.status = AllocationRun.FAILED
+                cohort.run.save(update_fields=['status'])
+                cohort.profiler.save(cohort.run)
+            cohort.events.failed(cohort.error or "An earlier cohort of its group failed")
+            failed = failed or cohort.error
+        else:
+            cohort.events.finished(cohort.run)
+            cohort.profiler.save(cohort.run)
+
+    if failed is not None:
+        raise failed
+
+    if publish:
+        with transaction.atomic():
+            for cohort in cohorts:
+                with cohort.profiler.phase("Publish"):
+                    publish_run(cohort.run)
+        for cohort in cohorts:
+            cohort.profiler.save(cohort.run)
+    return cohorts
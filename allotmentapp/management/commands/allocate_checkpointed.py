@@ -0,0 +1,57 @@
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from allotmentapp.checkpoints import allocate_courses_checkpointed, get_interrupted_run
+from allotmentapp.models import AllocationRun
+from allotmentapp.views import get_current_academic_year
+
+
+class Command(BaseCommand):
+    help = "Allocate a semester committing after every pass, resuming an interrupted build if there is one"
+
+    def add_arguments(self, parser):
+        parser.add_argument('semester', type=int, choices=[1, 2, 3])
+        parser.add_argument(
+            '--year',
+            default=None,
+            help="Academic year as YYYY-YYYY (defaults to the current academic year)"
+        )
+        parser.add_argument(
+            '--no-publish',
+            action='store_true',
+            help="Leave the finished run ready instead of making it live"
+        )
+        parser.add_argument(
+            '--strategy',
+            default=AllocationRun.GREEDY,
+            choices=[strategy for strategy, label in AllocationRun.STRATEGIES],
+            help="Allocation engine to use for a new run (an interrupted run keeps its own)"
+        )
+
+    def handle(self, *args, **options):
+        academic_year = options['year'] or get_current_academic_year()
+        try:
+            start_year, end_year = map(int, academic_year.split('-'))
+        except ValueError:
+            raise CommandError("Academic year must be in format YYYY-YYYY")
+        if end_year != start_year + 1:
+            raise CommandError("Academic year should be consecutive (e.g., 2023-2024)")
+
+        interrupted = get_interrupted_run(options['semester'], academic_year)
+        if interrupted:
+            self.stdout.write(
+                f"Resuming {interrupted.strategy} run {interrupted.pk} after {interrupted.passes_saved} saved pass(es)"
+            )
+
+        try:
+            run = allocate_courses_checkpointed(
+                options['semester'], academic_year, publish=not options['no_publish'],
+                strategy=options['strategy']
+            )
+        except ValidationError as e:
+            raise CommandError("; ".join(e.messages))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Run {run.pk} {run.get_status_display().lower()}: {run.total_allotments} allotments "
+            f"in {run.passes_saved} passes"
+        ))
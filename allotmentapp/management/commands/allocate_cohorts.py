@@ -0,0 +1,69 @@
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from allotmentapp.jobs import run_allocation_job
+from allotmentapp.models import AllocationRun
+from allotmentapp.views import get_current_academic_year
+
+
+class Command(BaseCommand):
+    help = "Allocate several semesters and academic years in one job"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'cohorts',
+            nargs='+',
+            help="Cohorts as SEMESTER or SEMESTER:YYYY-YYYY, e.g. 1 2 3:2024-2025"
+        )
+        parser.add_argument(
+            '--year',
+            default=None,
+            help="Academic year for cohorts given without one (defaults to the current academic year)"
+        )
+        parser.add_argument(
+            '--no-publish',
+            action='store_true',
+            help="Leave the runs ready instead of making them live"
+        )
+        parser.add_argument(
+            '--strategy',
+            default=AllocationRun.GREEDY,
+            choices=[strategy for strategy, label in AllocationRun.STRATEGIES],
+            help="Allocation engine to use (defaults to greedy)"
+        )
+
+    def handle(self, *args, **options):
+        default_year = options['year'] or get_current_academic_year()
+        cohorts = [self.parse_cohort(value, default_year) for value in options['cohorts']]
+
+        try:
+            results = run_allocation_job(
+                cohorts, publish=not options['no_publish'],
+                strategy=options['strategy']
+            )
+        except ValidationError as e:
+            raise CommandError("; ".join(e.messages))
+
+        self.stdout.write("=" * 60)
+        for cohort in results:
+            run = cohort.run
+            seconds = sum(phase.get('seconds', 0) for phase in cohort.profiler.phases)
+            self.stdout.write(
+                f"  Semester {run.semester}  {run.academic_year}  run {run.pk:<5} "
+                f"{run.get_status_display():<8} {run.total_allotments:>6} allotments  {seconds:.2f}s"
+            )
+        self.stdout.write("=" * 60)
+
+    def parse_cohort(self, value, default_year):
+        semester, _, academic_year = value.partition(':')
+        academic_year = academic_year or default_year
+        try:
+            semester = int(semester)
+            start_year, end_year = map(int, academic_year.split('-'))
+        except ValueError:
+            raise CommandError(f"Invalid cohort '{value}'; use SEMESTER or SEMESTER:YYYY-YYYY")
+        if semester not in (1, 2, 3):
+            raise CommandError(f"Semester must be 1, 2 or 3, not {semester}")
+        if end_year != start_year + 1:
+            raise CommandError("Academic year should be consecutive (e.g., 2023-2024)")
+        return semester, academic_year
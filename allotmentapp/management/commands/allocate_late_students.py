@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from allotmentapp.incremental import allocate_late_students
+from allotmentapp.views import get_current_academic_year
+
+
+class Command(BaseCommand):
+    help = "Insert preferences submitted after a semester's allotment into the existing allocation"
+
+    def add_arguments(self, parser):
+        parser.add_argument('semester', type=int, choices=[1, 2, 3])
+        parser.add_argument(
+            '--year',
+            default=None,
+            help="Academic year as YYYY-YYYY (defaults to the current academic year)"
+        )
+
+    def handle(self, *args, **options):
+        academic_year = options['year'] or get_current_academic_year()
+        try:
+            start_year, end_year = map(int, academic_year.split('-'))
+        except ValueError:
+            raise CommandError("Academic year must be in format YYYY-YYYY")
+        if end_year != start_year + 1:
+            raise CommandError("Academic year should be consecutive (e.g., 2023-2024)")
+
+        result = allocate_late_students(options['semester'], academic_year)
+
+        self.stdout.write(f"  Pending students : {len(result['pending_students'])}")
+        self.stdout.write(self.style.SUCCESS(f"  Papers allotted  : {result['created']}"))
+        self.stdout.write(f"  Seats moved      : {result['moved']}")
+        self.stdout.write(self.style.WARNING(f"  Seats released   : {result['removed']}"))
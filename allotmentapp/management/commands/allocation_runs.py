@@ -0,0 +1,59 @@
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from allotmentapp.models import AllocationRun
+from allotmentapp.runs import collect_superseded_runs, publish_run, rollback_run
+from allotmentapp.views import get_current_academic_year
+
+
+class Command(BaseCommand):
+    help = "List, publish, roll back or garbage-collect allocation runs"
+
+    def add_arguments(self, parser):
+        parser.add_argument('action', choices=['list', 'publish', 'rollback', 'collect'])
+        parser.add_argument('--run', type=int, help="Run id to publish")
+        parser.add_argument('--semester', type=int, choices=[1, 2, 3], help="Semester to roll back")
+        parser.add_argument(
+            '--year',
+            default=None,
+            help="Academic year as YYYY-YYYY (defaults to the current academic year)"
+        )
+
+    def handle(self, *args, **options):
+        action = options['action']
+        try:
+            if action == 'list':
+                self.list_runs()
+            elif action == 'publish':
+                if not options['run']:
+                    raise CommandError("--run is required to publish")
+                try:
+                    run = AllocationRun.objects.get(pk=options['run'])
+                except AllocationRun.DoesNotExist:
+                    raise CommandError(f"Run {options['run']} does not exist")
+                previous = publish_run(run)
+                self.stdout.write(self.style.SUCCESS(
+                    f"Published run {run.pk}" + (f", replacing run {previous.pk}" if previous else "")
+                ))
+            elif action == 'rollback':
+                if not options['semester']:
+                    raise CommandError("--semester is required to roll back")
+                academic_year = options['year'] or get_current_academic_year()
+                run = rollback_run(options['semester'], academic_year)
+                self.stdout.write(self.style.SUCCESS(f"Rolled back to run {run.pk}"))
+            else:
+                deleted = collect_superseded_runs()
+                runs = deleted.get('allotmentapp.AllocationRun', 0)
+                allotments = deleted.get('allotmentapp.CourseAllotment', 0)
+                self.stdout.write(self.style.SUCCESS(
+                    f"Deleted {runs} run(s) and {allotments} allotment(s)"
+                ))
+        except ValidationError as e:
+            raise CommandError("; ".join(e.messages))
+
+    def list_runs(self):
+        for run in AllocationRun.objects.all():
+            self.stdout.write(
+                f"  {run.pk:>5}  Semester {run.semester}  {run.academic_year}  {run.get_status_display():<11} "
+                f"{run.total_allotments:>6} allotments  {run.created_at:%Y-%m-%d %H:%M}"
+            )
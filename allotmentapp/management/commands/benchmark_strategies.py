@@ -0,0 +1,63 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from allotmentapp.allocation import ALLOCATION_ENGINES, AllocationSnapshot
+from allotmentapp.views import get_current_academic_year
+
+
+class Command(BaseCommand):
+    help = "Time every allocation strategy on one snapshot of a semester and compare their outcomes"
+
+    def add_arguments(self, parser):
+        parser.add_argument('semester', type=int, choices=[1, 2, 3])
+        parser.add_argument(
+            '--year',
+            default=None,
+            help="Academic year as YYYY-YYYY (defaults to the current academic year)"
+        )
+        parser.add_argument('--repeat', type=int, default=3, help="Runs per strategy; the fastest is reported")
+
+    def handle(self, *args, **options):
+        academic_year = options['year'] or get_current_academic_year()
+        try:
+            start_year, end_year = map(int, academic_year.split('-'))
+        except ValueError:
+            raise CommandError("Academic year must be in format YYYY-YYYY")
+        if end_year != start_year + 1:
+            raise CommandError("Academic year should be consecutive (e.g., 2023-2024)")
+        if options['repeat'] < 1:
+            raise CommandError("--repeat must be at least 1")
+
+        started = time.perf_counter()
+        snapshot = AllocationSnapshot.load(options['semester'], academic_year)
+        self.stdout.write(
+            f"Loaded {len(snapshot.students)} students in {time.perf_counter() - started:.3f}s"
+        )
+
+        # Engines only read the snapshot, so every run starts from the same cohort
+        outcomes = {}
+        self.stdout.write("=" * 60)
+        for strategy, engine_class in ALLOCATION_ENGINES.items():
+            timings = []
+            for _ in range(options['repeat']):
+                started = time.perf_counter()
+                engine = engine_class(snapshot).run()
+                timings.append(time.perf_counter() - started)
+            outcomes[strategy] = (set(engine.allotments), len(engine.waitlist))
+            self.stdout.write(
+                f"  {strategy:<20} {min(timings):.3f}s  {len(engine.allotments):>6} allotments  "
+                f"{len(engine.waitlist):>6} waitlisted"
+            )
+        self.stdout.write("=" * 60)
+
+        strategies = list(outcomes)
+        baseline = strategies[0]
+        for strategy in strategies[1:]:
+            if outcomes[strategy][0] == outcomes[baseline][0]:
+                self.stdout.write(self.style.SUCCESS(f"{strategy} allots the same seats as {baseline}"))
+            else:
+                differing = len(outcomes[strategy][0] ^ outcomes[baseline][0])
+                self.stdout.write(self.style.WARNING(
+                    f"{strategy} and {baseline} differ in {differing} allotments"
+                ))
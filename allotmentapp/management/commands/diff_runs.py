@@ -0,0 +1,66 @@
+import csv
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from allotmentapp.diffs import (
+    AllotmentDiff, get_batch_labels, get_published_runs, get_run_allotments, iter_diff_rows
+)
+from allotmentapp.models import AllocationRun
+from allotmentapp.views import get_current_academic_year
+
+
+class Command(BaseCommand):
+    help = "Show who changed seats between two allocation runs"
+
+    def add_arguments(self, parser):
+        parser.add_argument('runs', nargs='*', type=int, help="Old and new run ids")
+        parser.add_argument(
+            '--semester',
+            type=int,
+            choices=[1, 2, 3],
+            help="Compare the live run of a semester with the run it replaced"
+        )
+        parser.add_argument(
+            '--year',
+            default=None,
+            help="Academic year as YYYY-YYYY (defaults to the current academic year)"
+        )
+        parser.add_argument('--csv', default=None, help="Write the diff to this CSV file instead")
+
+    def handle(self, *args, **options):
+        try:
+            if options['semester']:
+                old, new = get_published_runs(options['semester'], options['year'] or get_current_academic_year())
+            elif len(options['runs']) == 2:
+                runs = AllocationRun.objects.in_bulk(options['runs'])
+                missing = [run_id for run_id in options['runs'] if run_id not in runs]
+                if missing:
+                    raise CommandError(f"Run {missing[0]} does not exist")
+                old, new = (runs[run_id] for run_id in options['runs'])
+            else:
+                raise CommandError("Give two run ids or --semester")
+        except ValidationError as e:
+            raise CommandError("; ".join(e.messages))
+
+        diff = AllotmentDiff(get_run_allotments(old), get_run_allotments(new))
+        if options['csv']:
+            with open(options['csv'], 'w', newline='') as output:
+                csv.writer(output).writerows(iter_diff_rows(diff))
+        else:
+            labels = get_batch_labels()
+            for kind, admission_number, name, paper_no, old_batch_id, new_batch_id in diff.changes():
+                self.stdout.write(
+                    f"  {kind:<8} {admission_number} {name}  paper {paper_no}: "
+                    f"{labels.get(old_batch_id, '-')} -> {labels.get(new_batch_id, '-')}"
+                )
+            if diff.batch_deltas():
+                self.stdout.write("")
+            for batch_id, delta in diff.batch_deltas():
+                self.stdout.write(f"  {labels[batch_id]:<30} {delta:+d}")
+            self.stdout.write("")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Run {old.pk} -> run {new.pk}: {len(diff.students)} student(s) changed, "
+            f"{diff.unchanged} seat(s) unchanged, {len(diff.batch_deltas())} batch(es) changed"
+        ))
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from allotmentapp.course_changes import process_course_change_requests
+from allotmentapp.views import get_current_academic_year
+
+
+class Command(BaseCommand):
+    help = "Approve a semester's queued course change requests in merit order while seats last"
+
+    def add_arguments(self, parser):
+        parser.add_argument('semester', type=int, choices=[1, 2, 3])
+        parser.add_argument(
+            '--year',
+            default=None,
+            help="Academic year as YYYY-YYYY (defaults to the current academic year)"
+        )
+
+    def handle(self, *args, **options):
+        academic_year = options['year'] or get_current_academic_year()
+        try:
+            start_year, end_year = map(int, academic_year.split('-'))
+        except ValueError:
+            raise CommandError("Academic year must be in format YYYY-YYYY")
+        if end_year != start_year + 1:
+            raise CommandError("Academic year should be consecutive (e.g., 2023-2024)")
+
+        result = process_course_change_requests(options['semester'], academic_year)
+        self.stdout.write(self.style.SUCCESS(
+            f"{result['approved']} course changes approved; {result['rejected']} rejected"
+        ))
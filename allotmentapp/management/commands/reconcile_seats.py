@@ -0,0 +1,53 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from allotmentapp.integrity import reconcile_allotments
+from allotmentapp.models import Batch
+
+
+class Command(BaseCommand):
+    help = (
+        "Check every batch's seats_taken against its live allotments and look for "
+        "duplicate student/paper/semester allotments"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fix',
+            action='store_true',
+            help="Delete the duplicates, keeping the earliest of each, and recount the affected batches"
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        result = reconcile_allotments(fix=options['fix'])
+        elapsed = time.perf_counter() - started
+
+        batches = Batch.objects.select_related('course').in_bulk(
+            {batch_id for batch_id, seats_taken, counted in result['drift']} |
+            {batch_id for allotment_id, student_id, paper_no, batch_id in result['duplicates']}
+        )
+        for batch_id, seats_taken, counted in result['drift']:
+            batch = batches[batch_id]
+            self.stdout.write(self.style.WARNING(
+                f"  [DRIFT]      {batch.course.course_code} {batch.year} Part {batch.part}: "
+                f"seats_taken {seats_taken}, {counted} allotments"
+            ))
+        for allotment_id, student_id, paper_no, batch_id in result['duplicates']:
+            batch = batches[batch_id]
+            self.stdout.write(self.style.WARNING(
+                f"  [DUPLICATE]  allotment {allotment_id}: student {student_id} paper {paper_no} "
+                f"in {batch.course.course_code} {batch.year}"
+            ))
+
+        summary = (
+            f"{len(result['drift'])} batch(es) with drifted seat counts, "
+            f"{len(result['duplicates'])} duplicate allotment(s), checked in {elapsed:.2f}s"
+        )
+        if not result['drift'] and not result['duplicates']:
+            self.stdout.write(self.style.SUCCESS(f"Seat counts and allotments are consistent ({elapsed:.2f}s)"))
+        elif options['fix']:
+            self.stdout.write(self.style.SUCCESS(f"Fixed {summary}"))
+        else:
+            self.stdout.write(self.style.WARNING(f"Found {summary}; run with --fix to repair"))
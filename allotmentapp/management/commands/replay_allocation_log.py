@@ -0,0 +1,31 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from allotmentapp.decisions import get_decision_log_path, replay_log
+from allotmentapp.models import AllocationRun
+
+
+class Command(BaseCommand):
+    help = "Explain the decisions of an allocation run, or of one student in it, from its decision log"
+
+    def add_arguments(self, parser):
+        parser.add_argument('run', help="Run id, or the path of a decision log file")
+        parser.add_argument('--student', default=None, help="Admission number to trace")
+
+    def handle(self, *args, **options):
+        path = options['run']
+        if path.isdigit():
+            path = get_decision_log_path(AllocationRun(pk=int(path)))
+        if not os.path.exists(path):
+            raise CommandError(f"No decision log at {path}")
+
+        try:
+            lines = replay_log(path, options['student'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        for line in lines:
+            self.stdout.write(line)
+        if not lines:
+            self.stdout.write(self.style.WARNING("No decisions recorded"))
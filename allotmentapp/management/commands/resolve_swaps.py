@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from allotmentapp.swaps import resolve_swap_requests
+from allotmentapp.views import get_current_academic_year
+
+
+class Command(BaseCommand):
+    help = "Carry out every trade cycle among a semester's pending batch swap requests"
+
+    def add_arguments(self, parser):
+        parser.add_argument('semester', type=int, choices=[1, 2, 3])
+        parser.add_argument(
+            '--year',
+            default=None,
+            help="Academic year as YYYY-YYYY (defaults to the current academic year)"
+        )
+
+    def handle(self, *args, **options):
+        academic_year = options['year'] or get_current_academic_year()
+        try:
+            start_year, end_year = map(int, academic_year.split('-'))
+        except ValueError:
+            raise CommandError("Academic year must be in format YYYY-YYYY")
+        if end_year != start_year + 1:
+            raise CommandError("Academic year should be consecutive (e.g., 2023-2024)")
+
+        result = resolve_swap_requests(options['semester'], academic_year)
+        self.stdout.write(self.style.SUCCESS(
+            f"{result['swapped']} students swapped in {result['cycles']} cycles; "
+            f"{result['cancelled']} stale requests cancelled"
+        ))
@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from allotmentapp.jobqueue import STALL_TIMEOUT, claim_next_job, requeue_stalled_jobs, run_job
+from allotmentapp.models import BackgroundJob
+
+
+class Command(BaseCommand):
+    help = "Run queued background jobs (allocations, exports, imports); keeps polling unless --once is given"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Exit when the queue is empty")
+        parser.add_argument('--poll-interval', type=float, default=2.0, help="Seconds to wait when the queue is empty")
+        parser.add_argument(
+            '--stall-timeout', type=int, default=STALL_TIMEOUT,
+            help="Seconds without progress after which a running job is queued again"
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            requeued, failed = requeue_stalled_jobs(options['stall_timeout'])
+            if requeued or failed:
+                self.stdout.write(self.style.WARNING(f"Re-queued {requeued} and failed {failed} stalled jobs"))
+
+            job = claim_next_job()
+            if job is None:
+                if options['once']:
+                    return
+                time.sleep(options['poll_interval'])
+                continue
+
+            self.stdout.write(f"Running {job}")
+            job = run_job(job)
+            if job.status == BackgroundJob.DONE:
+                self.stdout.write(self.style.SUCCESS(f"{job}: {job.result.get('message', '')}"))
+            else:
+                self.stdout.write(self.style.ERROR(f"{job}: {job.error.strip().splitlines()[-1]}"))
@@ -0,0 +1,60 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from allotmentapp.allocation import simulate_allocation
+from allotmentapp.models import AllocationRun
+from allotmentapp.views import get_current_academic_year
+
+
+class Command(BaseCommand):
+    help = "Preview a semester allotment without writing anything to the database"
+
+    def add_arguments(self, parser):
+        parser.add_argument('semester', type=int, choices=[1, 2, 3])
+        parser.add_argument(
+            '--year',
+            default=None,
+            help="Academic year as YYYY-YYYY (defaults to the current academic year)"
+        )
+        parser.add_argument(
+            '--strategy',
+            default=AllocationRun.GREEDY,
+            choices=[strategy for strategy, label in AllocationRun.STRATEGIES],
+            help="Allocation engine to use (defaults to greedy)"
+        )
+
+    def handle(self, *args, **options):
+        academic_year = options['year'] or get_current_academic_year()
+        try:
+            start_year, end_year = map(int, academic_year.split('-'))
+        except ValueError:
+            raise CommandError("Academic year must be in format YYYY-YYYY")
+        if end_year != start_year + 1:
+            raise CommandError("Academic year should be consecutive (e.g., 2023-2024)")
+
+        report = simulate_allocation(options['semester'], academic_year, strategy=options['strategy'])
+
+        self.stdout.write("=" * 60)
+        self.stdout.write(f"  Semester {report['semester']} simulation for {report['academic_year']}")
+        self.stdout.write("=" * 60)
+        for batch in report['batches']:
+            self.stdout.write(
+                f"  {batch['course_code']:<15} {batch['year']} Part {batch['part']}  "
+                f"{batch['seats_taken']:>4}/{batch['seat_limit']:<4} ({batch['fill_percentage']}%)"
+                f"{'' if batch['status'] else '  [inactive]'}"
+            )
+
+        if report['unallocated']:
+            self.stdout.write("")
+            for student in report['unallocated']:
+                papers = ", ".join(str(paper_no) for paper_no in student['missing_papers'])
+                self.stdout.write(self.style.WARNING(
+                    f"  [UNALLOCATED]  {student['admission_number']} — {student['name']}  (papers: {papers})"
+                ))
+
+        self.stdout.write("\n" + "=" * 60)
+        self.stdout.write(f"  Students    : {report['total_students']}")
+        self.stdout.write(self.style.SUCCESS(f"  Allotments  : {report['total_allotments']}"))
+        self.stdout.write(self.style.WARNING(f"  Unallocated : {len(report['unallocated'])}"))
+        self.stdout.write(f"  Load time   : {report['load_seconds']}s")
+        self.stdout.write(f"  Allocation  : {report['allocation_seconds']}s")
+        self.stdout.write("=" * 60)
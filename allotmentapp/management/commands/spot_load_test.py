@@ -0,0 +1,143 @@
+import threading
+import time
+from collections import Counter
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connection, transaction
+from django.db.models import F
+
+from allotmentapp.allocation import get_target_admission_year
+from allotmentapp.models import Batch, CourseAllotment, SpotRound, Student
+from allotmentapp.spot import claim_spot_seat, get_semester_papers, get_spot_batches
+from allotmentapp.views import get_current_academic_year
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-test the spot round: every student of a semester without a seat for a "
+        "paper claims their first eligible batch at once, from many concurrent clients"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('semester', type=int, choices=[1, 2, 3])
+        parser.add_argument(
+            '--year',
+            default=None,
+            help="Academic year as YYYY-YYYY (defaults to the current academic year)"
+        )
+        parser.add_argument('--clients', type=int, default=100, help="Concurrent claiming clients")
+        parser.add_argument(
+            '--keep',
+            action='store_true',
+            help="Keep the claimed seats instead of giving them back after the test"
+        )
+
+    def handle(self, *args, **options):
+        academic_year = options['year'] or get_current_academic_year()
+        try:
+            start_year, end_year = map(int, academic_year.split('-'))
+        except ValueError:
+            raise CommandError("Academic year must be in format YYYY-YYYY")
+        if end_year != start_year + 1:
+            raise CommandError("Academic year should be consecutive (e.g., 2023-2024)")
+        semester = options['semester']
+
+        spot_round, _ = SpotRound.objects.get_or_create(semester=semester, academic_year=academic_year)
+        placed = set(CourseAllotment.objects.filter(
+            batch__course__semester=semester, batch__year=academic_year
+        ).values_list('student_id', 'paper_no'))
+        student_ids = Student.objects.filter(
+            current_sem=semester, admission_year=get_target_admission_year(semester, academic_year)
+        ).order_by('admission_number').values_list('id', flat=True)
+
+        # Everyone goes for the first batch with seats left, so those few seats see real contention
+        attempts = []
+        for student_id in student_ids:
+            for paper_no in get_semester_papers(semester):
+                if (student_id, paper_no) not in placed:
+                    batch = get_spot_batches(student_id, paper_no, semester, academic_year).filter(
+                        seats_taken__lt=F('course__seat_limit')
+                    ).order_by('id').first()
+                    if batch is not None:
+                        attempts.append((student_id, batch, paper_no))
+        if not attempts:
+            self.stdout.write("No student is missing a seat; nothing to claim")
+            return
+
+        free_before = {
+            batch.id: batch.seats_available
+            for batch in Batch.objects.filter(id__in={batch.id for _, batch, _ in attempts}).select_related('course')
+        }
+        results = []
+        lock = threading.Lock()
+        pending = iter(attempts)
+        clients = max(1, min(options['clients'], len(attempts)))
+        barrier = threading.Barrier(clients + 1)
+
+        def client():
+            barrier.wait()
+            try:
+                while True:
+                    with lock:
+                        attempt = next(pending, None)
+                    if attempt is None:
+                        return
+                    student_id, batch, paper_no = attempt
+                    started = time.perf_counter()
+                    try:
+                        allotment = claim_spot_seat(spot_round, student_id, batch, paper_no)
+                        outcome = ('claimed', allotment.id, batch.id)
+                    except ValidationError:
+                        outcome = ('rejected', None, batch.id)
+                    except DatabaseError:
+                        outcome = ('error', None, batch.id)
+                    with lock:
+                        results.append((outcome, time.perf_counter() - started))
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=client) for _ in range(clients)]
+        for thread in threads:
+            thread.start()
+        barrier.wait()
+        started = time.perf_counter()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        outcomes = Counter(kind for (kind, _, _), _ in results)
+        latencies = sorted(latency for _, latency in results)
+        claimed_per_batch = Counter(batch_id for (kind, _, batch_id), _ in results if kind == 'claimed')
+        self.stdout.write(
+            f"{len(attempts)} claims from {clients} clients in {elapsed:.2f}s "
+            f"({len(attempts) / elapsed:.0f} claims/s)"
+        )
+        self.stdout.write(
+            f"claimed {outcomes['claimed']}, rejected {outcomes['rejected']}, database errors {outcomes['error']}"
+        )
+        self.stdout.write(
+            f"latency p50 {latencies[len(latencies) // 2] * 1000:.1f} ms, "
+            f"p95 {latencies[int(len(latencies) * 0.95)] * 1000:.1f} ms, "
+            f"max {latencies[-1] * 1000:.1f} ms"
+        )
+
+        oversold = [
+            batch for batch in Batch.objects.filter(id__in=free_before).select_related('course')
+            if batch.seats_taken > batch.seat_limit or claimed_per_batch[batch.id] > free_before[batch.id]
+        ]
+        if oversold:
+            self.stdout.write(self.style.ERROR(
+                "Oversold: " + ", ".join(batch.course.course_code for batch in oversold)
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS("No batch was oversold"))
+
+        if not options['keep']:
+            with transaction.atomic():
+                CourseAllotment.all_runs.filter(
+                    id__in=[allotment_id for (kind, allotment_id, _), _ in results if kind == 'claimed']
+                ).delete()
+                for batch_id, count in claimed_per_batch.items():
+                    Batch.objects.filter(pk=batch_id).update(seats_taken=F('seats_taken') - count)
+            self.stdout.write("Claimed seats given back")
@@ -0,0 +1,59 @@
+import json
+import time
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from allotmentapp.allocation import AllocationSnapshot
+from allotmentapp.views import get_current_academic_year
+from allotmentapp.whatif import evaluate_scenarios
+
+
+class Command(BaseCommand):
+    help = "Compare seat limit and quota scenarios against one preference snapshot"
+
+    def add_arguments(self, parser):
+        parser.add_argument('semester', type=int, choices=[1, 2, 3])
+        parser.add_argument(
+            'scenarios',
+            help="JSON file with a list of scenarios (see allotmentapp/whatif.py)"
+        )
+        parser.add_argument(
+            '--year',
+            default=None,
+            help="Academic year as YYYY-YYYY (defaults to the current academic year)"
+        )
+
+    def handle(self, *args, **options):
+        academic_year = options['year'] or get_current_academic_year()
+        try:
+            with open(options['scenarios'], encoding='utf-8') as f:
+                scenarios = json.load(f)
+        except (OSError, ValueError) as e:
+            raise CommandError(f"Could not read scenarios: {e}")
+        if not isinstance(scenarios, list):
+            raise CommandError("The scenarios file must contain a JSON list")
+
+        started = time.perf_counter()
+        snapshot = AllocationSnapshot.load(options['semester'], academic_year)
+        try:
+            results = evaluate_scenarios(snapshot, scenarios)
+        except ValidationError as e:
+            raise CommandError("; ".join(e.messages))
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write("=" * 78)
+        self.stdout.write(
+            f"  {'Scenario':<30} {'Fill %':>8} {'1st pref %':>11} "
+            f"{'Unalloc. students':>18} {'papers':>7}"
+        )
+        self.stdout.write("=" * 78)
+        for result in results:
+            self.stdout.write(
+                f"  {result['name'][:30]:<30} {result['fill_rate']:>8} {result['first_preference_rate']:>11} "
+                f"{result['unallocated_students']:>18} {result['unallocated_papers']:>7}"
+            )
+        self.stdout.write("=" * 78)
+        self.stdout.write(self.style.SUCCESS(
+            f"  Evaluated {len(results)} scenarios for {len(snapshot.students)} students in {elapsed:.2f}s"
+        ))
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.4 on 2026-10-18 08:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('allotmentapp', '0013_remove_courseallotment_unique_student_paper_allotment_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BatchWaitlist',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('paper_no', models.PositiveIntegerField(default=1)),
+                ('position', models.PositiveIntegerField(help_text='Order in which the allocation reached this student')),
+                ('preference_rank', models.PositiveSmallIntegerField(help_text="Where the batch sits in the student's preferences")),
+                ('batch', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='waitlist', to='allotmentapp.batch')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='allotmentapp.student')),
+            ],
+            options={
+                'ordering': ['batch', 'position'],
+                'indexes': [models.Index(fields=['batch', 'position'], name='waitlist_batch_position'), models.Index(fields=['student', 'paper_no'], name='waitlist_student_paper')],
+                'constraints': [models.UniqueConstraint(fields=('batch', 'student', 'paper_no'), name='unique_waitlist_batch_student_paper')],
+            },
+        ),
+    ]
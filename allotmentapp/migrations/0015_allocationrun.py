@@ -0,0 +1,108 @@
+# Generated by Django 5.2.4 on 2026-10-18 08:59
+
+import django.core.validators
+import django.db.models.deletion
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def create_runs_for_existing_allotments(apps, schema_editor):
+    """Group existing allotments into one published run per semester and year"""
+    AllocationRun = apps.get_model('allotmentapp', 'AllocationRun')
+    ActiveAllocationRun = apps.get_model('allotmentapp', 'ActiveAllocationRun')
+    CourseAllotment = apps.get_model('allotmentapp', 'CourseAllotment')
+    BatchWaitlist = apps.get_model('allotmentapp', 'BatchWaitlist')
+
+    groups = CourseAllotment.objects.values_list(
+        'batch__course__semester', 'batch__year'
+    ).distinct()
+    for semester, academic_year in list(groups):
+        allotments = CourseAllotment.objects.filter(
+            batch__course__semester=semester, batch__year=academic_year
+        )
+        run = AllocationRun.objects.create(
+            semester=semester,
+            academic_year=academic_year,
+            status='active',
+            total_allotments=allotments.count(),
+            published_at=timezone.now()
+        )
+        ActiveAllocationRun.objects.create(semester=semester, academic_year=academic_year, run=run)
+        allotments.update(run=run)
+        BatchWaitlist.objects.filter(
+            batch__course__semester=semester, batch__year=academic_year
+        ).update(run=run)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('allotmentapp', '0014_batchwaitlist'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActiveAllocationRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('semester', models.PositiveIntegerField()),
+                ('academic_year', models.CharField(max_length=9)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='AllocationRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('semester', models.PositiveIntegerField(validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(8)])),
+                ('academic_year', models.CharField(max_length=9)),
+                ('status', models.CharField(choices=[('building', 'Building'), ('ready', 'Ready'), ('active', 'Active'), ('superseded', 'Superseded'), ('failed', 'Failed')], default='building', max_length=10)),
+                ('total_allotments', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('published_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.RemoveConstraint(
+            model_name='batchwaitlist',
+            name='unique_waitlist_batch_student_paper',
+        ),
+        migrations.RemoveIndex(
+            model_name='batchwaitlist',
+            name='waitlist_batch_position',
+        ),
+        migrations.AddField(
+            model_name='activeallocationrun',
+            name='previous_run',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='allotmentapp.allocationrun'),
+        ),
+        migrations.AddField(
+            model_name='activeallocationrun',
+            name='run',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.PROTECT, related_name='active_pointer', to='allotmentapp.allocationrun'),
+        ),
+        migrations.AddField(
+            model_name='batchwaitlist',
+            name='run',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='waitlist', to='allotmentapp.allocationrun'),
+        ),
+        migrations.AddField(
+            model_name='courseallotment',
+            name='run',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='allotments', to='allotmentapp.allocationrun'),
+        ),
+        migrations.AddIndex(
+            model_name='batchwaitlist',
+            index=models.Index(fields=['run', 'batch', 'position'], name='waitlist_run_batch_position'),
+        ),
+        migrations.AddConstraint(
+            model_name='batchwaitlist',
+            constraint=models.UniqueConstraint(fields=('run', 'batch', 'student', 'paper_no'), name='unique_waitlist_run_batch_student_paper'),
+        ),
+        migrations.AddConstraint(
+            model_name='activeallocationrun',
+            constraint=models.UniqueConstraint(fields=('semester', 'academic_year'), name='unique_active_run_semester_year'),
+        ),
+        migrations.RunPython(create_runs_for_existing_allotments, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.4 on 2026-10-18 09:04
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('allotmentapp', '0015_allocationrun'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AllocationRunPhase',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveSmallIntegerField()),
+                ('name', models.CharField(max_length=50)),
+                ('seconds', models.FloatField()),
+                ('queries', models.PositiveIntegerField(default=0)),
+                ('rows_read', models.PositiveIntegerField(default=0)),
+                ('rows_written', models.PositiveIntegerField(default=0)),
+                ('allotments', models.PositiveIntegerField(default=0)),
+                ('peak_memory_kb', models.PositiveIntegerField(default=0, help_text='Peak resident memory of the process when the phase ended')),
+                ('run', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='phases', to='allotmentapp.allocationrun')),
+            ],
+            options={
+                'ordering': ['run', 'position'],
+            },
+        ),
+    ]
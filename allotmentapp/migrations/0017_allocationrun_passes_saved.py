@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-18 09:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('allotmentapp', '0016_allocationrunphase'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='allocationrun',
+            name='passes_saved',
+            field=models.PositiveIntegerField(default=0, help_text='Allocation passes committed so far by a checkpointed build'),
+        ),
+    ]
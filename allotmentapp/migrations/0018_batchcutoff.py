@@ -0,0 +1,31 @@
+# Generated by Django 5.2.4 on 2026-10-18 09:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('allotmentapp', '0017_allocationrun_passes_saved'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BatchCutoff',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('paper_no', models.PositiveIntegerField()),
+                ('admission_category', models.CharField(max_length=20)),
+                ('admitted', models.PositiveIntegerField(default=0)),
+                ('last_rank', models.PositiveIntegerField(help_text='Merit rank of the last student admitted, 1 being the top')),
+                ('last_marks', models.FloatField(blank=True, null=True)),
+                ('batch', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cutoffs', to='allotmentapp.batch')),
+                ('run', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cutoffs', to='allotmentapp.allocationrun')),
+            ],
+            options={
+                'ordering': ['run', 'batch', 'paper_no', 'admission_category'],
+                'constraints': [models.UniqueConstraint(fields=('run', 'batch', 'paper_no', 'admission_category'), name='unique_cutoff_run_batch_paper_category')],
+            },
+        ),
+    ]
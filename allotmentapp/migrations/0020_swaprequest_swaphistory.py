@@ -0,0 +1,60 @@
+# Generated by Django 5.2.4 on 2026-10-18 09:34
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('allotmentapp', '0019_backgroundjob'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SwapRequest',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('paper_no', models.PositiveIntegerField()),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('swapped', 'Swapped'), ('cancelled', 'Cancelled')], default='pending', max_length=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('resolved_at', models.DateTimeField(blank=True, null=True)),
+                ('offered_batch', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='swaps_offered', to='allotmentapp.batch')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='swap_requests', to='allotmentapp.student')),
+                ('wanted_batch', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='swaps_wanted', to='allotmentapp.batch')),
+            ],
+            options={
+                'ordering': ['id'],
+            },
+        ),
+        migrations.CreateModel(
+            name='SwapHistory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('paper_no', models.PositiveIntegerField()),
+                ('cycle', models.PositiveIntegerField(help_text="Id of the cycle's first swap request")),
+                ('swapped_at', models.DateTimeField(auto_now_add=True)),
+                ('notes', models.TextField(blank=True)),
+                ('allotment', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='allotmentapp.courseallotment')),
+                ('new_batch', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='allotmentapp.batch')),
+                ('old_batch', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='allotmentapp.batch')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='swap_history', to='allotmentapp.student')),
+                ('swapped_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+                ('request', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='history', to='allotmentapp.swaprequest')),
+            ],
+            options={
+                'verbose_name_plural': 'Swap histories',
+                'ordering': ['-swapped_at', 'cycle', 'id'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='swaprequest',
+            index=models.Index(fields=['status', 'offered_batch'], name='swap_status_offered'),
+        ),
+        migrations.AddConstraint(
+            model_name='swaprequest',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'pending')), fields=('student', 'paper_no'), name='unique_pending_swap_student_paper'),
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.2.4 on 2026-10-18 09:37
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('allotmentapp', '0020_swaprequest_swaphistory'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourseChangeRequest',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('paper_no', models.PositiveIntegerField()),
+                ('reason', models.TextField(blank=True)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('approved', 'Approved'), ('rejected', 'Rejected'), ('cancelled', 'Cancelled')], default='pending', max_length=10)),
+                ('outcome', models.CharField(blank=True, max_length=200)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('resolved_at', models.DateTimeField(blank=True, null=True)),
+                ('current_batch', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='changes_from', to='allotmentapp.batch')),
+                ('new_batch', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='changes_to', to='allotmentapp.batch')),
+                ('requested_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='course_change_requests', to='allotmentapp.student')),
+            ],
+            options={
+                'ordering': ['id'],
+            },
+        ),
+        migrations.CreateModel(
+            name='CourseChangeHistory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('paper_no', models.PositiveIntegerField()),
+                ('reason', models.TextField(blank=True)),
+                ('changed_at', models.DateTimeField(auto_now_add=True)),
+                ('allotment', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='allotmentapp.courseallotment')),
+                ('changed_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+                ('new_batch', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='allotmentapp.batch')),
+                ('old_batch', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='allotmentapp.batch')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='course_changes', to='allotmentapp.student')),
+                ('request', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='history', to='allotmentapp.coursechangerequest')),
+            ],
+            options={
+                'verbose_name_plural': 'Course change histories',
+                'ordering': ['-changed_at', 'id'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='coursechangerequest',
+            index=models.Index(fields=['status', 'current_batch'], name='change_status_current'),
+        ),
+        migrations.AddConstraint(
+            model_name='coursechangerequest',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'pending')), fields=('student', 'paper_no'), name='unique_pending_change_student_paper'),
+        ),
+    ]
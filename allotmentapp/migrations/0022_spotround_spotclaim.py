@@ -0,0 +1,44 @@
+# Generated by Django 5.2.4 on 2026-10-18 09:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('allotmentapp', '0021_coursechangerequest_coursechangehistory'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SpotRound',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('semester', models.PositiveIntegerField()),
+                ('academic_year', models.CharField(max_length=9)),
+                ('is_open', models.BooleanField(default=False)),
+                ('opened_at', models.DateTimeField(blank=True, null=True)),
+                ('closed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('semester', 'academic_year'), name='unique_spot_round_semester_year')],
+            },
+        ),
+        migrations.CreateModel(
+            name='SpotClaim',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('paper_no', models.PositiveIntegerField()),
+                ('claimed_at', models.DateTimeField(auto_now_add=True)),
+                ('allotment', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='spot_claim', to='allotmentapp.courseallotment')),
+                ('batch', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='spot_claims', to='allotmentapp.batch')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='spot_claims', to='allotmentapp.student')),
+                ('spot_round', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='claims', to='allotmentapp.spotround')),
+            ],
+            options={
+                'ordering': ['claimed_at', 'id'],
+                'constraints': [models.UniqueConstraint(fields=('spot_round', 'student', 'paper_no'), name='unique_spot_claim_student_paper')],
+            },
+        ),
+    ]
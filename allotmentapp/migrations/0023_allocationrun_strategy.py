@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-18 09:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('allotmentapp', '0022_spotround_spotclaim'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='allocationrun',
+            name='strategy',
+            field=models.CharField(choices=[('greedy', 'Greedy, student by student'), ('deferred_acceptance', 'Deferred acceptance')], default='greedy', help_text='Allocation engine the run was built with', max_length=20),
+        ),
+    ]
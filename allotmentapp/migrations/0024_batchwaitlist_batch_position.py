@@ -0,0 +1,17 @@
+# Generated by Django 5.2.4 on 2026-10-18 10:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('allotmentapp', '0023_allocationrun_strategy'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='batchwaitlist',
+            index=models.Index(fields=['batch', 'position'], name='waitlist_batch_position'),
+        ),
+    ]
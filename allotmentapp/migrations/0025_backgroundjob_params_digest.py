@@ -0,0 +1,22 @@
+# Generated by Django 5.2.4 on 2026-10-18 10:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('allotmentapp', '0024_batchwaitlist_batch_position'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='backgroundjob',
+            name='params_digest',
+            field=models.CharField(blank=True, help_text='SHA-256 of the params, to find identical jobs', max_length=64),
+        ),
+        migrations.AddIndex(
+            model_name='backgroundjob',
+            index=models.Index(fields=['kind', 'params_digest'], name='job_kind_params'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-18 10:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('allotmentapp', '0025_backgroundjob_params_digest'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='allocationrunphase',
+            name='peak_memory_kb',
+            field=models.PositiveIntegerField(default=0, help_text='Peak resident memory during the phase; where the peak cannot be reset, how far the phase raised it'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.4 on 2026-10-18 10:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('allotmentapp', '0026_allocationrunphase_peak_memory_help'),
+    ]
+
+    # Added without auto_now_add first, which would stamp every existing
+    # preference with the migration time and make it look late
+    operations = [
+        migrations.AddField(
+            model_name='coursepreference',
+            name='submitted_at',
+            field=models.DateTimeField(help_text='Empty for preferences submitted before this was recorded', null=True),
+        ),
+        migrations.AlterField(
+            model_name='coursepreference',
+            name='submitted_at',
+            field=models.DateTimeField(auto_now_add=True, help_text='Empty for preferences submitted before this was recorded', null=True),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.4 on 2026-10-18 10:33
+
+from django.db import migrations, models
+
+
+def record_run_students(apps, schema_editor):
+    """Runs built before membership was recorded allocated everyone they seated or waitlisted"""
+    AllocationRun = apps.get_model('allotmentapp', 'AllocationRun')
+    CourseAllotment = apps.get_model('allotmentapp', 'CourseAllotment')
+    BatchWaitlist = apps.get_model('allotmentapp', 'BatchWaitlist')
+    members = set()
+    for model in (CourseAllotment, BatchWaitlist):
+        members.update(
+            model.objects.filter(run__isnull=False).values_list('run_id', 'student_id').distinct()
+        )
+    Membership = AllocationRun.students.through
+    Membership.objects.bulk_create([
+        Membership(allocationrun_id=run_id, student_id=student_id) for run_id, student_id in sorted(members)
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('allotmentapp', '0027_coursepreference_submitted_at'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='coursepreference',
+            name='submitted_at',
+        ),
+        migrations.AddField(
+            model_name='allocationrun',
+            name='students',
+            field=models.ManyToManyField(blank=True, help_text='Students whose preferences the run allocated; anyone else submitting later is late', related_name='allocation_runs', to='allotmentapp.student'),
+        ),
+        migrations.RunPython(record_run_students, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.4 on 2026-10-18 10:34
+
+from django.db import migrations, models
+
+
+def lease_interrupted_builds(apps, schema_editor):
+    """Builds interrupted after a checkpoint stay resumable; their lease has long run out"""
+    AllocationRun = apps.get_model('allotmentapp', 'AllocationRun')
+    AllocationRun.objects.filter(status='building', passes_saved__gt=0).update(
+        heartbeat_at=models.F('created_at'), build_attempts=1
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('allotmentapp', '0028_allocationrun_students'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='allocationrun',
+            name='build_attempts',
+            field=models.PositiveIntegerField(default=0, help_text='Times a checkpointed build has claimed the run; writes of earlier claims are refused'),
+        ),
+        migrations.AddField(
+            model_name='allocationrun',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, help_text='Last sign of life from the checkpointed build holding the run', null=True),
+        ),
+        migrations.RunPython(lease_interrupted_builds, migrations.RunPython.noop),
+    ]
@@ -228,18 +228,16 @@ class Batch(models.Model):
         super().save(*args, **kwargs)
 
     def increment_seats_taken(self):
-        """Atomically increases seats_taken count"""
-        if self.seats_available <= 0:
+        """Atomically takes a seat if one is left; a single conditional UPDATE, so it never oversells"""
+        if not Batch.objects.filter(pk=self.pk, seats_taken__lt=self.seat_limit).update(seats_taken=F('seats_taken') + 1):
             raise ValueError("No seats available in this batch")
-        Batch.objects.filter(pk=self.pk).update(seats_taken=F('seats_taken') + 1)
-        self.refresh_from_db()
+        self.seats_taken += 1
 
     def decrement_seats_taken(self):
         """Atomically decreases seats_taken count"""
-        if self.seats_taken <= 0:
+        if not Batch.objects.filter(pk=self.pk, seats_taken__gt=0).update(seats_taken=F('seats_taken') - 1):
             raise ValueError("Cannot decrement below 0 seats taken")
-        Batch.objects.filter(pk=self.pk).update(seats_taken=F('seats_taken') - 1)
-        self.refresh_from_db()
+        self.seats_taken = max(self.seats_taken - 1, 0)
 
     def reset_seats(self):
         """Resets allocation count (for new semesters)"""
@@ -286,10 +284,161 @@ class CoursePreference(models.Model):
     def __str__(self):
         return f"{self.student} - {self.batch} (Pref: {self.preference_number}, Paper: {self.paper_no})"
 
+class AllocationRun(models.Model):
+    """One allocation of a semester's cohort; its allotments go live when it is published"""
+    BUILDING = 'building'
+    READY = 'ready'
+    ACTIVE = 'active'
+    SUPERSEDED = 'superseded'
+    FAILED = 'failed'
+    STATUS = [
+        (BUILDING, 'Building'),
+        (READY, 'Ready'),
+        (ACTIVE, 'Active'),
+        (SUPERSEDED, 'Superseded'),
+        (FAILED, 'Failed'),
+    ]
+    GREEDY = 'greedy'
+    DEFERRED_ACCEPTANCE = 'deferred_acceptance'
+    STRATEGIES = [
+        (GREEDY, 'Greedy, student by student'),
+        (DEFERRED_ACCEPTANCE, 'Deferred acceptance'),
+    ]
+
+    semester = models.PositiveIntegerField(
+        validators=[
+            MinValueValidator(1),
+            MaxValueValidator(8)
+        ]
+    )
+    academic_year = models.CharField(max_length=9)
+    status = models.CharField(max_length=10, choices=STATUS, default=BUILDING)
+    strategy = models.CharField(
+        max_length=20,
+        choices=STRATEGIES,
+        default=GREEDY,
+        help_text="Allocation engine the run was built with"
+    )
+    total_allotments = models.PositiveIntegerField(default=0)
+    passes_saved = models.PositiveIntegerField(
+        default=0,
+        help_text="Allocation passes committed so far by a checkpointed build"
+    )
+    build_attempts = models.PositiveIntegerField(
+        default=0,
+        help_text="Times a checkpointed build has claimed the run; writes of earlier claims are refused"
+    )
+    heartbeat_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text="Last sign of life from the checkpointed build holding the run"
+    )
+    students = models.ManyToManyField(
+        Student,
+        related_name='allocation_runs',
+        blank=True,
+        help_text="Students whose preferences the run allocated; anyone else submitting later is late"
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    published_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Run {self.pk} - Semester {self.semester} {self.academic_year} ({self.get_status_display()})"
+
+class AllocationRunPhase(models.Model):
+    """Profile of one phase of an allocation run"""
+    run = models.ForeignKey(AllocationRun, on_delete=models.CASCADE, related_name='phases')
+    position = models.PositiveSmallIntegerField()
+    name = models.CharField(max_length=50)
+    seconds = models.FloatField()
+    queries = models.PositiveIntegerField(default=0)
+    rows_read = models.PositiveIntegerField(default=0)
+    rows_written = models.PositiveIntegerField(default=0)
+    allotments = models.PositiveIntegerField(default=0)
+    peak_memory_kb = models.PositiveIntegerField(
+        default=0,
+        help_text="Peak resident memory during the phase; where the peak cannot be reset, how far the phase raised it"
+    )
+
+    class Meta:
+        ordering = ['run', 'position']
+
+    def __str__(self):
+        return f"Run {self.run_id} - {self.name} ({self.seconds}s)"
+
+class ActiveAllocationRun(models.Model):
+    """Pointer to the live run of a semester and academic year"""
+    semester = models.PositiveIntegerField()
+    academic_year = models.CharField(max_length=9)
+    run = models.OneToOneField(AllocationRun, on_delete=models.PROTECT, related_name='active_pointer')
+    previous_run = models.ForeignKey(
+        AllocationRun,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+'
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['semester', 'academic_year'],
+                name='unique_active_run_semester_year'
+            )
+        ]
+
+    def __str__(self):
+        return f"Semester {self.semester} {self.academic_year} -> Run {self.run_id}"
+
+class LiveRunManager(models.Manager):
+    """Only rows of published runs, plus rows that belong to no run"""
+    def get_queryset(self):
+        return super().get_queryset().filter(
+            models.Q(run__isnull=True) | models.Q(run__active_pointer__isnull=False)
+        )
+
+class BatchCutoff(models.Model):
+    """Last student a run admitted to a batch on preference, per paper and admission category"""
+    run = models.ForeignKey(AllocationRun, on_delete=models.CASCADE, related_name='cutoffs')
+    batch = models.ForeignKey(Batch, on_delete=models.CASCADE, related_name='cutoffs')
+    paper_no = models.PositiveIntegerField()
+    admission_category = models.CharField(max_length=20)
+    admitted = models.PositiveIntegerField(default=0)
+    last_rank = models.PositiveIntegerField(help_text="Merit rank of the last student admitted, 1 being the top")
+    last_marks = models.FloatField(null=True, blank=True)
+
+    objects = LiveRunManager()
+    all_runs = models.Manager()
+
+    class Meta:
+        ordering = ['run', 'batch', 'paper_no', 'admission_category']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['run', 'batch', 'paper_no', 'admission_category'],
+                name='unique_cutoff_run_batch_paper_category'
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.batch} Paper {self.paper_no} {self.admission_category}: {self.last_marks}"
+
 class CourseAllotment(models.Model):
     student = models.ForeignKey(Student, on_delete=models.CASCADE)
     batch = models.ForeignKey(Batch, on_delete=models.CASCADE)
     paper_no = models.PositiveIntegerField(default=1)
+    run = models.ForeignKey(
+        AllocationRun,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='allotments'
+    )
+
+    objects = LiveRunManager()
+    all_runs = models.Manager()
 
     def __str__(self):
         return f"{self.student.name} - {self.batch} - Paper {self.paper_no}"
@@ -395,3 +544,255 @@ class AllocationSettings(models.Model):
 
     def __str__(self):
         return f"{self.department} Settings"
+
+class BatchWaitlist(models.Model):
+    """Students who wanted a batch for a paper but found it full, in allocation order"""
+    batch = models.ForeignKey(Batch, on_delete=models.CASCADE, related_name='waitlist')
+    student = models.ForeignKey(Student, on_delete=models.CASCADE)
+    paper_no = models.PositiveIntegerField(default=1)
+    position = models.PositiveIntegerField(help_text="Order in which the allocation reached this student")
+    preference_rank = models.PositiveSmallIntegerField(help_text="Where the batch sits in the student's preferences")
+    run = models.ForeignKey(
+        AllocationRun,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='waitlist'
+    )
+
+    objects = LiveRunManager()
+    all_runs = models.Manager()
+
+    class Meta:
+        ordering = ['batch', 'position']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['run', 'batch', 'student', 'paper_no'],
+                name='unique_waitlist_run_batch_student_paper'
+            )
+        ]
+        indexes = [
+            models.Index(fields=['run', 'batch', 'position'], name='waitlist_run_batch_position'),
+            # fill_vacancies() looks up a batch's live entries across runs
+            models.Index(fields=['batch', 'position'], name='waitlist_batch_position'),
+            models.Index(fields=['student', 'paper_no'], name='waitlist_student_paper'),
+        ]
+
+    def __str__(self):
+        return f"{self.student} - {self.batch} (Paper {self.paper_no}, #{self.position})"
+
+class BackgroundJob(models.Model):
+    """Work queued for the job worker instead of running inside a request"""
+    ALLOCATE = 'allocate'
+    EXPORT_ALLOTMENTS = 'export_allotments'
+    IMPORT_STUDENTS = 'import_students'
+    KINDS = [
+        (ALLOCATE, 'Allocation'),
+        (EXPORT_ALLOTMENTS, 'Allotment export'),
+        (IMPORT_STUDENTS, 'Student import'),
+    ]
+
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    kind = models.CharField(max_length=30, choices=KINDS)
+    params = models.JSONField(default=dict, blank=True)
+    params_digest = models.CharField(max_length=64, blank=True, help_text="SHA-256 of the params, to find identical jobs")
+    status = models.CharField(max_length=10, choices=STATUS, default=QUEUED)
+    progress = models.PositiveSmallIntegerField(default=0, help_text="Percentage complete")
+    phase = models.CharField(max_length=100, blank=True)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='job_status_created'),
+            models.Index(fields=['kind', 'params_digest'], name='job_kind_params'),
+        ]
+
+    def __str__(self):
+        return f"Job {self.pk} - {self.get_kind_display()} ({self.get_status_display()})"
+
+class SwapRequest(models.Model):
+    """A student's offer to trade the batch they hold for a paper against another batch"""
+    PENDING = 'pending'
+    SWAPPED = 'swapped'
+    CANCELLED = 'cancelled'
+    STATUS = [
+        (PENDING, 'Pending'),
+        (SWAPPED, 'Swapped'),
+        (CANCELLED, 'Cancelled'),
+    ]
+
+    student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name='swap_requests')
+    paper_no = models.PositiveIntegerField()
+    offered_batch = models.ForeignKey(Batch, on_delete=models.CASCADE, related_name='swaps_offered')
+    wanted_batch = models.ForeignKey(Batch, on_delete=models.CASCADE, related_name='swaps_wanted')
+    status = models.CharField(max_length=10, choices=STATUS, default=PENDING)
+    created_at = models.DateTimeField(auto_now_add=True)
+    resolved_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['id']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['student', 'paper_no'],
+                condition=models.Q(status='pending'),
+                name='unique_pending_swap_student_paper'
+            )
+        ]
+        indexes = [
+            models.Index(fields=['status', 'offered_batch'], name='swap_status_offered'),
+        ]
+
+    def clean(self):
+        if self.offered_batch_id == self.wanted_batch_id:
+            raise ValidationError("The wanted batch is the batch already held")
+        offered, wanted = self.offered_batch, self.wanted_batch
+        if offered.course.semester != wanted.course.semester or offered.year != wanted.year:
+            raise ValidationError("Batches can only be swapped within the same semester and academic year")
+
+    def __str__(self):
+        return f"{self.student} Paper {self.paper_no}: {self.offered_batch_id} -> {self.wanted_batch_id} ({self.status})"
+
+class SwapHistory(models.Model):
+    """One student's move in a swap cycle; the rows of a cycle share its number"""
+    request = models.ForeignKey(SwapRequest, on_delete=models.CASCADE, related_name='history')
+    student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name='swap_history')
+    allotment = models.ForeignKey(CourseAllotment, on_delete=models.SET_NULL, null=True, blank=True)
+    paper_no = models.PositiveIntegerField()
+    old_batch = models.ForeignKey(Batch, on_delete=models.CASCADE, related_name='+')
+    new_batch = models.ForeignKey(Batch, on_delete=models.CASCADE, related_name='+')
+    cycle = models.PositiveIntegerField(help_text="Id of the cycle's first swap request")
+    swapped_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    swapped_at = models.DateTimeField(auto_now_add=True)
+    notes = models.TextField(blank=True)
+
+    class Meta:
+        ordering = ['-swapped_at', 'cycle', 'id']
+        verbose_name_plural = "Swap histories"
+
+    def __str__(self):
+        return f"{self.student} Paper {self.paper_no}: {self.old_batch_id} -> {self.new_batch_id}"
+
+class CourseChangeRequest(models.Model):
+    """A queued request to move a student's paper to another batch with free seats"""
+    PENDING = 'pending'
+    APPROVED = 'approved'
+    REJECTED = 'rejected'
+    CANCELLED = 'cancelled'
+    STATUS = [
+        (PENDING, 'Pending'),
+        (APPROVED, 'Approved'),
+        (REJECTED, 'Rejected'),
+        (CANCELLED, 'Cancelled'),
+    ]
+
+    student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name='course_change_requests')
+    paper_no = models.PositiveIntegerField()
+    current_batch = models.ForeignKey(Batch, on_delete=models.CASCADE, related_name='changes_from')
+    new_batch = models.ForeignKey(Batch, on_delete=models.CASCADE, related_name='changes_to')
+    reason = models.TextField(blank=True)
+    status = models.CharField(max_length=10, choices=STATUS, default=PENDING)
+    outcome = models.CharField(max_length=200, blank=True)
+    requested_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+    resolved_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['id']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['student', 'paper_no'],
+                condition=models.Q(status='pending'),
+                name='unique_pending_change_student_paper'
+            )
+        ]
+        indexes = [
+            models.Index(fields=['status', 'current_batch'], name='change_status_current'),
+        ]
+
+    def clean(self):
+        if self.current_batch_id == self.new_batch_id:
+            raise ValidationError("The new batch is the batch already held")
+        current, new = self.current_batch, self.new_batch
+        if current.course.semester != new.course.semester or current.year != new.year:
+            raise ValidationError("Courses can only be changed within the same semester and academic year")
+        if current.course.course_type_id != new.course.course_type_id:
+            raise ValidationError(f"{new.course.course_code} is not a {current.course.course_type} course")
+
+    def __str__(self):
+        return f"{self.student} Paper {self.paper_no}: {self.current_batch_id} -> {self.new_batch_id} ({self.status})"
+
+class CourseChangeHistory(models.Model):
+    """An approved course change as applied to the student's allotment"""
+    request = models.OneToOneField(CourseChangeRequest, on_delete=models.CASCADE, related_name='history')
+    student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name='course_changes')
+    allotment = models.ForeignKey(CourseAllotment, on_delete=models.SET_NULL, null=True, blank=True)
+    paper_no = models.PositiveIntegerField()
+    old_batch = models.ForeignKey(Batch, on_delete=models.CASCADE, related_name='+')
+    new_batch = models.ForeignKey(Batch, on_delete=models.CASCADE, related_name='+')
+    reason = models.TextField(blank=True)
+    changed_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    changed_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-changed_at', 'id']
+        verbose_name_plural = "Course change histories"
+
+    def __str__(self):
+        return f"{self.student} Paper {self.paper_no}: {self.old_batch_id} -> {self.new_batch_id}"
+
+class SpotRound(models.Model):
+    """First-come-first-served round in which students claim a semester's leftover seats"""
+    semester = models.PositiveIntegerField()
+    academic_year = models.CharField(max_length=9)
+    is_open = models.BooleanField(default=False)
+    opened_at = models.DateTimeField(null=True, blank=True)
+    closed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['semester', 'academic_year'],
+                name='unique_spot_round_semester_year'
+            )
+        ]
+
+    def __str__(self):
+        return f"Spot round - Semester {self.semester} {self.academic_year} ({'open' if self.is_open else 'closed'})"
+
+class SpotClaim(models.Model):
+    """A seat a student took in a spot round; at most one per paper"""
+    spot_round = models.ForeignKey(SpotRound, on_delete=models.CASCADE, related_name='claims')
+    student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name='spot_claims')
+    paper_no = models.PositiveIntegerField()
+    batch = models.ForeignKey(Batch, on_delete=models.CASCADE, related_name='spot_claims')
+    allotment = models.OneToOneField(CourseAllotment, on_delete=models.CASCADE, related_name='spot_claim')
+    claimed_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['claimed_at', 'id']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['spot_round', 'student', 'paper_no'],
+                name='unique_spot_claim_student_paper'
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.student} Paper {self.paper_no}: {self.batch_id}"
@@ -0,0 +1,92 @@
+"""
+Merit ranking and preference matrices for an allocation cohort.
+
+Students are addressed by their position in admission number order. The merit
+order, each student's merit rank and every paper's students x preference-rank
+table of batch ids are built once per cohort into typed arrays, so allocation
+passes walk integer arrays instead of re-sorting querysets.
+"""
+from array import array
+
+# Marks an unused cell in a preference matrix row
+NO_BATCH = -1
+
+
+def merit_sort_key(semester):
+    """
+    Sort key matching ``order_by(sort_field, 'admission_number')`` when applied
+    with a stable sort to students already in admission number order.
+    """
+    if semester in [1, 2]:
+        return lambda student: -student.normalized_marks
+    return lambda student: (
+        student.first_sem_marks is None,
+        -(student.first_sem_marks or 0),
+    )
+
+
+def get_merit_marks(semester, student):
+    """Marks a student is ranked on in a semester"""
+    if semester in [1, 2]:
+        return student.normalized_marks
+    return student.first_sem_marks
+
+
+class PreferenceMatrix:
+    """Dense students x preference-rank table of batch ids for one paper"""
+
+    def __init__(self, student_count, width):
+        self.width = width
+        self.cells = array('q', [NO_BATCH]) * (student_count * width)
+
+    def row(self, index):
+        """Batch ids a student listed, in preference order"""
+        start = index * self.width
+        row = self.cells[start:start + self.width]
+        if NO_BATCH in row:
+            return row[:row.index(NO_BATCH)]
+        return row
+
+
+class CohortRanking:
+    """Merit order, merit ranks and preference matrices of one cohort"""
+
+    def __init__(self, semester, students, preferences):
+        """
+        :param students: StudentState list in admission number order
+        :param preferences: {(student_id, paper_no): [batch_id, ...]}
+        """
+        count = len(students)
+        self.student_count = count
+        self.student_ids = array('q', (student.id for student in students))
+        self.direct_order = array('l', range(count))
+
+        key = merit_sort_key(semester)
+        self.merit_order = array('l', sorted(range(count), key=lambda i: key(students[i])))
+        self.merit_rank = array('l', [0]) * count
+        for rank, index in enumerate(self.merit_order):
+            self.merit_rank[index] = rank
+
+        self.positions = {student.id: index for index, student in enumerate(students)}
+        widths = {}
+        for (student_id, paper_no), batch_ids in preferences.items():
+            if student_id in self.positions:
+                widths[paper_no] = max(widths.get(paper_no, 0), len(batch_ids))
+
+        self.matrices = {
+            paper_no: PreferenceMatrix(count, width)
+            for paper_no, width in widths.items()
+        }
+        for (student_id, paper_no), batch_ids in preferences.items():
+            index = self.positions.get(student_id)
+            if index is not None:
+                matrix = self.matrices[paper_no]
+                start = index * matrix.width
+                matrix.cells[start:start + len(batch_ids)] = array('q', batch_ids)
+
+    def preferences_for(self, index, paper_no):
+        """Batch ids listed by the student at `index` for a paper, best first"""
+        matrix = self.matrices.get(paper_no)
+        if matrix is None:
+            return ()
+        return matrix.row(index)
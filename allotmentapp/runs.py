@@ -0,0 +1,115 @@
+"""
+Versioned allocation runs.
+
+Every allocation is written into its own AllocationRun while the previous
+one stays live. CourseAllotment.objects and BatchWaitlist.objects only see
+rows of published runs, so publishing or rolling back is a single update of
+the ActiveAllocationRun pointer for the semester and academic year, followed
+by a recount of the affected batches' seats_taken. Superseded runs are
+removed later in bulk by collect_superseded_runs().
+"""
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Count, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .decisions import delete_decision_logs
+from .models import ActiveAllocationRun, AllocationRun, Batch, CourseAllotment
+
+
+def get_active_run(semester, academic_year):
+    """Live run of a semester and academic year, or None"""
+    pointer = ActiveAllocationRun.objects.select_related('run').filter(
+        semester=semester, academic_year=academic_year
+    ).first()
+    return pointer.run if pointer else None
+
+
+def live_seats_taken():
+    """Expression counting a batch's live allotments, to annotate or update Batch querysets with"""
+    return Coalesce(Subquery(
+        CourseAllotment.objects.filter(batch=OuterRef('pk')).order_by().values('batch')
+        .annotate(count=Count('id')).values('count')
+    ), 0)
+
+
+def sync_seats_taken(semester, academic_year, runs):
+    """
+    Recount seats_taken of the semester's batches and every batch the given
+    runs use, as one grouped UPDATE
+    """
+    Batch.objects.filter(
+        Q(course__semester=semester, year=academic_year) |
+        Q(id__in=CourseAllotment.all_runs.filter(run__in=runs).values('batch_id'))
+    ).update(seats_taken=live_seats_taken())
+
+
+@transaction.atomic
+def publish_run(run):
+    """Make a ready run the live allocation of its semester and academic year"""
+    if run.status not in (AllocationRun.READY, AllocationRun.SUPERSEDED):
+        raise ValidationError(f"Run {run.pk} is {run.get_status_display().lower()} and cannot be published")
+
+    pointer = ActiveAllocationRun.objects.select_for_update().filter(
+        semester=run.semester, academic_year=run.academic_year
+    ).first()
+    previous = None
+    if pointer is None:
+        ActiveAllocationRun.objects.create(semester=run.semester, academic_year=run.academic_year, run=run)
+    else:
+        previous = pointer.run
+        pointer.previous_run = previous
+        pointer.run = run
+        pointer.save(update_fields=['run', 'previous_run'])
+        AllocationRun.objects.filter(pk=previous.pk).update(status=AllocationRun.SUPERSEDED)
+
+    run.status = AllocationRun.ACTIVE
+    run.published_at = timezone.now()
+    run.save(update_fields=['status', 'published_at'])
+
+    # Allotments added outside any run cannot be rolled back to, so they are
+    # replaced like a full re-allocation always did
+    CourseAllotment.objects.filter(
+        run__isnull=True,
+        batch__course__semester=run.semester,
+        batch__year=run.academic_year
+    ).delete()
+
+    sync_seats_taken(run.semester, run.academic_year, [r for r in (run, previous) if r])
+    return previous
+
+
+@transaction.atomic
+def rollback_run(semester, academic_year):
+    """Swap the live run of a semester and academic year back to the one it replaced"""
+    pointer = ActiveAllocationRun.objects.select_for_update().select_related('run', 'previous_run').filter(
+        semester=semester, academic_year=academic_year
+    ).first()
+    if pointer is None or pointer.previous_run is None:
+        raise ValidationError(f"No previous run to roll back to for semester {semester} {academic_year}")
+
+    current, previous = pointer.run, pointer.previous_run
+    pointer.run, pointer.previous_run = previous, current
+    pointer.save(update_fields=['run', 'previous_run'])
+    AllocationRun.objects.filter(pk=current.pk).update(status=AllocationRun.SUPERSEDED)
+    AllocationRun.objects.filter(pk=previous.pk).update(status=AllocationRun.ACTIVE, published_at=timezone.now())
+
+    sync_seats_taken(semester, academic_year, [current, previous])
+    return previous
+
+
+def collect_superseded_runs():
+    """
+    Delete superseded and failed runs that no pointer can return to,
+    with their allotments, waitlists and decision logs, in bulk.
+    """
+    with transaction.atomic():
+        kept = ActiveAllocationRun.objects.values_list('run_id', 'previous_run_id')
+        kept_ids = {run_id for pair in kept for run_id in pair if run_id}
+        run_ids = list(AllocationRun.objects.filter(
+            status__in=[AllocationRun.SUPERSEDED, AllocationRun.FAILED]
+        ).exclude(pk__in=kept_ids).values_list('pk', flat=True))
+        deleted, per_model = AllocationRun.objects.filter(pk__in=run_ids).delete()
+    delete_decision_logs(run_ids)
+    return per_model
@@ -0,0 +1,118 @@
+"""
+First-come-first-served spot round over the seats left after the merit rounds.
+
+While a semester's SpotRound is open, students without a seat for a paper
+claim one of the batches they listed for it (or, for papers with a fallback
+course type, any batch of that type) on a first-come basis. A claim is a
+single conditional UPDATE that takes the seat only while seats_taken is below
+the limit, so hundreds of concurrent claims never oversell a batch and a
+claim on a full batch fails at once instead of queueing for a lock. The
+claim's allotment and SpotClaim row are inserted before the seat is taken;
+the unique SpotClaim key rejects a second claim for the same paper, and the
+batch row stays locked only until the claim commits. The claim's transaction
+opens with a write, so on SQLite it takes the write lock at its first
+statement and never has to upgrade a read lock held by a concurrent claim.
+"""
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.db.models import Exists, F, OuterRef, Q
+from django.utils import timezone
+
+from .allocation import get_allocation_phases, get_fallback_course_type
+from .models import Batch, CourseAllotment, CoursePreference, SpotClaim, SpotRound
+from .runs import get_active_run
+
+
+def get_open_spot_round(semester, academic_year):
+    """Open spot round of a semester and academic year, or None"""
+    return SpotRound.objects.filter(semester=semester, academic_year=academic_year, is_open=True).first()
+
+
+@transaction.atomic
+def set_spot_round_open(semester, academic_year, is_open):
+    spot_round, _ = SpotRound.objects.select_for_update().get_or_create(semester=semester, academic_year=academic_year)
+    spot_round.is_open = is_open
+    if is_open:
+        spot_round.opened_at = timezone.now()
+        spot_round.closed_at = None
+    else:
+        spot_round.closed_at = timezone.now()
+    spot_round.save()
+    return spot_round
+
+
+def get_semester_papers(semester):
+    return [paper_no for kind, papers in get_allocation_phases(semester) for paper_no in papers]
+
+
+def get_spot_batches(student_id, paper_no, semester, academic_year):
+    """
+    Open batches a student may claim for a paper: the ones they listed, plus
+    the fallback type's, leaving out every part of a course they already hold
+    """
+    eligible = Q(id__in=CoursePreference.objects.filter(student_id=student_id, paper_no=paper_no).values('batch_id'))
+    course_type_prefix = get_fallback_course_type(semester, paper_no)
+    if course_type_prefix:
+        eligible |= Q(course__course_type__name__startswith=course_type_prefix)
+    return Batch.objects.filter(
+        eligible, course__semester=semester, year=academic_year, status=True
+    ).exclude(
+        Exists(CourseAllotment.objects.filter(
+            student_id=student_id, batch__course=OuterRef('course'), batch__year=OuterRef('year')
+        ))
+    ).select_related('course')
+
+
+def get_spot_options(student, semester, academic_year):
+    """{paper_no: [batch, ...] with free seats} for every paper the student has no seat for"""
+    placed = set(CourseAllotment.objects.filter(
+        student=student, batch__course__semester=semester, batch__year=academic_year
+    ).values_list('paper_no', flat=True))
+    return {
+        paper_no: [
+            batch for batch in get_spot_batches(student.id, paper_no, semester, academic_year)
+            .filter(seats_taken__lt=F('course__seat_limit')).order_by('course__course_code', 'part')
+        ]
+        for paper_no in get_semester_papers(semester) if paper_no not in placed
+    }
+
+
+def claim_spot_seat(spot_round, student_id, batch, paper_no):
+    """
+    Take a seat in `batch` for a student's paper and return the allotment.
+    Raises ValidationError when the claim is not allowed or the batch is full.
+    """
+    semester, academic_year = spot_round.semester, spot_round.academic_year
+    if paper_no not in get_semester_papers(semester):
+        raise ValidationError(f"Semester {semester} has no paper {paper_no}")
+    if CourseAllotment.objects.filter(
+        student_id=student_id, paper_no=paper_no, batch__course__semester=semester, batch__year=academic_year
+    ).exists():
+        raise ValidationError(f"A seat is already allotted for paper {paper_no}")
+    seats_taken = get_spot_batches(student_id, paper_no, semester, academic_year).filter(
+        pk=batch.pk
+    ).values_list('seats_taken', flat=True).first()
+    if seats_taken is None:
+        raise ValidationError(f"{batch.course.course_code} cannot be claimed for paper {paper_no}")
+    if seats_taken >= batch.seat_limit:
+        # Fail before taking any lock; the conditional UPDATE below stays the real guard
+        raise ValidationError(f"{batch.course.course_code} has no seats left")
+
+    run = get_active_run(semester, academic_year)
+    try:
+        with transaction.atomic():
+            allotment = CourseAllotment.objects.create(
+                student_id=student_id, batch=batch, paper_no=paper_no, run=run
+            )
+            SpotClaim.objects.create(
+                spot_round=spot_round, student_id=student_id, paper_no=paper_no,
+                batch=batch, allotment=allotment
+            )
+            # Last, so the batch row is locked for as short a time as possible
+            if not Batch.objects.filter(pk=batch.pk, seats_taken__lt=batch.seat_limit).update(
+                seats_taken=F('seats_taken') + 1
+            ):
+                raise ValidationError(f"{batch.course.course_code} has no seats left")
+    except IntegrityError:
+        raise ValidationError(f"A seat is already claimed for paper {paper_no}")
+    return allotment
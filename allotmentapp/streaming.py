@@ -0,0 +1,116 @@
+"""
+Keyset-paginated iteration for cohort-sized querysets.
+
+Iterating a queryset caches every row it returns, and OFFSET pagination gets
+slower with every page. iter_keyset() walks a queryset in `key` order with
+``WHERE key > last`` so that only one chunk of rows is alive at a time and
+every chunk costs the same indexed lookup, whatever the cohort size.
+
+The semester allotment sheet is built on it here, so the download view and
+the export job write the same rows.
+"""
+from django.db.models import Exists, OuterRef
+
+from .models import CourseAllotment, Student
+
+STREAM_CHUNK_SIZE = 2000
+
+
+def iter_keyset(queryset, key='id', chunk_size=STREAM_CHUNK_SIZE):
+    """
+    Yield lists of at most `chunk_size` rows from `queryset` in `key` order.
+    `key` must be unique; for values_list() querysets it must be the first column.
+    """
+    queryset = queryset.order_by(key)
+    last = None
+    while True:
+        page = queryset if last is None else queryset.filter(**{f'{key}__gt': last})
+        chunk = list(page[:chunk_size])
+        if not chunk:
+            return
+        yield chunk
+        if len(chunk) < chunk_size:
+            return
+
+        row = chunk[-1]
+        if isinstance(row, tuple):
+            last = row[0]
+        elif isinstance(row, dict):
+            last = row[key]
+        else:
+            last = getattr(row, key)
+
+
+def iter_rows(queryset, key='id', chunk_size=STREAM_CHUNK_SIZE):
+    """Row-by-row form of iter_keyset()"""
+    for chunk in iter_keyset(queryset, key, chunk_size):
+        yield from chunk
+
+
+def iter_allotment_csv_rows(semester):
+    """Header and one row per student of a semester's allotment sheet"""
+    # Define paper names based on semester
+    if semester == 1:
+        paper_headers = ["Paper 1 (DSC 1)", "Paper 2 (DSC 2)", "Paper 3 (DSC 3)", "Paper 4 (MDC)"]
+    elif semester == 2:
+        paper_headers = ["Paper 1 (DSC 4)", "Paper 2 (DSC 5)", "Paper 3 (DSC 6)", "Paper 4 (MDC)"]
+    elif semester == 3:
+        paper_headers = ["Paper 1 (DSC 7)", "Paper 2 (DSC 8)", "Paper 3 (DSC 9)", "Paper 4 (DSC 10)", "Paper 5 (MDC)", "Paper 6 (VAC)"]
+    else:
+        paper_headers = [f"Paper {i}" for i in range(1, 7)]
+
+    # Write the header row
+    yield ["Admission Number", "Name", "Department", "Category", "Pathway"] + paper_headers
+
+    # Write student allotment data as it is read
+    for data in iter_allotment_data(semester):
+        row = [
+            data['admission_number'], data['name'], data['department'],
+            data['admission_category'], data['pathway']
+        ]
+        # Append paper allotments dynamically
+        num_papers = len(paper_headers)
+        for i in range(1, num_papers + 1):
+            row.append(data.get(f'paper{i}', ''))
+        yield row
+
+
+def iter_allotment_data(semester, department=None, admission_year=None):
+    """
+    Yield one row per student with allotments in the semester, in admission
+    number order, reading students and their allotments in keyset chunks.
+    """
+    allotments = CourseAllotment.objects.filter(batch__course__semester=semester)
+
+    if department:
+        allotments = allotments.filter(student__department=department)
+
+    if admission_year:
+        allotments = allotments.filter(student__admission_year=admission_year)
+
+    students = Student.objects.filter(
+        Exists(allotments.filter(student=OuterRef('pk')))
+    ).values_list(
+        'admission_number', 'id', 'name', 'department__name', 'admission_category', 'pathway__name'
+    )
+    for chunk in iter_keyset(students, key='admission_number'):
+        student_allotments = {}
+        for student_id, paper_no, course_name in allotments.filter(
+            student__admission_number__gte=chunk[0][0],
+            student__admission_number__lte=chunk[-1][0]
+        ).values_list('student_id', 'paper_no', 'batch__course__course_name'):
+            student_allotments.setdefault(student_id, {})[f'paper{paper_no}'] = course_name
+
+        for admission_number, student_id, name, department_name, category, pathway in chunk:
+            papers = student_allotments.get(student_id, {})
+            data = {
+                'admission_number': admission_number,
+                'name': name,
+                'department': department_name,
+                'admission_category': category,
+                'pathway': pathway or '',
+            }
+            # Add all paper keys
+            for i in range(1, 7):
+                data[f'paper{i}'] = papers.get(f'paper{i}', '')
+            yield data
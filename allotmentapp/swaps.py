@@ -0,0 +1,155 @@
+"""
+Top-trading-cycles resolution of batch swap requests.
+
+A SwapRequest offers the seat a student holds for a paper in exchange for a
+seat in another batch. The pending requests of a semester form a trade graph
+in which every request points at the earliest remaining request offering the
+batch it wants for the same paper. Following the pointers from a request
+either comes back to a request already on the path, closing a cycle in which
+everyone gets the batch they asked for, or reaches a batch nobody offers any
+more; that request cannot trade in this round and the one before it points
+at the next holder instead. Every request is pushed onto the path and taken
+off it once and the holder queues only move forward, so a round is linear in
+the number of requests.
+
+A cycle leaves the seat count of every batch unchanged. The moves of all
+cycles are written with one bulk update of CourseAllotment and one bulk insert
+of SwapHistory; requests that found no partner stay pending for the next round.
+"""
+from collections import Counter, deque
+
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from .allocation import BULK_BATCH_SIZE
+from .models import Batch, CourseAllotment, SwapHistory, SwapRequest
+
+
+def find_trade_cycles(requests):
+    """
+    Top trading cycles over (request_id, paper_no, offered_batch_id,
+    wanted_batch_id) tuples in priority order. Returns the cycles as lists of
+    request ids in which each request receives the offered batch of the next
+    one, the last receiving the first's.
+    """
+    holders = {}
+    wants = {}
+    for request_id, paper_no, offered_batch_id, wanted_batch_id in requests:
+        holders.setdefault((paper_no, offered_batch_id), deque()).append(request_id)
+        wants[request_id] = (paper_no, wanted_batch_id)
+
+    done = set()
+    cycles = []
+    for start in wants:
+        if start in done:
+            continue
+        path = [start]
+        # {request_id: position in path}
+        on_path = {start: 0}
+        while path:
+            current = path[-1]
+            queue = holders.get(wants[current])
+            while queue and queue[0] in done:
+                queue.popleft()
+            if not queue:
+                # Nobody left offers the wanted batch
+                path.pop()
+                del on_path[current]
+                done.add(current)
+                continue
+
+            target = queue[0]
+            if target in on_path:
+                start_at = on_path[target]
+                cycle = path[start_at:]
+                del path[start_at:]
+                for request_id in cycle:
+                    del on_path[request_id]
+                    done.add(request_id)
+                cycles.append(cycle)
+            else:
+                on_path[target] = len(path)
+                path.append(target)
+    return cycles
+
+
+@transaction.atomic
+def resolve_swap_requests(semester, academic_year, swapped_by=None):
+    """
+    Carry out every trade cycle among a semester's pending swap requests.
+    Requests whose student no longer holds the offered batch, or already holds
+    a part of the wanted course for another paper, are cancelled.
+    Returns the numbers of cycles, students moved and requests cancelled.
+    """
+    pending = SwapRequest.objects.select_for_update().filter(
+        status=SwapRequest.PENDING,
+        offered_batch__course__semester=semester,
+        offered_batch__year=academic_year
+    ).order_by('id')
+    requests = list(pending.values_list('id', 'student_id', 'paper_no', 'offered_batch_id', 'wanted_batch_id'))
+
+    # Every live allotment of the students asking, in one query
+    allotments = {
+        (allotment.student_id, allotment.paper_no, allotment.batch_id): allotment
+        for allotment in CourseAllotment.objects.filter(
+            Exists(SwapRequest.objects.filter(status=SwapRequest.PENDING, student=OuterRef('student'))),
+            batch__course__semester=semester,
+            batch__year=academic_year
+        )
+    }
+    # {batch_id: (course_id, year)} of the batches held, offered and wanted
+    courses = {
+        batch_id: (course_id, year)
+        for batch_id, course_id, year in Batch.objects.filter(
+            Q(id__in={batch_id for student_id, paper_no, batch_id in allotments}) |
+            Q(id__in={row[4] for row in requests})
+        ).values_list('id', 'course_id', 'year')
+    }
+    # {(student_id, course): papers held in any part of the course}
+    holdings = Counter((student_id, courses[batch_id]) for student_id, paper_no, batch_id in allotments)
+    held = {}
+    stale = []
+    wanted = set()
+    for request_id, student_id, paper_no, offered_batch_id, wanted_batch_id in requests:
+        allotment = allotments.get((student_id, paper_no, offered_batch_id))
+        if allotment is None:
+            stale.append(request_id)
+            continue
+        # Trading between parts of one course is allowed; holding it for another paper is not
+        wanted_course = courses[wanted_batch_id]
+        if holdings[(student_id, wanted_course)] - (courses[offered_batch_id] == wanted_course):
+            stale.append(request_id)
+        elif (student_id, wanted_course) not in wanted:
+            # A student asking for one course for two papers trades only the first per round
+            wanted.add((student_id, wanted_course))
+            held[request_id] = (allotment, paper_no, offered_batch_id, wanted_batch_id)
+
+    cycles = find_trade_cycles(
+        (request_id, paper_no, offered_batch_id, wanted_batch_id)
+        for request_id, (allotment, paper_no, offered_batch_id, wanted_batch_id) in held.items()
+    )
+
+    moved = []
+    history = []
+    for cycle in cycles:
+        number = min(cycle)
+        for position, request_id in enumerate(cycle):
+            allotment, paper_no, offered_batch_id, wanted_batch_id = held[request_id]
+            new_batch_id = held[cycle[(position + 1) % len(cycle)]][2]
+            allotment.batch_id = new_batch_id
+            moved.append(allotment)
+            history.append(SwapHistory(
+                request_id=request_id, student_id=allotment.student_id, allotment=allotment,
+                paper_no=paper_no, old_batch_id=offered_batch_id, new_batch_id=new_batch_id,
+                cycle=number, swapped_by=swapped_by
+            ))
+
+    now = timezone.now()
+    CourseAllotment.objects.bulk_update(moved, ['batch'], batch_size=BULK_BATCH_SIZE)
+    SwapHistory.objects.bulk_create(history, batch_size=BULK_BATCH_SIZE)
+    SwapRequest.objects.filter(pk__in=[row.request_id for row in history]).update(
+        status=SwapRequest.SWAPPED, resolved_at=now
+    )
+    SwapRequest.objects.filter(pk__in=stale).update(status=SwapRequest.CANCELLED, resolved_at=now)
+    return {'cycles': len(cycles), 'swapped': len(moved), 'cancelled': len(stale)}
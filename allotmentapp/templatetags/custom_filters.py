@@ -8,9 +8,10 @@ def get_specific_preference(preferences, paper_no, pref_no):
     Tag to get specific paper preference
     Usage: {% get_specific_preference preferences paper_no pref_no %}
     """
-    specific_pref = preferences.filter(paper_no=paper_no, preference_number=pref_no).first()
-    if specific_pref:
-        return specific_pref.batch.course.course_name
+    # Scan the (usually prefetched) preferences instead of issuing a query per cell
+    for specific_pref in preferences:
+        if specific_pref.paper_no == paper_no and specific_pref.preference_number == pref_no:
+            return specific_pref.batch.course.course_name
     return '-'
 
 @register.filter(name='add_class')
@@ -0,0 +1,96 @@
+"""Cohort factory and helpers shared by the allocation tests"""
+import shutil
+import tempfile
+from datetime import date
+
+from django.db.models import Count
+from django.test import TestCase, override_settings
+
+from allotmentapp.allocation import get_target_admission_year
+from allotmentapp.models import (
+    Batch, Course, Course_type, CourseAllotment, CoursePreference, Department, Pathway, Student
+)
+
+ACADEMIC_YEAR = '2026-2027'
+
+
+def create_cohort(courses, students, preferences, semester=1):
+    """
+    Create a semester's batches, students and preferences.
+
+    :param courses: {code: (course type, seat limit, parts)}
+    :param students: {admission number: normalized marks}
+    :param preferences: {(admission number, paper_no): [code or (code, part), ...]}
+    Returns ({code or (code, part): batch}, {admission number: student}).
+    """
+    department = Department.objects.create(name="Computer Science", isMajor=True)
+    pathway = Pathway.objects.create(name="Single Major")
+    course_types = {}
+    batches = {}
+    for code, (type_name, seat_limit, parts) in courses.items():
+        if type_name not in course_types:
+            course_types[type_name] = Course_type.objects.create(name=type_name)
+        course = Course.objects.create(
+            course_code=code, course_name=code, course_type=course_types[type_name],
+            department=department, semester=semester, seat_limit=seat_limit
+        )
+        for part in range(1, parts + 1):
+            batches[(code, part)] = Batch.objects.create(course=course, year=ACADEMIC_YEAR, part=part)
+        batches[code] = batches[(code, 1)]
+
+    # bulk_create skips Student.save(), which would hash a password per student
+    Student.objects.bulk_create([
+        Student(
+            admission_number=admission_number, name=admission_number, dob=date(2006, 1, 1),
+            email=f"{admission_number}@example.com", phone_number=f"90000000{position:02d}",
+            department=department, admission_year=get_target_admission_year(semester, ACADEMIC_YEAR),
+            pathway=pathway, current_sem=semester, normalized_marks=marks
+        )
+        for position, (admission_number, marks) in enumerate(students.items())
+    ])
+    students = Student.objects.in_bulk(list(students), field_name='admission_number')
+    CoursePreference.objects.bulk_create([
+        CoursePreference(
+            student=students[admission_number], batch=batches[choice],
+            preference_number=number, paper_no=paper_no
+        )
+        for (admission_number, paper_no), choices in preferences.items()
+        for number, choice in enumerate(choices, start=1)
+    ])
+    return batches, students
+
+
+def live_allotments():
+    """{(admission number, paper_no): (course code, part)} of the live allotments"""
+    return {
+        (admission_number, paper_no): (code, part)
+        for admission_number, paper_no, code, part in CourseAllotment.objects.values_list(
+            'student__admission_number', 'paper_no', 'batch__course__course_code', 'batch__part'
+        )
+    }
+
+
+def assert_seats_counted(test):
+    """Every batch's seats_taken equals its live allotments"""
+    counted = dict(
+        CourseAllotment.objects.order_by().values_list('batch_id').annotate(count=Count('id'))
+    )
+    for batch_id, seats_taken in Batch.objects.values_list('id', 'seats_taken'):
+        test.assertEqual(seats_taken, counted.get(batch_id, 0), f"Batch {batch_id}")
+
+
+class AllocationTestCase(TestCase):
+    """Keeps each run's decision log out of the project directory"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.log_dir = tempfile.mkdtemp()
+        cls.log_settings = override_settings(ALLOCATION_LOG_DIR=cls.log_dir)
+        cls.log_settings.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.log_settings.disable()
+        shutil.rmtree(cls.log_dir, ignore_errors=True)
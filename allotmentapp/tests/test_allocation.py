@@ -0,0 +1,132 @@
+from unittest import mock
+
+from allotmentapp import allocation
+from allotmentapp.allocation import (
+    AllocationEngine, AllocationSnapshot, DeferredAcceptanceEngine, allocate_courses, get_allocation_engine
+)
+from allotmentapp.models import AllocationRun, BatchWaitlist
+
+from .base import ACADEMIC_YEAR, AllocationTestCase, assert_seats_counted, create_cohort, live_allotments
+
+
+class AllocationParityTests(AllocationTestCase):
+    """The engine reproduces the per-student allocate_paper() it replaced"""
+    courses = {
+        'ALG': ('DSC', 3, 1), 'BIO': ('DSC', 3, 1), 'CHE': ('DSC', 5, 1), 'DAT': ('DSC', 3, 1),
+        'MUS': ('MDC', 1, 1), 'ART': ('MDC', 4, 1),
+    }
+    students = {'A01': 500, 'A02': 900, 'A03': 700, 'A04': 900, 'A05': 300, 'A06': 800}
+    preferences = {
+        ('A01', 1): ['ALG', 'BIO'], ('A02', 1): ['ALG', 'BIO'], ('A03', 1): ['ALG', 'BIO'],
+        ('A04', 1): ['ALG', 'BIO'], ('A05', 1): ['ALG', 'BIO', 'CHE'], ('A06', 1): ['ALG', 'BIO'],
+        ('A01', 2): ['BIO', 'CHE'], ('A02', 2): ['BIO', 'CHE'], ('A03', 2): ['ALG', 'CHE'],
+        ('A04', 2): ['CHE', 'ALG'], ('A05', 2): ['ALG', 'BIO'], ('A06', 2): ['ALG', 'BIO', 'CHE'],
+        ('A01', 3): ['DAT'], ('A02', 3): ['DAT', 'CHE'], ('A03', 3): ['CHE', 'DAT'],
+        ('A04', 3): ['ALG', 'DAT'], ('A05', 3): ['BIO', 'DAT'], ('A06', 3): ['DAT'],
+        ('A01', 4): ['MUS'], ('A02', 4): ['MUS'], ('A03', 4): ['ART'],
+        ('A04', 4): ['MUS'], ('A05', 4): ['MUS'], ('A06', 4): ['MUS', 'ART'],
+    }
+    # What the per-student allocation made of this cohort: paper 1 in admission
+    # number order, papers 2 and 3 by marks (A02 before A04 on the tie), and
+    # paper 4 falling back to the least-filled MDC batch once MUS is full
+    expected = {
+        ('A01', 1): ('ALG', 1), ('A01', 2): ('CHE', 1), ('A01', 4): ('ART', 1),
+        ('A02', 1): ('ALG', 1), ('A02', 2): ('CHE', 1), ('A02', 3): ('DAT', 1), ('A02', 4): ('MUS', 1),
+        ('A03', 1): ('ALG', 1), ('A03', 2): ('CHE', 1), ('A03', 4): ('ART', 1),
+        ('A04', 1): ('BIO', 1), ('A04', 2): ('CHE', 1), ('A04', 3): ('DAT', 1), ('A04', 4): ('ART', 1),
+        ('A05', 1): ('BIO', 1),
+        ('A06', 1): ('BIO', 1), ('A06', 2): ('CHE', 1), ('A06', 3): ('DAT', 1), ('A06', 4): ('ART', 1),
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.batches, cls.students = create_cohort(cls.courses, cls.students, cls.preferences)
+
+    def test_greedy_allocation_matches_per_student_allocation(self):
+        allocate_courses(1, ACADEMIC_YEAR)
+        self.assertEqual(live_allotments(), self.expected)
+        assert_seats_counted(self)
+
+    def test_deferred_acceptance_matches_greedy_on_shared_priorities(self):
+        snapshot = AllocationSnapshot.load(1, ACADEMIC_YEAR)
+        greedy = AllocationEngine(snapshot).run()
+        deferred = DeferredAcceptanceEngine(snapshot).run()
+        self.assertEqual(set(deferred.allotments), set(greedy.allotments))
+
+    def test_deferred_acceptance_run_records_its_strategy(self):
+        run = allocate_courses(1, ACADEMIC_YEAR, strategy=AllocationRun.DEFERRED_ACCEPTANCE)
+        self.assertEqual(run.strategy, AllocationRun.DEFERRED_ACCEPTANCE)
+        self.assertEqual(live_allotments(), self.expected)
+        assert_seats_counted(self)
+
+
+class BatchPriorityTests(AllocationTestCase):
+    """Engines that let batches rank students their own way settle on their own matching"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.batches, cls.students = create_cohort(
+            {'ALG': ('DSC', 1, 1), 'BIO': ('DSC', 1, 1)},
+            {'S01': 900, 'S02': 800},
+            {(admission_number, 2): ['ALG', 'BIO'] for admission_number in ('S01', 'S02')}
+        )
+
+    def test_batch_ranking_students_in_reverse_takes_the_lower_ranked(self):
+        algebra = self.batches['ALG'].id
+
+        class ReverseAlgebra(DeferredAcceptanceEngine):
+            def batch_priority(self, batch_id, position, index):
+                return -position if batch_id == algebra else position
+
+        snapshot = AllocationSnapshot.load(1, ACADEMIC_YEAR)
+        admission_numbers = {student.id: student.admission_number for student in snapshot.students}
+        matched = {
+            admission_numbers[student_id]: batch_id
+            for student_id, batch_id, paper_no in ReverseAlgebra(snapshot).run().allotments
+        }
+        self.assertEqual(matched, {'S01': self.batches['BIO'].id, 'S02': algebra})
+
+    def test_unknown_strategy_is_refused(self):
+        with self.assertRaisesMessage(ValueError, "Unknown allocation strategy 'lottery'"):
+            get_allocation_engine('lottery')
+
+
+class SetBasedDirectPaperTests(AllocationTestCase):
+    """Single-choice direct papers written with INSERT ... SELECT match the bulk inserts"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.batches, cls.students = create_cohort(
+            {'ALG': ('DSC', 2, 1), 'BIO': ('DSC', 5, 1), 'CHE': ('DSC', 5, 1)},
+            {'A01': 500, 'A02': 900, 'A03': 700, 'A04': 800},
+            {
+                ('A01', 1): ['ALG'], ('A02', 1): ['ALG'], ('A03', 1): ['ALG'], ('A04', 1): ['BIO'],
+                ('A01', 2): ['BIO', 'CHE'], ('A02', 2): ['CHE'], ('A03', 2): ['BIO'], ('A04', 2): ['CHE'],
+            }
+        )
+
+    def written_rows(self):
+        return (
+            live_allotments(),
+            list(BatchWaitlist.objects.order_by('position').values_list(
+                'student__admission_number', 'batch__course__course_code', 'paper_no', 'position', 'preference_rank'
+            )),
+        )
+
+    def test_only_single_choice_direct_papers_are_set_based(self):
+        engine = AllocationEngine(AllocationSnapshot.load(1, ACADEMIC_YEAR))
+        self.assertEqual(allocation.get_set_based_papers(engine), {1})
+
+    def test_set_based_paper_matches_bulk_inserts(self):
+        allocate_courses(1, ACADEMIC_YEAR)
+        set_based = self.written_rows()
+        # Seats go in admission number order, whatever the marks
+        self.assertEqual(set_based[0][('A01', 1)], ('ALG', 1))
+        self.assertEqual(set_based[0][('A02', 1)], ('ALG', 1))
+        self.assertNotIn(('A03', 1), set_based[0])
+        self.assertIn(('A03', 'ALG', 1, 1, 1), set_based[1])
+
+        with mock.patch.object(allocation, 'get_set_based_papers', return_value=set()):
+            allocate_courses(1, ACADEMIC_YEAR)
+        self.assertEqual(self.written_rows(), set_based)
+        assert_seats_counted(self)
@@ -0,0 +1,92 @@
+from datetime import timedelta
+
+from django.core.exceptions import ValidationError
+from django.utils import timezone
+
+from allotmentapp.allocation import allocate_courses
+from allotmentapp.checkpoints import RunLease, allocate_courses_checkpointed, get_interrupted_run
+from allotmentapp.models import AllocationRun
+
+from .base import ACADEMIC_YEAR, AllocationTestCase, assert_seats_counted, create_cohort, live_allotments
+
+
+class WorkerKilled(Exception):
+    pass
+
+
+class CheckpointLeaseTests(AllocationTestCase):
+    """Only builds that stopped sending heartbeats are resumed or failed"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.batches, cls.students = create_cohort(
+            {'ALG': ('DSC', 1, 1), 'BIO': ('DSC', 2, 1), 'MUS': ('MDC', 1, 1), 'ART': ('MDC', 2, 1)},
+            {'S01': 900, 'S02': 800, 'S03': 700},
+            {
+                ('S01', 1): ['ALG'], ('S02', 1): ['ALG', 'BIO'], ('S03', 1): ['BIO'],
+                ('S01', 2): ['BIO'], ('S02', 2): ['BIO'], ('S03', 2): ['BIO'],
+                ('S01', 4): ['MUS'], ('S02', 4): ['MUS'], ('S03', 4): ['ART'],
+            }
+        )
+
+    def interrupted_build(self, minutes_silent=0):
+        """A build killed after its first checkpoint, last heard from minutes_silent ago"""
+        def kill_after_first_pass(passes_done, total_passes, name):
+            if passes_done == 2:
+                raise WorkerKilled()
+
+        with self.assertRaises(WorkerKilled):
+            allocate_courses_checkpointed(1, ACADEMIC_YEAR, progress=kill_after_first_pass)
+        run = AllocationRun.objects.filter(status=AllocationRun.BUILDING).first()
+        self.assertEqual(run.passes_saved, 1)
+        self.go_silent(run, minutes_silent)
+        return run
+
+    def go_silent(self, run, minutes):
+        AllocationRun.objects.filter(pk=run.pk).update(heartbeat_at=timezone.now() - timedelta(minutes=minutes))
+
+    def test_silent_build_resumes_to_the_uninterrupted_allocation(self):
+        interrupted = self.interrupted_build(minutes_silent=20)
+        self.assertEqual(get_interrupted_run(1, ACADEMIC_YEAR), interrupted)
+
+        run = allocate_courses_checkpointed(1, ACADEMIC_YEAR)
+        self.assertEqual(run.pk, interrupted.pk)
+        self.assertEqual(run.build_attempts, 2)
+        resumed = live_allotments()
+        assert_seats_counted(self)
+
+        allocate_courses(1, ACADEMIC_YEAR)
+        self.assertEqual(resumed, live_allotments())
+
+    def test_build_still_sending_heartbeats_is_left_alone(self):
+        live = self.interrupted_build(minutes_silent=1)
+        self.assertIsNone(get_interrupted_run(1, ACADEMIC_YEAR))
+
+        run = allocate_courses_checkpointed(1, ACADEMIC_YEAR)
+        self.assertNotEqual(run.pk, live.pk)
+        live.refresh_from_db()
+        self.assertEqual((live.status, live.build_attempts), (AllocationRun.BUILDING, 1))
+
+    def test_older_silent_builds_are_failed(self):
+        # Both are built while the other still looks alive, so neither resumes the other
+        older = self.interrupted_build()
+        latest = self.interrupted_build()
+        self.go_silent(older, 30)
+        self.go_silent(latest, 20)
+
+        self.assertEqual(allocate_courses_checkpointed(1, ACADEMIC_YEAR).pk, latest.pk)
+        older.refresh_from_db()
+        self.assertEqual(older.status, AllocationRun.FAILED)
+
+    def test_build_that_lost_its_run_cannot_write_to_it(self):
+        run = self.interrupted_build(minutes_silent=20)
+        first = RunLease.claim(AllocationRun.objects.get(pk=run.pk))
+        # A second resume started from the same stale state loses the race
+        with self.assertRaisesMessage(ValidationError, "resumed by another build"):
+            RunLease.claim(run)
+
+        RunLease.claim(AllocationRun.objects.get(pk=run.pk))
+        with self.assertRaisesMessage(ValidationError, "taken over by another build"):
+            first.write(passes_saved=5)
+        run.refresh_from_db()
+        self.assertEqual((run.passes_saved, run.build_attempts), (1, 3))
@@ -0,0 +1,60 @@
+from allotmentapp.allocation import allocate_courses
+from allotmentapp.course_changes import process_course_change_requests
+from allotmentapp.models import CourseChangeHistory, CourseChangeRequest
+
+from .base import ACADEMIC_YEAR, AllocationTestCase, assert_seats_counted, create_cohort, live_allotments
+
+
+class CourseChangeTests(AllocationTestCase):
+    """Pending changes are settled together in merit order against a shared seat ledger"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.batches, cls.students = create_cohort(
+            {'ALG': ('DSC', 1, 1), 'BIO': ('DSC', 1, 1), 'CHE': ('DSC', 2, 1), 'DAT': ('DSC', 2, 1)},
+            {'S01': 900, 'S02': 800, 'S03': 600, 'S04': 700},
+            {
+                ('S01', 2): ['ALG'], ('S02', 2): ['BIO'], ('S03', 2): ['CHE'], ('S04', 2): ['CHE'],
+                ('S03', 3): ['DAT'],
+            }
+        )
+
+    def change(self, admission_number, paper_no, current, new):
+        return CourseChangeRequest.objects.create(
+            student=self.students[admission_number], paper_no=paper_no,
+            current_batch=self.batches[current], new_batch=self.batches[new]
+        )
+
+    def test_seats_freed_by_changes_go_to_the_next_student_in_merit_order(self):
+        allocate_courses(1, ACADEMIC_YEAR)
+        # S04 outranks S03 on marks despite the later admission number
+        s03 = self.change('S03', 2, 'CHE', 'ALG')
+        s04 = self.change('S04', 2, 'CHE', 'ALG')
+        s02 = self.change('S02', 2, 'BIO', 'DAT')
+        # BIO is full until S02 leaves it, so S01 only gets it on the second pass
+        s01 = self.change('S01', 2, 'ALG', 'BIO')
+        stale = self.change('S02', 3, 'BIO', 'DAT')
+
+        self.assertEqual(process_course_change_requests(1, ACADEMIC_YEAR), {'approved': 3, 'rejected': 2})
+        self.assertEqual(live_allotments(), {
+            ('S01', 2): ('BIO', 1), ('S02', 2): ('DAT', 1), ('S03', 2): ('CHE', 1), ('S04', 2): ('ALG', 1),
+            ('S03', 3): ('DAT', 1),
+        })
+        outcomes = dict(CourseChangeRequest.objects.values_list('id', 'outcome'))
+        self.assertEqual(outcomes[s03.id], "No seat left in ALG")
+        self.assertEqual(outcomes[stale.id], "The student no longer holds the batch being changed")
+        self.assertEqual(
+            set(CourseChangeHistory.objects.values_list('request_id', flat=True)), {s01.id, s02.id, s04.id}
+        )
+        assert_seats_counted(self)
+
+    def test_change_into_a_batch_held_for_another_paper_is_rejected(self):
+        allocate_courses(1, ACADEMIC_YEAR)
+        request = self.change('S03', 2, 'CHE', 'DAT')
+
+        self.assertEqual(process_course_change_requests(1, ACADEMIC_YEAR), {'approved': 0, 'rejected': 1})
+        request.refresh_from_db()
+        self.assertEqual(
+            (request.status, request.outcome),
+            (CourseChangeRequest.REJECTED, "The student already holds the new course for another paper")
+        )
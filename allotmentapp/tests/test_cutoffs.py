@@ -0,0 +1,46 @@
+from allotmentapp.allocation import allocate_courses
+from allotmentapp.models import BatchCutoff, Student
+
+from .base import ACADEMIC_YEAR, AllocationTestCase, create_cohort
+
+
+class CutoffTests(AllocationTestCase):
+    """A run records the last student every batch admitted on merit, per admission category"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.batches, cls.students = create_cohort(
+            {'ALG': ('DSC', 3, 1), 'BIO': ('DSC', 3, 1)},
+            {'S01': 900, 'S02': 850, 'S03': 800, 'S04': 700, 'S05': 600},
+            {
+                **{(admission_number, 2): ['ALG', 'BIO'] for admission_number in ('S01', 'S02', 'S03', 'S04')},
+                # Direct papers go in admission order and say nothing about marks
+                ('S05', 1): ['BIO'],
+            }
+        )
+        Student.objects.filter(admission_number__in=['S02', 'S04']).update(admission_category='SC')
+
+    def cutoffs(self, run):
+        return {
+            (cutoff.batch.course.course_code, cutoff.paper_no, cutoff.admission_category):
+                (cutoff.admitted, cutoff.last_rank, cutoff.last_marks)
+            for cutoff in BatchCutoff.all_runs.filter(run=run).select_related('batch__course')
+        }
+
+    def test_cutoffs_follow_merit_papers_only(self):
+        run = allocate_courses(1, ACADEMIC_YEAR)
+        # BIO's seat on paper 1 went to S05 in admission order, so only S04 counts there
+        self.assertEqual(self.cutoffs(run), {
+            ('ALG', 2, 'General'): (2, 3, 800),
+            ('ALG', 2, 'SC'): (1, 2, 850),
+            ('BIO', 2, 'SC'): (1, 4, 700),
+        })
+
+    def test_each_run_keeps_its_own_cutoffs(self):
+        first = allocate_courses(1, ACADEMIC_YEAR)
+        Student.objects.filter(admission_number='S03').update(normalized_marks=500)
+        second = allocate_courses(1, ACADEMIC_YEAR)
+        self.assertEqual(self.cutoffs(first)[('ALG', 2, 'General')], (2, 3, 800))
+        self.assertEqual(self.cutoffs(second)[('ALG', 2, 'SC')], (2, 3, 700))
+        # Ranks count the whole cohort, S05 included
+        self.assertEqual(self.cutoffs(second)[('BIO', 2, 'General')], (1, 5, 500))
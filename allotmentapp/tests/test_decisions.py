@@ -0,0 +1,96 @@
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import SimpleTestCase
+
+from allotmentapp.allocation import allocate_courses
+from allotmentapp.decisions import (
+    ALLOTTED, FULL, UNPLACED, DecisionLog, read_decision_log, replay_log
+)
+
+from .base import ACADEMIC_YEAR, AllocationTestCase, create_cohort
+
+HEADER = {
+    'run': 7,
+    'passes': ["Paper 1 direct", "Paper 2 merit"],
+    'students': {1: ['S01', 'Asha'], 2: ['S02', 'Binu']},
+    'batches': {10: ['ALG', ACADEMIC_YEAR, 1], 11: ['BIO', ACADEMIC_YEAR, 1]},
+}
+
+
+class DecisionLogFileTests(SimpleTestCase):
+    """Decision logs read back pass by pass, the last copy of a resumed pass winning"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.path = os.path.join(self.directory, 'run_7.alog')
+
+    def test_resumed_pass_replaces_the_interrupted_copy(self):
+        log = DecisionLog(self.path, HEADER)
+        log.start_pass(1)
+        log.record(1, 10, 1, 1, 1, ALLOTTED)
+        log.start_pass(2)
+        log.record(2, 10, 0, 2, 1, FULL)
+        log.close()
+
+        # Reopening to resume keeps the header and pass 1, then logs pass 2 again
+        log = DecisionLog(self.path, {'run': 'ignored'}, resume=True)
+        log.start_pass(2)
+        log.record(2, 10, 0, 2, 1, FULL)
+        log.record(2, 11, 1, 2, 2, ALLOTTED)
+        log.close()
+
+        header, passes = read_decision_log(self.path)
+        self.assertEqual(header['run'], 7)
+        self.assertEqual(passes, {
+            1: [(1, 10, 1, 1, 1, ALLOTTED)],
+            2: [(2, 10, 0, 2, 1, FULL), (2, 11, 1, 2, 2, ALLOTTED)],
+        })
+
+    def test_replay_explains_one_student(self):
+        log = DecisionLog(self.path, HEADER)
+        log.start_pass(2)
+        log.record(1, 10, 1, 2, 1, ALLOTTED)
+        log.record(2, 10, 0, 2, 1, FULL)
+        log.record(2, 0, 0, 2, 0, UNPLACED)
+        log.close()
+        # A record torn by a killed worker is skipped
+        with open(self.path, 'ab') as file:
+            file.write(b'\x01\x00')
+
+        self.assertEqual(replay_log(self.path, 'S02'), [
+            f"Paper 2 merit: S02 Binu paper 2 preference 1 ALG {ACADEMIC_YEAR} part 1 (0 seats left): full, waitlisted",
+            "Paper 2 merit: S02 Binu paper 2: no seat in this pass",
+        ])
+        with self.assertRaisesMessage(ValueError, "Student S09 is not in run 7"):
+            replay_log(self.path, 'S09')
+
+    def test_other_files_are_refused(self):
+        with open(self.path, 'wb') as file:
+            file.write(b'not a log')
+        with self.assertRaisesMessage(ValueError, "is not an allocation decision log"):
+            read_decision_log(self.path)
+
+
+class ReplayCommandTests(AllocationTestCase):
+    """A run's log traces a student through the allocation it was written by"""
+
+    def test_student_trace_follows_the_run(self):
+        create_cohort(
+            {'ALG': ('DSC', 1, 1), 'BIO': ('DSC', 1, 1)},
+            {'S01': 900, 'S02': 800, 'S03': 700},
+            {(admission_number, 2): ['ALG', 'BIO'] for admission_number in ('S01', 'S02', 'S03')}
+        )
+        run = allocate_courses(1, ACADEMIC_YEAR)
+
+        out = StringIO()
+        call_command('replay_allocation_log', str(run.pk), student='S03', stdout=out)
+        self.assertEqual([line for line in out.getvalue().splitlines() if 'paper 2' in line], [
+            f"Paper 2 merit: S03 S03 paper 2 preference 1 ALG {ACADEMIC_YEAR} part 1 (0 seats left): full, waitlisted",
+            f"Paper 2 merit: S03 S03 paper 2 preference 2 BIO {ACADEMIC_YEAR} part 1 (0 seats left): full, waitlisted",
+            "Paper 2 merit: S03 S03 paper 2: no seat in this pass",
+        ])
@@ -0,0 +1,64 @@
+from django.core.exceptions import ValidationError
+
+from allotmentapp.allocation import allocate_courses
+from allotmentapp.diffs import (
+    ADDED, MOVED, REMOVED, AllotmentDiff, get_published_runs, get_run_allotments, iter_diff_rows
+)
+from allotmentapp.models import Course, CoursePreference
+
+from .base import ACADEMIC_YEAR, AllocationTestCase, create_cohort
+
+
+class RunDiffTests(AllocationTestCase):
+    """Diffs list every seat that moved, appeared or went away between two runs"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.batches, cls.students = create_cohort(
+            {'ALG': ('DSC', 2, 1), 'BIO': ('DSC', 5, 1), 'CHE': ('DSC', 5, 1)},
+            {'S01': 900, 'S02': 800, 'S03': 700},
+            {
+                **{(admission_number, 2): ['ALG', 'BIO'] for admission_number in ('S01', 'S02', 'S03')},
+                ('S03', 3): ['CHE'],
+            }
+        )
+
+    def test_diff_of_the_published_runs(self):
+        with self.assertRaises(ValidationError):
+            get_published_runs(1, ACADEMIC_YEAR)
+        first = allocate_courses(1, ACADEMIC_YEAR)
+
+        Course.objects.filter(course_code='ALG').update(seat_limit=1)
+        CoursePreference.objects.filter(student=self.students['S03'], paper_no=3).delete()
+        CoursePreference.objects.create(
+            student=self.students['S01'], batch=self.batches['CHE'], preference_number=1, paper_no=3
+        )
+        second = allocate_courses(1, ACADEMIC_YEAR)
+        self.assertEqual(get_published_runs(1, ACADEMIC_YEAR), (first, second))
+
+        diff = AllotmentDiff(get_run_allotments(first), get_run_allotments(second))
+        algebra, biology, chemistry = (self.batches[code].id for code in ('ALG', 'BIO', 'CHE'))
+        self.assertEqual(list(diff.changes()), [
+            (ADDED, 'S01', 'S01', 3, None, chemistry),
+            (MOVED, 'S02', 'S02', 2, algebra, biology),
+            (REMOVED, 'S03', 'S03', 3, chemistry, None),
+        ])
+        self.assertEqual(diff.unchanged, 2)
+        self.assertEqual(len(diff.students), 3)
+        # CHE lost one seat and gained one
+        self.assertEqual(diff.batch_deltas(), sorted([(algebra, -1), (biology, 1)]))
+
+    def test_csv_rows_label_batches(self):
+        first = allocate_courses(1, ACADEMIC_YEAR)
+        Course.objects.filter(course_code='ALG').update(seat_limit=1)
+        second = allocate_courses(1, ACADEMIC_YEAR)
+
+        rows = list(iter_diff_rows(AllotmentDiff(get_run_allotments(first), get_run_allotments(second))))
+        self.assertEqual(rows, [
+            ['Change', 'Admission Number', 'Name', 'Paper', 'Old Batch', 'New Batch'],
+            [MOVED, 'S02', 'S02', 2, f"ALG {ACADEMIC_YEAR} part 1", f"BIO {ACADEMIC_YEAR} part 1"],
+            [],
+            ['Batch', 'Seat Change'],
+            [f"ALG {ACADEMIC_YEAR} part 1", '-1'],
+            [f"BIO {ACADEMIC_YEAR} part 1", '+1'],
+        ])
@@ -0,0 +1,63 @@
+from unittest import mock
+
+from django.contrib.auth.models import Group, User
+from django.urls import reverse
+
+from allotmentapp import views
+from allotmentapp.allocation import allocate_courses
+from allotmentapp.incremental import allocate_late_students
+from allotmentapp.models import CoursePreference
+
+from .base import ACADEMIC_YEAR, AllocationTestCase, assert_seats_counted, create_cohort, live_allotments
+
+
+class LateStudentTests(AllocationTestCase):
+    """Only students the live run did not allocate are inserted, displacing lower-ranked holders"""
+
+    @classmethod
+    def setUpTestData(cls):
+        # L01 tops the merit list but lists nothing until after the run
+        cls.batches, cls.students = create_cohort(
+            {'ALG': ('DSC', 1, 1), 'BIO': ('DSC', 1, 1)},
+            {'L01': 950, 'S01': 800, 'S02': 700, 'S03': 600},
+            {('S01', 2): ['ALG', 'BIO'], ('S02', 2): ['BIO'], ('S03', 2): ['ALG']}
+        )
+
+    def setUp(self):
+        self.run = allocate_courses(1, ACADEMIC_YEAR)
+        CoursePreference.objects.create(
+            student=self.students['L01'], batch=self.batches['ALG'], preference_number=1, paper_no=2
+        )
+
+    def test_late_student_starts_a_displacement_chain(self):
+        self.assertEqual(live_allotments(), {('S01', 2): ('ALG', 1), ('S02', 2): ('BIO', 1)})
+
+        report = allocate_late_students(1, ACADEMIC_YEAR)
+        # S03 lost ALG in the run and must not take it back from S01
+        self.assertEqual(report['pending_students'], ['L01'])
+        # S01 moves down to BIO and S02 has nothing left to fall back on
+        self.assertEqual(live_allotments(), {('L01', 2): ('ALG', 1), ('S01', 2): ('BIO', 1)})
+        self.assertEqual((report['created'], report['moved'], report['removed']), (1, 1, 1))
+        assert_seats_counted(self)
+
+    def test_inserted_students_join_the_run(self):
+        allocate_late_students(1, ACADEMIC_YEAR)
+        self.assertTrue(self.run.students.filter(pk=self.students['L01'].pk).exists())
+        self.assertEqual(allocate_late_students(1, ACADEMIC_YEAR)['pending_students'], [])
+
+    def test_only_students_outside_the_run_may_edit_preferences(self):
+        group = Group.objects.create(name='Student')
+        for admission_number in ('L01', 'S03'):
+            user = User.objects.create_user(username=admission_number)
+            user.groups.add(group)
+            self.students[admission_number].user = user
+            self.students[admission_number].save(update_fields=['user'])
+
+        with mock.patch.object(views, 'get_current_academic_year', return_value=ACADEMIC_YEAR):
+            self.client.force_login(self.students['S03'].user)
+            response = self.client.get(reverse('edit_preferences'))
+            self.assertRedirects(response, reverse('view_student_allotment'), fetch_redirect_response=False)
+
+            self.client.force_login(self.students['L01'].user)
+            response = self.client.get(reverse('edit_preferences'))
+            self.assertEqual(response.status_code, 200)
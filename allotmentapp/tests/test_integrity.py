@@ -0,0 +1,70 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.db.models import F
+
+from allotmentapp.allocation import allocate_courses
+from allotmentapp.integrity import reconcile_allotments
+from allotmentapp.models import Batch, CourseAllotment
+
+from .base import ACADEMIC_YEAR, AllocationTestCase, assert_seats_counted, create_cohort, live_allotments
+
+
+class ReconcileTests(AllocationTestCase):
+    """Drifted seat counts and duplicate allotments are reported and, on request, repaired"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.batches, cls.students = create_cohort(
+            {'ALG': ('DSC', 2, 1), 'BIO': ('DSC', 2, 1), 'CHE': ('DSC', 2, 1)},
+            {'S01': 900, 'S02': 800, 'S03': 700},
+            {('S01', 2): ['ALG'], ('S02', 2): ['BIO'], ('S03', 2): ['CHE']}
+        )
+
+    def setUp(self):
+        allocate_courses(1, ACADEMIC_YEAR)
+        self.original = CourseAllotment.objects.get(student=self.students['S01'], paper_no=2)
+        # A second live seat for the same paper, which the batch count never saw
+        self.duplicate = CourseAllotment.objects.create(
+            student=self.students['S01'], batch=self.batches['BIO'], paper_no=2, run_id=self.original.run_id
+        )
+        Batch.objects.filter(pk=self.batches['CHE'].pk).update(seats_taken=F('seats_taken') + 1)
+
+    def test_allocation_leaves_nothing_to_reconcile(self):
+        self.duplicate.delete()
+        Batch.objects.filter(pk=self.batches['CHE'].pk).update(seats_taken=1)
+        self.assertEqual(reconcile_allotments(), {'drift': [], 'duplicates': []})
+
+    def test_check_reports_without_changing_anything(self):
+        result = reconcile_allotments()
+        self.assertEqual(result, {
+            'drift': [(self.batches['BIO'].id, 1, 2), (self.batches['CHE'].id, 2, 1)],
+            'duplicates': [(self.duplicate.id, self.students['S01'].id, 2, self.batches['BIO'].id)],
+        })
+        self.assertTrue(CourseAllotment.objects.filter(pk=self.duplicate.pk).exists())
+        self.assertEqual(Batch.objects.get(pk=self.batches['CHE'].pk).seats_taken, 2)
+
+    def test_fix_keeps_the_earliest_allotment_and_recounts(self):
+        reconcile_allotments(fix=True)
+        self.assertFalse(CourseAllotment.all_runs.filter(pk=self.duplicate.pk).exists())
+        self.assertEqual(live_allotments()[('S01', 2)], ('ALG', 1))
+        assert_seats_counted(self)
+        self.assertEqual(reconcile_allotments(), {'drift': [], 'duplicates': []})
+
+    def test_check_is_limited_to_the_given_batches(self):
+        result = reconcile_allotments(Batch.objects.filter(pk=self.batches['ALG'].pk), fix=True)
+        # S01's duplicate is found through their ALG seat, but CHE's count is left alone
+        self.assertEqual(result['drift'], [])
+        self.assertEqual([row[0] for row in result['duplicates']], [self.duplicate.id])
+        self.assertEqual(Batch.objects.get(pk=self.batches['BIO'].pk).seats_taken, 1)
+        self.assertEqual(Batch.objects.get(pk=self.batches['CHE'].pk).seats_taken, 2)
+
+    def test_command_reports_and_fixes(self):
+        out = StringIO()
+        call_command('reconcile_seats', stdout=out)
+        self.assertIn("Found 2 batch(es) with drifted seat counts, 1 duplicate allotment(s)", out.getvalue())
+        self.assertIn(f"[DUPLICATE]  allotment {self.duplicate.id}", out.getvalue())
+
+        call_command('reconcile_seats', '--fix', stdout=out)
+        self.assertIn("Fixed 2 batch(es)", out.getvalue())
+        assert_seats_counted(self)
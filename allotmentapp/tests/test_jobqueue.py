@@ -0,0 +1,111 @@
+import csv
+import shutil
+import tempfile
+from datetime import timedelta
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from allotmentapp import jobqueue
+from allotmentapp.allocation import allocate_courses
+from allotmentapp.jobqueue import (
+    MAX_ATTEMPTS, JobLost, JobProgress, claim_next_job, enqueue_job, get_job_output_path,
+    requeue_stalled_jobs, run_job
+)
+from allotmentapp.models import AllocationRun, BackgroundJob
+from allotmentapp.streaming import iter_allotment_csv_rows
+
+from .base import ACADEMIC_YEAR, AllocationTestCase, create_cohort
+
+
+class JobClaimTests(TestCase):
+    """Jobs are claimed once per attempt, and a worker that lost its attempt writes nothing"""
+
+    def stall(self, job):
+        BackgroundJob.objects.filter(pk=job.pk).update(heartbeat_at=timezone.now() - timedelta(hours=1))
+
+    def test_identical_pending_jobs_are_not_queued_twice(self):
+        job = enqueue_job(BackgroundJob.EXPORT_ALLOTMENTS, semester=1)
+        self.assertEqual(enqueue_job(BackgroundJob.EXPORT_ALLOTMENTS, semester=1), job)
+        self.assertNotEqual(enqueue_job(BackgroundJob.EXPORT_ALLOTMENTS, semester=2), job)
+
+        BackgroundJob.objects.filter(pk=job.pk).update(status=BackgroundJob.DONE)
+        self.assertNotEqual(enqueue_job(BackgroundJob.EXPORT_ALLOTMENTS, semester=1), job)
+
+    def test_oldest_queued_job_is_claimed_once(self):
+        first = enqueue_job(BackgroundJob.EXPORT_ALLOTMENTS, semester=1)
+        second = enqueue_job(BackgroundJob.EXPORT_ALLOTMENTS, semester=2)
+
+        claimed = claim_next_job()
+        self.assertEqual((claimed.pk, claimed.status, claimed.attempts), (first.pk, BackgroundJob.RUNNING, 1))
+        self.assertEqual(claim_next_job(), second)
+        self.assertIsNone(claim_next_job())
+
+    def test_stalled_jobs_are_requeued_until_out_of_attempts(self):
+        enqueue_job(BackgroundJob.EXPORT_ALLOTMENTS, semester=1)
+        job = claim_next_job()
+        self.assertEqual(requeue_stalled_jobs(), (0, 0))
+
+        self.stall(job)
+        self.assertEqual(requeue_stalled_jobs(), (1, 0))
+        job = claim_next_job()
+        self.assertEqual(job.attempts, 2)
+
+        BackgroundJob.objects.filter(pk=job.pk).update(attempts=MAX_ATTEMPTS)
+        self.stall(job)
+        self.assertEqual(requeue_stalled_jobs(), (0, 1))
+        job.refresh_from_db()
+        self.assertEqual(job.status, BackgroundJob.FAILED)
+
+    def test_worker_that_lost_its_attempt_stops_and_writes_nothing(self):
+        enqueue_job(BackgroundJob.EXPORT_ALLOTMENTS, semester=1)
+        job = claim_next_job()
+
+        def handler(job, progress):
+            progress(10, "Started")
+            # The job stalls, is queued again and another worker claims it
+            self.stall(job)
+            requeue_stalled_jobs()
+            claim_next_job()
+            progress(50, "Halfway")
+            return {'message': "Finished"}
+
+        with mock.patch.dict(jobqueue.JOB_HANDLERS, {BackgroundJob.EXPORT_ALLOTMENTS: handler}):
+            job = run_job(job)
+        self.assertEqual((job.status, job.attempts, job.progress, job.result), (BackgroundJob.RUNNING, 2, 10, None))
+
+        stale = JobProgress(BackgroundJob(pk=job.pk, attempts=1))
+        with self.assertRaises(JobLost):
+            stale(90, "Almost done")
+
+
+class JobHandlerTests(AllocationTestCase):
+    """Allocation and export jobs run their work through the queue"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.batches, cls.students = create_cohort(
+            {'ALG': ('DSC', 1, 1), 'BIO': ('DSC', 2, 1)},
+            {'S01': 900, 'S02': 800},
+            {(admission_number, 2): ['ALG', 'BIO'] for admission_number in ('S01', 'S02')}
+        )
+
+    def test_allocation_job_publishes_a_checkpointed_run(self):
+        enqueue_job(BackgroundJob.ALLOCATE, semester=1, academic_year=ACADEMIC_YEAR)
+        job = run_job(claim_next_job())
+        self.assertEqual(job.status, BackgroundJob.DONE, job.error)
+        run = AllocationRun.objects.get(pk=job.result['run'])
+        self.assertEqual((run.status, run.total_allotments), (AllocationRun.ACTIVE, 2))
+
+    def test_export_job_writes_the_download_sheet(self):
+        allocate_courses(1, ACADEMIC_YEAR)
+        output_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, output_dir)
+        with override_settings(JOB_OUTPUT_DIR=output_dir):
+            enqueue_job(BackgroundJob.EXPORT_ALLOTMENTS, semester=1)
+            job = run_job(claim_next_job())
+            with open(get_job_output_path(job), newline='') as output:
+                written = list(csv.reader(output))
+        self.assertEqual(job.result['rows'], 2)
+        self.assertEqual(written, [[str(value) for value in row] for row in iter_allotment_csv_rows(1)])
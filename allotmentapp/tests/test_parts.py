@@ -0,0 +1,123 @@
+from django.db.models import Count
+
+from allotmentapp.allocation import allocate_courses
+from allotmentapp.course_changes import process_course_change_requests
+from allotmentapp.models import Batch, BatchWaitlist, Course, CourseAllotment, CourseChangeRequest, SwapRequest
+from allotmentapp.spot import get_spot_batches
+from allotmentapp.swaps import resolve_swap_requests
+from allotmentapp.waitlist import withdraw_student
+
+from .base import ACADEMIC_YEAR, AllocationTestCase, assert_seats_counted, create_cohort, live_allotments
+
+
+class CoursePartTests(AllocationTestCase):
+    """Seats of a course's parts are pooled, and a student never holds two parts of one course"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.batches, cls.students = create_cohort(
+            {'ALG': ('DSC', 2, 2), 'BIO': ('DSC', 5, 1)},
+            {'A01': 900, 'A02': 800, 'A03': 700, 'A04': 600, 'A05': 500},
+            {
+                **{(admission_number, 1): [('ALG', 1)] for admission_number in ('A01', 'A02', 'A03', 'A04', 'A05')},
+                **{(admission_number, 2): [('ALG', 2), 'BIO'] for admission_number in ('A01', 'A02')},
+            }
+        )
+
+    def test_students_listing_one_part_fill_the_least_filled_part(self):
+        allocate_courses(1, ACADEMIC_YEAR)
+        allotments = live_allotments()
+        self.assertEqual(
+            {admission_number: allotments[(admission_number, 1)] for admission_number in ('A01', 'A02', 'A03', 'A04')},
+            {'A01': ('ALG', 1), 'A02': ('ALG', 2), 'A03': ('ALG', 1), 'A04': ('ALG', 2)}
+        )
+        # Both parts are full, so the last student waits for the part they listed
+        self.assertNotIn(('A05', 1), allotments)
+        self.assertTrue(BatchWaitlist.objects.filter(
+            student=self.students['A05'], batch=self.batches[('ALG', 1)], paper_no=1
+        ).exists())
+        assert_seats_counted(self)
+
+    def test_student_is_not_seated_in_a_second_part_of_a_course(self):
+        # Part 2 keeps a free seat after paper 1, which A01 lists for paper 2
+        Course.objects.filter(course_code='ALG').update(seat_limit=3)
+        allocate_courses(1, ACADEMIC_YEAR)
+        allotments = live_allotments()
+        self.assertEqual(allotments[('A01', 2)], ('BIO', 1))
+        self.assertEqual(allotments[('A02', 2)], ('BIO', 1))
+        courses_held = CourseAllotment.objects.values('student', 'batch__course').annotate(count=Count('id'))
+        self.assertFalse(courses_held.filter(count__gt=1).exists())
+
+
+class HeldPartTests(AllocationTestCase):
+    """Seats handed out after the allocation never give a student a second part of a course"""
+
+    @classmethod
+    def setUpTestData(cls):
+        # S01 holds ALG part 1 for paper 2 and lists ALG part 2 first for paper 3
+        cls.batches, cls.students = create_cohort(
+            {'ALG': ('DSC', 1, 2), 'BIO': ('DSC', 1, 1), 'CHE': ('DSC', 2, 1), 'DAT': ('DSC', 1, 1)},
+            {'S01': 900, 'S02': 800, 'S03': 700},
+            {
+                ('S01', 2): [('ALG', 1)], ('S02', 2): ['BIO'], ('S03', 2): ['DAT'],
+                ('S01', 3): [('ALG', 2), 'CHE', 'DAT'], ('S02', 3): [('ALG', 2)], ('S03', 3): [('ALG', 2), 'CHE'],
+            }
+        )
+
+    def setUp(self):
+        allocate_courses(1, ACADEMIC_YEAR)
+
+    def test_waitlist_skips_a_student_holding_another_part(self):
+        # Put S01 ahead of S03 on the part 2 waitlist
+        BatchWaitlist.objects.create(
+            batch=self.batches[('ALG', 2)], student=self.students['S01'], paper_no=3, position=0, preference_rank=1
+        )
+        self.assertEqual(withdraw_student(self.students['S02']), 1)
+        allotments = live_allotments()
+        self.assertEqual(allotments[('S01', 3)], ('CHE', 1))
+        self.assertEqual(allotments[('S03', 3)], ('ALG', 2))
+        assert_seats_counted(self)
+
+    def test_spot_round_leaves_out_other_parts_of_a_held_course(self):
+        # CHE is held for paper 3 itself and ALG part 2 is a part of the course held for paper 2
+        batches = get_spot_batches(self.students['S01'].id, 3, 1, ACADEMIC_YEAR)
+        self.assertEqual(list(batches), [self.batches['DAT']])
+
+    def test_course_change_into_another_part_of_a_held_course_is_rejected(self):
+        # Free ALG part 2 without refilling it from the waitlist
+        CourseAllotment.objects.filter(student=self.students['S02'], paper_no=3).delete()
+        Batch.objects.filter(pk=self.batches[('ALG', 2)].pk).update(seats_taken=0)
+        blocked = CourseChangeRequest.objects.create(
+            student=self.students['S01'], paper_no=3,
+            current_batch=self.batches['CHE'], new_batch=self.batches[('ALG', 2)]
+        )
+        # Moving between the parts of a course is a change of batch, not a second course
+        moved = CourseChangeRequest.objects.create(
+            student=self.students['S01'], paper_no=2,
+            current_batch=self.batches[('ALG', 1)], new_batch=self.batches[('ALG', 2)]
+        )
+        self.assertEqual(process_course_change_requests(1, ACADEMIC_YEAR), {'approved': 1, 'rejected': 1})
+        self.assertEqual(
+            CourseChangeRequest.objects.get(pk=blocked.pk).outcome,
+            "The student already holds the new course for another paper"
+        )
+        self.assertEqual(CourseChangeRequest.objects.get(pk=moved.pk).status, CourseChangeRequest.APPROVED)
+        allotments = live_allotments()
+        self.assertEqual((allotments[('S01', 2)], allotments[('S01', 3)]), (('ALG', 2), ('CHE', 1)))
+        assert_seats_counted(self)
+
+    def test_swap_into_another_part_of_a_held_course_is_cancelled(self):
+        blocked = SwapRequest.objects.create(
+            student=self.students['S01'], paper_no=3,
+            offered_batch=self.batches['CHE'], wanted_batch=self.batches[('ALG', 2)]
+        )
+        partner = SwapRequest.objects.create(
+            student=self.students['S02'], paper_no=3,
+            offered_batch=self.batches[('ALG', 2)], wanted_batch=self.batches['CHE']
+        )
+        self.assertEqual(resolve_swap_requests(1, ACADEMIC_YEAR), {'cycles': 0, 'swapped': 0, 'cancelled': 1})
+        self.assertEqual(
+            dict(SwapRequest.objects.values_list('id', 'status')),
+            {blocked.id: SwapRequest.CANCELLED, partner.id: SwapRequest.PENDING}
+        )
+        self.assertEqual(live_allotments()[('S01', 3)], ('CHE', 1))
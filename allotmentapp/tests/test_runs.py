@@ -0,0 +1,63 @@
+import os
+
+from django.core.exceptions import ValidationError
+
+from allotmentapp.allocation import allocate_courses
+from allotmentapp.decisions import get_decision_log_path
+from allotmentapp.models import AllocationRun, Batch, Course, CourseAllotment
+from allotmentapp.runs import collect_superseded_runs, rollback_run
+
+from .base import ACADEMIC_YEAR, AllocationTestCase, assert_seats_counted, create_cohort, live_allotments
+
+
+class RunPublishTests(AllocationTestCase):
+    """Publishing and rolling back runs keeps seats_taken equal to the live allotments"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.batches, cls.students = create_cohort(
+            {'ALG': ('DSC', 2, 1), 'BIO': ('DSC', 5, 1)},
+            {'A01': 900, 'A02': 800, 'A03': 700},
+            {(admission_number, 2): ['ALG', 'BIO'] for admission_number in ('A01', 'A02', 'A03')}
+        )
+
+    def seats_taken(self):
+        return dict(Batch.objects.values_list('course__course_code', 'seats_taken'))
+
+    def test_publish_replaces_seats_and_rollback_restores_them(self):
+        first = allocate_courses(1, ACADEMIC_YEAR)
+        self.assertEqual(self.seats_taken(), {'ALG': 2, 'BIO': 1})
+        first_allotments = live_allotments()
+
+        Course.objects.filter(course_code='ALG').update(seat_limit=1)
+        second = allocate_courses(1, ACADEMIC_YEAR)
+        self.assertEqual(self.seats_taken(), {'ALG': 1, 'BIO': 2})
+        assert_seats_counted(self)
+        first.refresh_from_db()
+        self.assertEqual(first.status, AllocationRun.SUPERSEDED)
+
+        self.assertEqual(rollback_run(1, ACADEMIC_YEAR), first)
+        self.assertEqual(self.seats_taken(), {'ALG': 2, 'BIO': 1})
+        self.assertEqual(live_allotments(), first_allotments)
+        assert_seats_counted(self)
+        second.refresh_from_db()
+        self.assertEqual(second.status, AllocationRun.SUPERSEDED)
+
+    def test_rollback_without_previous_run_fails(self):
+        allocate_courses(1, ACADEMIC_YEAR)
+        with self.assertRaises(ValidationError):
+            rollback_run(1, ACADEMIC_YEAR)
+
+    def test_collecting_a_run_removes_its_rows_and_decision_log(self):
+        first, second, third = (allocate_courses(1, ACADEMIC_YEAR) for _ in range(3))
+        for run in (first, second, third):
+            self.assertTrue(os.path.exists(get_decision_log_path(run)))
+
+        deleted = collect_superseded_runs()
+        self.assertEqual(deleted['allotmentapp.AllocationRun'], 1)
+        self.assertFalse(AllocationRun.objects.filter(pk=first.pk).exists())
+        self.assertFalse(CourseAllotment.all_runs.filter(run_id=first.pk).exists())
+        self.assertFalse(os.path.exists(get_decision_log_path(first)))
+        # The live run and the one it can roll back to keep theirs
+        self.assertTrue(os.path.exists(get_decision_log_path(second)))
+        self.assertTrue(os.path.exists(get_decision_log_path(third)))
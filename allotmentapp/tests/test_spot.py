@@ -0,0 +1,53 @@
+from unittest import mock
+
+from django.core.exceptions import ValidationError
+from django.test import TestCase
+
+from allotmentapp import spot
+from allotmentapp.models import Batch, CourseAllotment
+from allotmentapp.spot import claim_spot_seat, set_spot_round_open
+
+from .base import ACADEMIC_YEAR, create_cohort
+
+
+class SpotClaimTests(TestCase):
+    """Spot round claims never take more seats than a batch has"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.batches, cls.students = create_cohort(
+            {'ALG': ('DSC', 1, 1)},
+            {'A01': 900, 'A02': 800},
+            {(admission_number, 2): ['ALG'] for admission_number in ('A01', 'A02')}
+        )
+        cls.spot_round = set_spot_round_open(1, ACADEMIC_YEAR, True)
+
+    def test_claim_on_a_full_batch_is_refused(self):
+        batch = self.batches['ALG']
+        claim_spot_seat(self.spot_round, self.students['A01'].id, batch, 2)
+        with self.assertRaisesMessage(ValidationError, "no seats left"):
+            claim_spot_seat(self.spot_round, self.students['A02'].id, batch, 2)
+        batch.refresh_from_db()
+        self.assertEqual(batch.seats_taken, 1)
+        self.assertEqual(CourseAllotment.objects.filter(batch=batch).count(), 1)
+
+    def test_seat_taken_after_the_check_rolls_the_claim_back(self):
+        batch = self.batches['ALG']
+
+        def take_last_seat(semester, academic_year):
+            # Another claim commits between this claim's check and its UPDATE
+            Batch.objects.filter(pk=batch.pk).update(seats_taken=1)
+            return None
+
+        with mock.patch.object(spot, 'get_active_run', side_effect=take_last_seat):
+            with self.assertRaisesMessage(ValidationError, "no seats left"):
+                claim_spot_seat(self.spot_round, self.students['A01'].id, batch, 2)
+        batch.refresh_from_db()
+        self.assertEqual(batch.seats_taken, 1)
+        self.assertFalse(CourseAllotment.objects.filter(student=self.students['A01']).exists())
+        self.assertFalse(self.spot_round.claims.exists())
+
+    def test_second_claim_for_a_paper_is_refused(self):
+        claim_spot_seat(self.spot_round, self.students['A01'].id, self.batches['ALG'], 2)
+        with self.assertRaisesMessage(ValidationError, "already allotted for paper 2"):
+            claim_spot_seat(self.spot_round, self.students['A01'].id, self.batches['ALG'], 2)
@@ -0,0 +1,64 @@
+from django.test import SimpleTestCase
+
+from allotmentapp.allocation import allocate_courses
+from allotmentapp.models import SwapHistory, SwapRequest
+from allotmentapp.swaps import find_trade_cycles, resolve_swap_requests
+
+from .base import ACADEMIC_YEAR, AllocationTestCase, assert_seats_counted, create_cohort, live_allotments
+
+
+class TradeCycleTests(SimpleTestCase):
+    """Top trading cycles over (request, paper, offered batch, wanted batch) tuples"""
+
+    def test_requests_pointing_round_form_one_cycle(self):
+        self.assertEqual(find_trade_cycles([(1, 2, 'A', 'B'), (2, 2, 'B', 'C'), (3, 2, 'C', 'A')]), [[1, 2, 3]])
+
+    def test_request_moves_on_to_the_next_holder_when_the_first_cannot_trade(self):
+        # Request 2 offers B first but wants a batch nobody offers
+        requests = [(1, 2, 'A', 'B'), (2, 2, 'B', 'X'), (3, 2, 'B', 'A')]
+        self.assertEqual(find_trade_cycles(requests), [[1, 3]])
+
+    def test_earlier_request_wins_a_contested_batch(self):
+        requests = [(1, 2, 'A', 'B'), (2, 2, 'C', 'B'), (3, 2, 'B', 'A')]
+        self.assertEqual(find_trade_cycles(requests), [[1, 3]])
+
+    def test_papers_do_not_trade_with_each_other(self):
+        self.assertEqual(find_trade_cycles([(1, 2, 'A', 'B'), (2, 3, 'B', 'A')]), [])
+
+
+class SwapResolutionTests(AllocationTestCase):
+    """A round carries out every cycle, keeps unmatched requests and cancels stale ones"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.batches, cls.students = create_cohort(
+            {code: ('DSC', 1, 1) for code in ('ALG', 'BIO', 'CHE', 'DAT')},
+            {'S01': 900, 'S02': 800, 'S03': 700, 'S04': 600},
+            {('S01', 2): ['ALG'], ('S02', 2): ['BIO'], ('S03', 2): ['CHE'], ('S04', 2): ['DAT']}
+        )
+
+    def request(self, admission_number, paper_no, offered, wanted):
+        return SwapRequest.objects.create(
+            student=self.students[admission_number], paper_no=paper_no,
+            offered_batch=self.batches[offered], wanted_batch=self.batches[wanted]
+        )
+
+    def test_cycle_is_swapped_in_one_round(self):
+        allocate_courses(1, ACADEMIC_YEAR)
+        cycle = [self.request('S01', 2, 'ALG', 'BIO'), self.request('S02', 2, 'BIO', 'CHE'),
+                 self.request('S03', 2, 'CHE', 'ALG')]
+        unmatched = self.request('S04', 2, 'DAT', 'ALG')
+        # S02 holds nothing for paper 3
+        stale = self.request('S02', 3, 'DAT', 'ALG')
+
+        self.assertEqual(resolve_swap_requests(1, ACADEMIC_YEAR), {'cycles': 1, 'swapped': 3, 'cancelled': 1})
+        self.assertEqual(live_allotments(), {
+            ('S01', 2): ('BIO', 1), ('S02', 2): ('CHE', 1), ('S03', 2): ('ALG', 1), ('S04', 2): ('DAT', 1),
+        })
+        self.assertEqual(
+            dict(SwapRequest.objects.values_list('id', 'status')),
+            {**{request.id: SwapRequest.SWAPPED for request in cycle},
+             unmatched.id: SwapRequest.PENDING, stale.id: SwapRequest.CANCELLED}
+        )
+        self.assertEqual(set(SwapHistory.objects.values_list('cycle', flat=True)), {cycle[0].id})
+        assert_seats_counted(self)
@@ -0,0 +1,42 @@
+from allotmentapp.allocation import allocate_courses
+from allotmentapp.models import BatchWaitlist
+from allotmentapp.waitlist import withdraw_student
+
+from .base import ACADEMIC_YEAR, AllocationTestCase, assert_seats_counted, create_cohort, live_allotments
+
+
+class WaitlistTests(AllocationTestCase):
+    """Full batches keep their waitlists and released seats are refilled from them"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.batches, cls.students = create_cohort(
+            {'ALG': ('DSC', 1, 1), 'BIO': ('DSC', 1, 1), 'CHE': ('DSC', 2, 1)},
+            {'S01': 900, 'S02': 800, 'S03': 700, 'S04': 600},
+            {
+                ('S01', 2): ['ALG'], ('S02', 2): ['ALG', 'BIO'],
+                ('S03', 2): ['BIO', 'CHE'], ('S04', 2): ['ALG', 'CHE'],
+            }
+        )
+
+    def waitlist(self):
+        return list(BatchWaitlist.objects.order_by('position').values_list(
+            'student__admission_number', 'batch__course__course_code', 'preference_rank'
+        ))
+
+    def test_full_batches_waitlist_students_in_allocation_order(self):
+        allocate_courses(1, ACADEMIC_YEAR)
+        self.assertEqual(live_allotments(), {
+            ('S01', 2): ('ALG', 1), ('S02', 2): ('BIO', 1), ('S03', 2): ('CHE', 1), ('S04', 2): ('CHE', 1),
+        })
+        self.assertEqual(self.waitlist(), [('S02', 'ALG', 1), ('S03', 'BIO', 1), ('S04', 'ALG', 1)])
+
+    def test_withdrawal_promotes_along_the_chain_of_moves(self):
+        allocate_courses(1, ACADEMIC_YEAR)
+        # S02 moves up to ALG, and the BIO seat S02 leaves goes to S03
+        self.assertEqual(withdraw_student(self.students['S01']), 2)
+        self.assertEqual(live_allotments(), {
+            ('S02', 2): ('ALG', 1), ('S03', 2): ('BIO', 1), ('S04', 2): ('CHE', 1),
+        })
+        self.assertEqual(self.waitlist(), [('S04', 'ALG', 1)])
+        assert_seats_counted(self)
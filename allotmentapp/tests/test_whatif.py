@@ -0,0 +1,45 @@
+from django.core.exceptions import ValidationError
+from django.test import TestCase
+
+from allotmentapp.allocation import AllocationSnapshot
+from allotmentapp.models import AllocationRun, CourseAllotment
+from allotmentapp.whatif import evaluate_scenarios
+
+from .base import ACADEMIC_YEAR, create_cohort
+
+
+class WhatIfScenarioTests(TestCase):
+    """Scenarios are scored against one snapshot without writing anything"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.batches, cls.students = create_cohort(
+            {'ALG': ('DSC', 1, 1), 'BIO': ('DSC', 1, 1)},
+            {'S01': 900, 'S02': 800, 'S03': 700},
+            {(admission_number, 2): ['ALG', 'BIO'] for admission_number in ('S01', 'S02', 'S03')}
+        )
+
+    def test_scenarios_are_scored_against_the_current_limits(self):
+        results = evaluate_scenarios(
+            AllocationSnapshot.load(1, ACADEMIC_YEAR),
+            [{'name': "Bigger ALG", 'seat_limits': {'ALG': 3}}]
+        )
+        for result in results:
+            del result['seconds']
+        # Papers 1, 3 and 4 are counted as unallocated for every student
+        self.assertEqual(results, [
+            {
+                'name': 'Current', 'fill_rate': 100.0, 'first_preference_rate': 33.33,
+                'unallocated_students': 3, 'unallocated_papers': 10,
+            },
+            {
+                'name': "Bigger ALG", 'fill_rate': 75.0, 'first_preference_rate': 100.0,
+                'unallocated_students': 3, 'unallocated_papers': 9,
+            },
+        ])
+        self.assertFalse(AllocationRun.objects.exists())
+        self.assertFalse(CourseAllotment.all_runs.exists())
+
+    def test_unknown_course_names_the_scenario(self):
+        with self.assertRaisesMessage(ValidationError, "Scenario 1: Unknown course code 'XYZ'"):
+            evaluate_scenarios(AllocationSnapshot.load(1, ACADEMIC_YEAR), [{'seat_limits': {'XYZ': 5}}])
@@ -34,6 +34,7 @@ urlpatterns = [
     path('view_first_sem_allotments/', views.view_first_sem_allotments, name='view_first_sem_allotments'),
     path('view_second_sem_allotments/', views.view_second_sem_allotments, name='view_second_sem_allotments'),
     path('view_third_sem_allotments/', views.view_third_sem_allotments, name='view_third_sem_allotments'),
+    path('allocate_late_submissions/<int:semester>/', views.allocate_late_submissions, name='allocate_late_submissions'),
 
     path('view-allotment/', views.view_student_allotment, name='view_student_allotment'),
     path('student/profile/', views.student_profile, name='student_profile'),
@@ -60,5 +61,17 @@ urlpatterns = [
     
     path("allotment-results/", views.view_allotment_results, name="view_allotment_results"),
     path("download-filtered-allotments/", views.download_filtered_allotments_csv, name="download_filtered_allotments_csv"),
+    path("download-allotment-changes/", views.download_run_diff_csv, name="download_run_diff_csv"),
+    path("jobs/<int:job_id>/status/", views.job_status, name="job_status"),
+    path("jobs/<int:job_id>/download/", views.download_job_output, name="download_job_output"),
+    path("allocation-events/<int:semester>/", views.allocation_events_stream, name="allocation_events_stream"),
+    path("course-swap/", views.admin_course_swap, name="admin_course_swap"),
+    path("swap-history/", views.swap_history, name="swap_history"),
+    path("course-change/", views.admin_course_change, name="admin_course_change"),
+    path("course-change/select-course/", views.select_new_course, name="select_new_course"),
+    path("course-change/execute/", views.execute_course_change, name="execute_course_change"),
+    path("course-change-history/", views.course_change_history, name="course_change_history"),
+    path("spot-round/", views.admin_spot_round, name="admin_spot_round"),
+    path("student/spot-round/", views.student_spot_round, name="student_spot_round"),
 ]
 
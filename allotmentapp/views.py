@@ -4,24 +4,42 @@ from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
 from django.contrib.auth.forms import AuthenticationForm
 from django.contrib.auth.models import User, Group
-from django.http import HttpResponse, JsonResponse
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.utils import timezone
 from django.core.paginator import Paginator
 from django.core.exceptions import ValidationError
 from django.db import transaction
 from django.contrib.auth import update_session_auth_hash
 from django.contrib.auth.forms import PasswordChangeForm
-from django.db.models import F, Max, Count
+from django.db.models import F, Max, Count, Sum, Q, Exists, OuterRef
 from .decorators import group_required
+from .allocation import simulate_allocation
+from .incremental import allocate_late_students, is_in_live_run
+from .waitlist import withdraw_student
+from .runs import get_active_run
+from .diffs import AllotmentDiff, get_published_runs, get_run_allotments, iter_diff_rows
+from .events import END_EVENTS, SSE_KEEPALIVE_SECONDS, allocation_events, get_event_topic
+from .imports import REQUIRED_COLUMNS
+from .jobqueue import enqueue_job, get_job_output_path
+from .streaming import iter_allotment_csv_rows, iter_allotment_data, iter_keyset
+from .swaps import resolve_swap_requests
+from .course_changes import process_course_change_requests
+from .spot import claim_spot_seat, get_open_spot_round, get_spot_options, set_spot_round_open
+import asyncio
 import csv
+import json
 from datetime import date, datetime
 from .models import (
     Student, Course, CoursePreference, Batch, CourseAllotment, 
-    Department, Pathway, HOD,AllocationSettings
+    Department, Pathway, HOD,AllocationSettings, AllocationRun, BatchCutoff, BackgroundJob,
+    SwapRequest, SwapHistory, CourseChangeRequest, CourseChangeHistory, SpotRound, SpotClaim
 )
 from .forms import (
     StudentForm, CourseFilterForm, CourseSelectionFormSem1, CourseSelectionFormSem2, CourseSelectionFormSem3,
     CourseForm, BatchForm, BatchFilterForm, BulkStudentUploadForm, 
-    StudentRegistrationForm, StudentEditForm, HODEditForm, HODForm,StudentAllotmentFilterForm,AllocationSettingsForm
+    StudentRegistrationForm, StudentEditForm, HODEditForm, HODForm,StudentAllotmentFilterForm,AllocationSettingsForm,
+    SwapRequestForm
 )
 
 def Admin_group_required(user):
@@ -36,182 +54,6 @@ def hod_group_required(user):
     """Check if the user belongs to the 'Admin' group."""
     return user.groups.filter(name='hod').exists()
 
-@transaction.atomic
-def allocate_courses(semester, academic_year):
-    """Allocate courses for students in the given semester and academic year"""
-    start_year = int(academic_year.split('-')[0])
-    target_admission_year = start_year - (semester - 1) // 2
-
-    # 1. Clear existing allocations
-    CourseAllotment.objects.filter(
-        student__admission_year=target_admission_year,
-        batch__course__semester=semester,
-        batch__year=academic_year
-    ).delete()
-
-    # 2. Reset seats
-    Batch.objects.filter(
-        course__semester=semester, 
-        year=academic_year
-    ).update(seats_taken=0)
-
-    # 3. Filter students
-    target_students = Student.objects.filter(
-        current_sem=semester,
-        admission_year=target_admission_year
-    )
-
-    # Performance sorting configuration
-    if semester in [1, 2]:
-        sort_field = '-normalized_marks'
-    else: # Semester 3
-        sort_field = F('first_sem_marks').desc(nulls_last=True)
-
-    # 4. Phase-based Allocation
-    if semester in [1, 2]:
-        # Paper 1 (Direct/Core)
-        for student in target_students.order_by('admission_number'):
-            allocate_paper(student, paper_no=1)
-
-        # Paper 2 & 3 (Marks-based)
-        for paper_no in [2, 3]:
-            for student in target_students.order_by(sort_field, 'admission_number'):
-                allocate_paper(student, paper_no=paper_no)
-
-        # Paper 4 (MDC - Quota)
-        allocate_quota_paper(semester, target_students, 4, academic_year, sort_field)
-
-    elif semester == 3:
-        # Paper 1 & 2 (Majors - Direct)
-        for paper_no in [1, 2]:
-            for student in target_students.order_by('admission_number'):
-                allocate_paper(student, paper_no=paper_no)
-
-        # Paper 3 & 4 (Minors - Marks-based)
-        for paper_no in [3, 4]:
-            for student in target_students.order_by(sort_field, 'admission_number'):
-                allocate_paper(student, paper_no=paper_no)
-
-        # Paper 5 (MDC - Quota)
-        allocate_quota_paper(semester, target_students, 5, academic_year, sort_field)
-
-        # Paper 6 (VAC - Quota)
-        allocate_quota_paper(semester, target_students, 6, academic_year, sort_field)
-
-def allocate_quota_paper(semester, students, paper_no, academic_year, sort_field):
-    """Helper to handle quota-based allotment for MDC/VAC"""
-    for setting in AllocationSettings.objects.all():
-        dept_students = students.filter(department=setting.department).order_by(sort_field, 'admission_number')
-        
-        quota_categories = [
-            ("General", setting.calculate_general_quota()),
-            (["SC", "ST"], setting.calculate_sc_st_quota()),
-            (["EWS", "Sports", "Management"], setting.calculate_other_quota())
-        ]
-        
-        for categories, quota in quota_categories:
-            if quota > 0:
-                quota_students = dept_students.filter(
-                    admission_category__in=categories if isinstance(categories, list) else categories
-                )[:quota]
-                
-                for student in quota_students:
-                    allocate_paper(student, paper_no=paper_no)
-
-    # Second pass for remaining students
-    remaining = students.exclude(
-        id__in=CourseAllotment.objects.filter(
-            paper_no=paper_no, 
-            batch__course__semester=semester,
-            batch__year=academic_year
-        ).values('student')
-    ).order_by(sort_field, 'admission_number')
-    
-    for student in remaining:
-        allocate_paper(student, paper_no=paper_no, allow_any_available=True)
-
-def allocate_paper(student, paper_no, allow_any_available=False):
-    """
-    Allocate a specific paper for a student
-    :param student: Student object
-    :param paper_no: Paper number (1-6)
-    :param allow_any_available: If True, can allocate any available course of the correct type
-    """
-    # Check if already allocated this paper for this semester
-    if CourseAllotment.objects.filter(
-        student=student, 
-        paper_no=paper_no, 
-        batch__course__semester=student.current_sem
-    ).exists():
-        return True
-    
-    # Get student's preferences for this paper
-    preferences = CoursePreference.objects.filter(
-        student=student, 
-        paper_no=paper_no
-    ).order_by('preference_number')
-    
-    # Get already allotted batches for this student in the current semester to avoid duplicates
-    allotted_batch_ids = list(CourseAllotment.objects.filter(
-        student=student,
-        batch__course__semester=student.current_sem
-    ).values_list('batch_id', flat=True))
-    
-    # Try preferences first
-    for preference in preferences:
-        batch = preference.batch
-        if (batch.status and 
-            batch.course.seat_limit > batch.seats_taken and 
-            batch.id not in allotted_batch_ids):
-            
-            with transaction.atomic():
-                CourseAllotment.objects.create(
-                    student=student, 
-                    batch=batch, 
-                    paper_no=paper_no
-                )
-                # Update seats taken atomically
-                Batch.objects.filter(pk=batch.pk).update(
-                    seats_taken=F('seats_taken') + 1
-                )
-            return True
-    
-    # Fallback allocation (for MDC/VAC if preferences are full)
-    if allow_any_available:
-        # Determine course type based on paper_no and semester
-        sem = student.current_sem
-        course_type_prefix = ''
-        if (sem in [1, 2] and paper_no == 4) or (sem == 3 and paper_no == 5):
-            course_type_prefix = 'MDC'
-        elif sem == 3 and paper_no == 6:
-            course_type_prefix = 'VAC'
-            
-        if course_type_prefix:
-            available_batches = Batch.objects.filter(
-                course__course_type__name__startswith=course_type_prefix,
-                course__semester=sem,
-                status=True,
-                course__seat_limit__gt=F('seats_taken')
-            ).exclude(
-                id__in=allotted_batch_ids
-            ).order_by('seats_taken', 'id')
-            
-            if available_batches.exists():
-                batch = available_batches.first()
-                with transaction.atomic():
-                    CourseAllotment.objects.create(
-                        student=student,
-                        batch=batch,
-                        paper_no=paper_no
-                    )
-                    Batch.objects.filter(pk=batch.pk).update(
-                        seats_taken=F('seats_taken') + 1
-                    )
-                return True
-    
-    return False
-
-    
 def index(request):
     return render(request, 'registration/login.html')
 
@@ -419,11 +261,10 @@ def course_selection(request):
         batch__course__semester=student.current_sem
     ).exists()
 
-    # Check if the semester has been allotted globally for the student's admission year
-    semester_allotted = CourseAllotment.objects.filter(
-        student__admission_year=student.admission_year,
-        batch__course__semester=student.current_sem
-    ).exists()
+    # The semester is closed to students the live run allocated, placed or
+    # not; anyone else can still submit and is inserted later with
+    # allocate_late_students
+    semester_allotted = is_in_live_run(student, get_current_academic_year())
 
     if existing_preferences or already_allocated or semester_allotted:
         return render(request, 'student/course_selection.html', {
@@ -526,13 +367,7 @@ def edit_preferences(request):
         batch__course__semester=student.current_sem
     ).exists()
 
-    # Check if the semester has been allotted globally for the student's admission year
-    semester_allotted = CourseAllotment.objects.filter(
-        student__admission_year=student.admission_year,
-        batch__course__semester=student.current_sem
-    ).exists()
-
-    if already_allocated or semester_allotted:
+    if already_allocated or is_in_live_run(student, get_current_academic_year()):
         return redirect('view_student_allotment')
 
     # Fetch existing preferences for the student's current semester
@@ -889,6 +724,66 @@ def get_current_academic_year():
 #     }
     
 #     return render(request, 'admin/first_sem_allotment.html', context)
+STUDENTS_PER_PAGE = 100
+
+def get_cohort_preference_overview(request, semester, admission_year):
+    """
+    Preference statistics of a cohort from aggregate queries, plus one page of
+    its students with their preferences prefetched, for the allotment pages.
+    """
+    students = Student.objects.filter(
+        current_sem=semester,
+        admission_year=admission_year
+    ).annotate(
+        has_preferences=Exists(CoursePreference.objects.filter(student=OuterRef('pk')))
+    )
+
+    total_students = students.count()
+    students_missing_preferences = students.filter(
+        has_preferences=False
+    ).select_related('department', 'pathway').order_by('admission_number')
+    students_without_preferences = students_missing_preferences.count()
+
+    # Get unique paper numbers and their maximum preferences for this cohort
+    paper_options = {}
+    for paper_no, pref_no in CoursePreference.objects.filter(
+        student__current_sem=semester,
+        student__admission_year=admission_year
+    ).values_list('paper_no', 'preference_number').distinct().order_by('paper_no', 'preference_number'):
+        paper_options.setdefault(paper_no, []).append(pref_no)
+
+    def group_stats(field):
+        return [
+            {
+                'name': row[field],
+                'total': row['total'],
+                'complete': row['complete'],
+                'pending': row['total'] - row['complete'],
+            }
+            for row in students.order_by().values(field).annotate(
+                total=Count('id'),
+                complete=Count('id', filter=Q(has_preferences=True))
+            )
+        ]
+
+    students_page = Paginator(
+        students.select_related('department', 'pathway').prefetch_related(
+            'coursepreference_set__batch__course'
+        ).order_by('admission_number'),
+        STUDENTS_PER_PAGE
+    ).get_page(request.GET.get('page'))
+
+    return {
+        'students': students_page,
+        'paper_options': paper_options,
+        'total_students': total_students,
+        'students_with_preferences': total_students - students_without_preferences,
+        'students_without_preferences': students_without_preferences,
+        'students_missing_preferences': students_missing_preferences,
+        'department_stats': group_stats('department__name'),
+        'pathway_stats': group_stats('pathway__name'),
+    }
+
 @group_required('Admin')
 def first_sem_allotment(request):
     current_academic_year = get_current_academic_year()
@@ -903,165 +798,91 @@ def first_sem_allotment(request):
         messages.warning(request, "Courses are already allocated for the first semester in the current academic year!")
         return render(request, 'admin/first_sem_allotment.html', {'already_allocated': True})
 
-    # Get all first-semester students for the current cohort
-    students = Student.objects.filter(
-        current_sem=1,
-        admission_year=start_year
-    ).prefetch_related(
-        'coursepreference_set',
-        'coursepreference_set__batch',
-        'coursepreference_set__batch__course'
-    ).order_by('admission_number')
-
-    # Calculate student statistics
-    total_students = students.count()
-    
-    # Identify students who haven't submitted preferences
-    students_without_preferences_list = [
-        student for student in students
-        if not student.coursepreference_set.exists()
-    ]
-    
-    students_without_preferences = len(students_without_preferences_list)
-    students_with_preferences = total_students - students_without_preferences
-    
-    # Get unique paper numbers and their maximum preferences for this cohort
-    paper_preferences = CoursePreference.objects.filter(
-        student__current_sem=1,
-        student__admission_year=start_year
-    ).values('paper_no', 'preference_number').distinct().order_by('paper_no', 'preference_number')
-
-    # Structure paper-preference combinations
-    paper_options = {}
-    for pref in paper_preferences:
-        paper_no = pref['paper_no']
-        pref_no = pref['preference_number']
-        if paper_no not in paper_options:
-            paper_options[paper_no] = []
-        paper_options[paper_no].append(pref_no)
-
-    # Calculate department-wise statistics
-    department_stats = []
-    departments = set(student.department for student in students)
-    for dept in departments:
-        dept_students = [s for s in students if s.department == dept]
-        dept_total = len(dept_students)
-        dept_complete = len([s for s in dept_students if s.coursepreference_set.exists()])
-        dept_pending = dept_total - dept_complete
-        department_stats.append({
-            'name': dept.name,
-            'total': dept_total,
-            'complete': dept_complete,
-            'pending': dept_pending
-        })
-
-    # Calculate pathway-wise statistics
-    pathway_stats = []
-    pathways = set(student.pathway for student in students if student.pathway)
-    for pathway in pathways:
-        pathway_students = [s for s in students if s.pathway == pathway]
-        pathway_total = len(pathway_students)
-        pathway_complete = len([s for s in pathway_students if s.coursepreference_set.exists()])
-        pathway_pending = pathway_total - pathway_complete
-        pathway_stats.append({
-            'name': pathway,
-            'total': pathway_total,
-            'complete': pathway_complete,
-            'pending': pathway_pending
-        })
+    # Statistics come from aggregate queries; only one page of students is loaded
+    overview = get_cohort_preference_overview(request, semester=1, admission_year=start_year)
+    total_students = overview['total_students']
+    students_without_preferences = overview['students_without_preferences']
 
-    if request.method == 'POST':
+    # Preview the allotment without writing anything
+    simulation = None
+    if request.method == 'POST' and request.POST.get('action') == 'simulate':
+        simulation = simulate_allocation(semester=1, academic_year=current_academic_year)
+    elif request.method == 'POST':
         if total_students == 0:
             messages.error(request, "No students found for allotment in the current cohort.")
         elif students_without_preferences:
-            missing_students = ", ".join(str(student.admission_number) for student in students_without_preferences_list)
+            missing_students = ", ".join(overview['students_missing_preferences'].values_list('admission_number', flat=True))
             messages.error(request, f"The following students have not submitted their preferences: {missing_students}. Please ask them to submit before proceeding.")
         else:
-            try:
-                allocate_courses(semester=1, academic_year=current_academic_year)
-                messages.success(request, "First semester course allotment completed successfully! Redirecting to view allotments...")
-                # Delete all preferences for the semester as per previous logic
-                CoursePreference.objects.filter(student__current_sem=1).delete()
-                return redirect('view_first_sem_allotments')
-            except Exception as e:
-                messages.error(request, f"An error occurred during allotment: {e}")
+            # The job worker runs the allotment; the page polls its progress
+            job = enqueue_job(BackgroundJob.ALLOCATE, semester=1, academic_year=current_academic_year)
+            messages.info(request, "First semester course allotment has been queued.")
+            return redirect(f"{reverse('first_sem_allotment')}?job={job.pk}")
 
     context = {
         'page_name': 'First Semester Allotment',
-        'students': students,
-        'paper_options': paper_options,
-        'students_without_preferences': students_without_preferences,
-        'total_students': total_students,
-        'students_with_preferences': students_with_preferences,
-        'students_missing_preferences': students_without_preferences_list,
-        'department_stats': department_stats,
-        'pathway_stats': pathway_stats,
+        **overview,
+        'simulation': simulation,
     }
 
     return render(request, 'admin/first_sem_allotment.html', context)
 
 
-@group_required('Admin')
-def download_preferences_csv_first_sem(request):
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="first_sem_preferences.csv"'
-    writer = csv.writer(response)
-    
+class Echo:
+    """Pseudo-buffer whose write() hands each CSV line back to the generator"""
+    def write(self, value):
+        return value
+
+def stream_preferences_csv(semester, filename, marks_field, marks_header):
+    """
+    Stream a semester's preference sheet as CSV, reading students in keyset
+    chunks so memory stays flat however large the cohort is.
+    """
     # Get all paper-preference combinations
-    paper_preferences = CoursePreference.objects.filter(
-        student__current_sem=1
-    ).values('paper_no', 'preference_number').distinct().order_by('paper_no', 'preference_number')
-    
-    # Create headers
-    headers = [
-        'Admission Number',
-        'Student Name',
-        'Department',
-        'Pathway',
-        'Category',
-        'Normalized Marks'
-    ]
-    
-    # Add dynamic headers for each paper-preference combination
-    for pref in paper_preferences:
-        headers.append(f'Paper {pref["paper_no"]} Option {pref["preference_number"]}')
-    
-    writer.writerow(headers)
-    
-    students = Student.objects.filter(
-        current_sem=1
-    ).prefetch_related(
-        'coursepreference_set',
-        'coursepreference_set__batch',
-        'coursepreference_set__batch__course'
-    ).order_by('admission_number')
-    
-    for student in students:
-        row = [
-            student.admission_number,
-            student.name,
-            student.department.name,
-            student.pathway,
-            student.admission_category,
-            student.normalized_marks,
-        ]
-        
-        # Add preferences for each paper-preference combination
-        for pref in paper_preferences:
-            course_pref = student.coursepreference_set.filter(
-                paper_no=pref['paper_no'],
-                preference_number=pref['preference_number']
-            ).first()
-            
-            if course_pref:
-                row.append(course_pref.batch.course.course_name)
-            else:
-                row.append('-')
-        
-        writer.writerow(row)
-    
+    paper_preferences = list(CoursePreference.objects.filter(
+        student__current_sem=semester
+    ).values_list('paper_no', 'preference_number').distinct().order_by('paper_no', 'preference_number'))
+
+    headers = ['Admission Number', 'Student Name', 'Department', 'Pathway', 'Category', marks_header]
+    for paper_no, pref_no in paper_preferences:
+        headers.append(f'Paper {paper_no} Option {pref_no}')
+
+    writer = csv.writer(Echo())
+    students = Student.objects.filter(current_sem=semester).select_related('department', 'pathway')
+
+    def rows():
+        yield writer.writerow(headers)
+        for chunk in iter_keyset(students, key='admission_number'):
+            chosen = {
+                (student_id, paper_no, pref_no): course_name
+                for student_id, paper_no, pref_no, course_name in CoursePreference.objects.filter(
+                    student__current_sem=semester,
+                    student__admission_number__gte=chunk[0].admission_number,
+                    student__admission_number__lte=chunk[-1].admission_number
+                ).values_list('student_id', 'paper_no', 'preference_number', 'batch__course__course_name')
+            }
+            for student in chunk:
+                row = [
+                    student.admission_number,
+                    student.name,
+                    student.department.name,
+                    student.pathway,
+                    student.admission_category,
+                    getattr(student, marks_field),
+                ]
+                # Add preferences for each paper-preference combination
+                for paper_no, pref_no in paper_preferences:
+                    row.append(chosen.get((student.id, paper_no, pref_no), '-'))
+                yield writer.writerow(row)
+
+    response = StreamingHttpResponse(rows(), content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
     return response
 
+@group_required('Admin')
+def download_preferences_csv_first_sem(request):
+    return stream_preferences_csv(1, 'first_sem_preferences.csv', 'normalized_marks', 'Normalized Marks')
+
 @group_required('Admin')
 def second_sem_allotment(request):
     current_academic_year = get_current_academic_year()
@@ -1078,97 +899,28 @@ def second_sem_allotment(request):
         messages.warning(request, "Courses are already allocated for the second semester in the current academic year!")
         return render(request, 'admin/second_sem_allotment.html', {'already_allocated': True})
 
-    # Get all second-semester students for the current cohort
-    students = Student.objects.filter(
-        current_sem=2,
-        admission_year=target_admission_year
-    ).prefetch_related(
-        'coursepreference_set',
-        'coursepreference_set__batch',
-        'coursepreference_set__batch__course'
-    ).order_by('admission_number')
-
-    # Calculate student statistics
-    total_students = students.count()
-    
-    # Identify students who haven't submitted preferences
-    students_without_preferences_list = [
-        student for student in students
-        if not student.coursepreference_set.exists()
-    ]
-    
-    students_without_preferences = len(students_without_preferences_list)
-    students_with_preferences = total_students - students_without_preferences
-    
-    # Get unique paper numbers and their maximum preferences for this cohort
-    paper_preferences = CoursePreference.objects.filter(
-        student__current_sem=2,
-        student__admission_year=target_admission_year
-    ).values('paper_no', 'preference_number').distinct().order_by('paper_no', 'preference_number')
-
-    # Structure paper-preference combinations
-    paper_options = {}
-    for pref in paper_preferences:
-        paper_no = pref['paper_no']
-        pref_no = pref['preference_number']
-        if paper_no not in paper_options:
-            paper_options[paper_no] = []
-        paper_options[paper_no].append(pref_no)
-
-    # Calculate department-wise statistics
-    department_stats = []
-    departments = set(student.department for student in students)
-    for dept in departments:
-        dept_students = [s for s in students if s.department == dept]
-        dept_total = len(dept_students)
-        dept_complete = len([s for s in dept_students if s.coursepreference_set.exists()])
-        dept_pending = dept_total - dept_complete
-        department_stats.append({
-            'name': dept.name,
-            'total': dept_total,
-            'complete': dept_complete,
-            'pending': dept_pending
-        })
+    # Statistics come from aggregate queries; only one page of students is loaded
+    overview = get_cohort_preference_overview(request, semester=2, admission_year=target_admission_year)
+    students_without_preferences = overview['students_without_preferences']
 
-    # Calculate pathway-wise statistics
-    pathway_stats = []
-    pathways = set(student.pathway for student in students if student.pathway)
-    for pathway in pathways:
-        pathway_students = [s for s in students if s.pathway == pathway]
-        pathway_total = len(pathway_students)
-        pathway_complete = len([s for s in pathway_students if s.coursepreference_set.exists()])
-        pathway_pending = pathway_total - pathway_complete
-        pathway_stats.append({
-            'name': pathway,
-            'total': pathway_total,
-            'complete': pathway_complete,
-            'pending': pathway_pending
-        })
-
-    if request.method == 'POST':
+    # Preview the allotment without writing anything
+    simulation = None
+    if request.method == 'POST' and request.POST.get('action') == 'simulate':
+        simulation = simulate_allocation(semester=2, academic_year=current_academic_year)
+    elif request.method == 'POST':
         if students_without_preferences:
-            missing_students = ", ".join(str(student.admission_number) for student in students_without_preferences_list)
+            missing_students = ", ".join(overview['students_missing_preferences'].values_list('admission_number', flat=True))
             messages.error(request, f"The following students have not submitted their preferences: {missing_students}. Please ask them to submit before proceeding.")
         else:
-            try:
-                allocate_courses(semester=2, academic_year=current_academic_year)
-                messages.success(request, "Second semester course allotment completed successfully! Redirecting to view allotments...")
-                # Delete all preferences for the semester as per previous logic
-                CoursePreference.objects.filter(student__current_sem=2).delete()
-                return redirect('view_second_sem_allotments')
-            except Exception as e:
-                messages.error(request, f"An error occurred during allotment: {e}")
+            # The job worker runs the allotment; the page polls its progress
+            job = enqueue_job(BackgroundJob.ALLOCATE, semester=2, academic_year=current_academic_year)
+            messages.info(request, "Second semester course allotment has been queued.")
+            return redirect(f"{reverse('second_sem_allotment')}?job={job.pk}")
 
     context = {
         'page_name': 'Second Semester Allotment',
-        'students': students,
-        'paper_options': paper_options,
-        'students_without_preferences': students_without_preferences,
-        'total_students': total_students,
-        'students_with_preferences': students_with_preferences,
-        'students_missing_preferences': students_without_preferences_list,
-        'department_stats': department_stats,
-        'pathway_stats': pathway_stats,
+        **overview,
+        'simulation': simulation,
     }
 
     return render(request, 'admin/second_sem_allotment.html', context)
@@ -1189,280 +941,143 @@ def third_sem_allotment(request):
         messages.warning(request, "Courses are already allocated for the third semester!")
         return render(request, 'admin/third_sem_allotment.html', {'already_allocated': True})
 
-    # Get all third-semester students
-    students = Student.objects.filter(
-        current_sem=3,
-        admission_year=target_admission_year
-    ).prefetch_related(
-        'coursepreference_set',
-        'coursepreference_set__batch',
-        'coursepreference_set__batch__course'
-    ).order_by('admission_number')
+    # Statistics come from aggregate queries; only one page of students is loaded
+    overview = get_cohort_preference_overview(request, semester=3, admission_year=target_admission_year)
+    total_students = overview['total_students']
+    students_without_preferences = overview['students_without_preferences']
 
-    total_students = students.count()
-    students_without_preferences_list = [s for s in students if not s.coursepreference_set.exists()]
-    students_without_preferences = len(students_without_preferences_list)
-    students_with_preferences = total_students - students_without_preferences
-    
-    paper_preferences = CoursePreference.objects.filter(
-        student__current_sem=3,
-        student__admission_year=target_admission_year
-    ).values('paper_no', 'preference_number').distinct().order_by('paper_no', 'preference_number')
-
-    paper_options = {}
-    for pref in paper_preferences:
-        paper_no, pref_no = pref['paper_no'], pref['preference_number']
-        if paper_no not in paper_options: paper_options[paper_no] = []
-        paper_options[paper_no].append(pref_no)
-
-    # Calculate department-wise statistics
-    department_stats = []
-    departments = set(student.department for student in students)
-    for dept in departments:
-        dept_students = [s for s in students if s.department == dept]
-        dept_total = len(dept_students)
-        dept_complete = len([s for s in dept_students if s.coursepreference_set.exists()])
-        dept_pending = dept_total - dept_complete
-        department_stats.append({
-            'name': dept.name,
-            'total': dept_total,
-            'complete': dept_complete,
-            'pending': dept_pending
-        })
-
-    # Calculate pathway-wise statistics
-    pathway_stats = []
-    pathways = set(student.pathway for student in students if student.pathway)
-    for pathway in pathways:
-        pathway_students = [s for s in students if s.pathway == pathway]
-        pathway_total = len(pathway_students)
-        pathway_complete = len([s for s in pathway_students if s.coursepreference_set.exists()])
-        pathway_pending = pathway_total - pathway_complete
-        pathway_stats.append({
-            'name': pathway,
-            'total': pathway_total,
-            'complete': pathway_complete,
-            'pending': pathway_pending
-        })
-
-    if request.method == 'POST':
+    # Preview the allotment without writing anything
+    simulation = None
+    if request.method == 'POST' and request.POST.get('action') == 'simulate':
+        simulation = simulate_allocation(semester=3, academic_year=current_academic_year)
+    elif request.method == 'POST':
         if total_students == 0:
             messages.error(request, "No students found for allotment in the current cohort.")
         elif students_without_preferences:
-            missing = ", ".join(str(s.admission_number) for s in students_without_preferences_list)
+            missing = ", ".join(overview['students_missing_preferences'].values_list('admission_number', flat=True))
             messages.error(request, f"Missing preferences: {missing}")
         else:
-            try:
-                allocate_courses(semester=3, academic_year=current_academic_year)
-                messages.success(request, "Third semester allotment successful!")
-                CoursePreference.objects.filter(student__current_sem=3).delete()
-                return redirect('view_third_sem_allotments')
-            except Exception as e:
-                messages.error(request, f"Error: {e}")
+            # The job worker runs the allotment; the page polls its progress
+            job = enqueue_job(BackgroundJob.ALLOCATE, semester=3, academic_year=current_academic_year)
+            messages.info(request, "Third semester course allotment has been queued.")
+            return redirect(f"{reverse('third_sem_allotment')}?job={job.pk}")
 
     return render(request, 'admin/third_sem_allotment.html', {
         'page_name': 'Third Semester Allotment',
-        'students': students,
-        'paper_options': paper_options,
-        'total_students': total_students,
-        'students_with_preferences': students_with_preferences,
-        'students_without_preferences': students_without_preferences,
-        'students_missing_preferences': students_without_preferences_list,
-        'department_stats': department_stats,
-        'pathway_stats': pathway_stats,
+        **overview,
+        'simulation': simulation,
     })
 
 @group_required('Admin')
 def view_third_sem_allotments(request):
     if "download" in request.GET:
         return download_allotments_csv(request, semester=3)
+    if "export" in request.GET:
+        return queue_allotment_export(request, semester=3)
 
     return render(request, 'admin/view_allotments.html', {
         'allotment_data': get_allotment_data(semester=3),
         'page_name': 'Third Semester Allotments',
-        'semester': 3
+        'semester': 3,
+        **get_run_profiles(semester=3),
     })
 
 @group_required('Admin')
 def download_preferences_csv_third_sem(request):
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="third_sem_preferences.csv"'
-    writer = csv.writer(response)
-    
-    paper_preferences = CoursePreference.objects.filter(
-        student__current_sem=3
-    ).values('paper_no', 'preference_number').distinct().order_by('paper_no', 'preference_number')
-    
-    headers = ['Admission Number', 'Student Name', 'Department', 'Pathway', 'Category', 'First Sem Marks']
-    for pref in paper_preferences:
-        headers.append(f'Paper {pref["paper_no"]} Option {pref["preference_number"]}')
-    writer.writerow(headers)
-    
-    students = Student.objects.filter(current_sem=3).prefetch_related('coursepreference_set', 'coursepreference_set__batch__course').order_by('admission_number')
-    for student in students:
-        row = [student.admission_number, student.name, student.department.name, student.pathway, student.admission_category, student.first_sem_marks]
-        for pref in paper_preferences:
-            cp = student.coursepreference_set.filter(paper_no=pref['paper_no'], preference_number=pref['preference_number']).first()
-            row.append(cp.batch.course.course_name if cp else '-')
-        writer.writerow(row)
-    return response
+    return stream_preferences_csv(3, 'third_sem_preferences.csv', 'first_sem_marks', 'First Sem Marks')
 
 @group_required('Admin')
 def download_preferences_csv_second_sem(request):
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="Second_sem_preferences.csv"'
-    writer = csv.writer(response)
-    
-    # Get all paper-preference combinations
-    paper_preferences = CoursePreference.objects.filter(
-        student__current_sem=2
-    ).values('paper_no', 'preference_number').distinct().order_by('paper_no', 'preference_number')
-    
-    # Create headers
-    headers = [
-        'Admission Number',
-        'Student Name',
-        'Department',
-        'Pathway',
-        'Category',
-        'Normalized Marks'
-    ]
-    
-    # Add dynamic headers for each paper-preference combination
-    for pref in paper_preferences:
-        headers.append(f'Paper {pref["paper_no"]} Option {pref["preference_number"]}')
-    
-    writer.writerow(headers)
-    
-    students = Student.objects.filter(
-        current_sem=2
-    ).prefetch_related(
-        'coursepreference_set',
-        'coursepreference_set__batch',
-        'coursepreference_set__batch__course'
-    ).order_by('admission_number')
-    
-    for student in students:
-        row = [
-            student.admission_number,
-            student.name,
-            student.department.name,
-            student.pathway,
-            student.admission_category,
-            student.normalized_marks,
-        ]
-        
-        # Add preferences for each paper-preference combination
-        for pref in paper_preferences:
-            course_pref = student.coursepreference_set.filter(
-                paper_no=pref['paper_no'],
-                preference_number=pref['preference_number']
-            ).first()
-            
-            if course_pref:
-                row.append(course_pref.batch.course.course_name)
-            else:
-                row.append('-')
-        
-        writer.writerow(row)
-    
-    return response
+    return stream_preferences_csv(2, 'Second_sem_preferences.csv', 'normalized_marks', 'Normalized Marks')
 
 
 @group_required('Admin')
 def download_allotments_csv(request, semester):
-    allotments = get_allotment_data(semester)
-
-    response = HttpResponse(content_type='text/csv')
+    writer = csv.writer(Echo())
+    response = StreamingHttpResponse(
+        (writer.writerow(row) for row in iter_allotment_csv_rows(semester)), content_type='text/csv'
+    )
     response['Content-Disposition'] = f'attachment; filename="semester_{semester}_allotments.csv"'
-
-    writer = csv.writer(response)
-
-    # Define paper names based on semester
-    if semester == 1:
-        paper_headers = ["Paper 1 (DSC 1)", "Paper 2 (DSC 2)", "Paper 3 (DSC 3)", "Paper 4 (MDC)"]
-    elif semester == 2:
-        paper_headers = ["Paper 1 (DSC 4)", "Paper 2 (DSC 5)", "Paper 3 (DSC 6)", "Paper 4 (MDC)"]
-    elif semester == 3:
-        paper_headers = ["Paper 1 (DSC 7)", "Paper 2 (DSC 8)", "Paper 3 (DSC 9)", "Paper 4 (DSC 10)", "Paper 5 (MDC)", "Paper 6 (VAC)"]
-    else:
-        paper_headers = [f"Paper {i}" for i in range(1, 7)]
-
-    # Write the header row
-    writer.writerow(["Admission Number", "Name", "Department", "Category", "Pathway"] + paper_headers)
-
-    # Write student allotment data
-    for data in allotments:
-        row = [
-            data['admission_number'], data['name'], data['department'],
-            data['admission_category'], data['pathway']
-        ]
-        # Append paper allotments dynamically
-        num_papers = len(paper_headers)
-        for i in range(1, num_papers + 1):
-            row.append(data.get(f'paper{i}', ''))
-        writer.writerow(row)
-
     return response
 
 
 def get_allotment_data(semester, department=None, admission_year=None):
-    allotments = CourseAllotment.objects.filter(batch__course__semester=semester)
-
-    if department:
-        allotments = allotments.filter(student__department=department)
-
-    if admission_year:
-        allotments = allotments.filter(student__admission_year=admission_year)
+    return list(iter_allotment_data(semester, department, admission_year))
+
+def get_run_profiles(semester):
+    """Phase profile of the live run and totals of recent runs for the results page"""
+    academic_year = get_current_academic_year()
+    active_run = get_active_run(semester, academic_year)
+    recent_runs = AllocationRun.objects.filter(semester=semester).annotate(
+        total_seconds=Sum('phases__seconds'),
+        total_queries=Sum('phases__queries'),
+        peak_memory_kb=Max('phases__peak_memory_kb')
+    ).order_by('-created_at')[:10]
+    return {
+        'active_run': active_run,
+        'run_phases': active_run.phases.all() if active_run else [],
+        'recent_runs': recent_runs,
+        'batch_cutoffs': get_batch_cutoffs(active_run),
+    }
 
-    student_allotments = {}
-    for allotment in allotments:
-        student = allotment.student
-        if student not in student_allotments:
-            student_allotments[student] = {}
-
-        paper_no = f'paper{allotment.paper_no}'
-        student_allotments[student][paper_no] = allotment.batch.course.course_name
-
-    allotment_data = []
-    for student, papers in student_allotments.items():
-        data = {
-            'admission_number': student.admission_number,
-            'name': student.name,
-            'department': student.department.name,
-            'admission_category': student.admission_category,
-            'pathway': student.pathway.name if student.pathway else '',
-        }
-        # Add all paper keys
-        for i in range(1, 7):
-            data[f'paper{i}'] = papers.get(f'paper{i}', '')
-        allotment_data.append(data)
 
-    return allotment_data
+def get_batch_cutoffs(run):
+    """Cutoffs a run recorded, read with one indexed lookup on the run"""
+    if run is None:
+        return []
+    return BatchCutoff.all_runs.filter(run=run).select_related('batch__course').order_by(
+        'batch__course__course_name', 'batch__year', 'batch__part', 'paper_no', 'admission_category'
+    )
 
 @group_required('Admin')
 def view_first_sem_allotments(request):
     if "download" in request.GET:  
-        return download_allotments_csv(request, semester=1)  # ✅ Now passing request
+        return download_allotments_csv(request, semester=1)
+    if "export" in request.GET:
+        return queue_allotment_export(request, semester=1)
 
     return render(request, 'admin/view_allotments.html', {
         'allotment_data': get_allotment_data(semester=1),
         'page_name': 'First Semester Allotments',
-        'semester': 1  # Pass semester to template
+        'semester': 1,  # Pass semester to template
+        **get_run_profiles(semester=1),
     })
 
 @group_required('Admin')
 def view_second_sem_allotments(request):
     if "download" in request.GET:  
-        return download_allotments_csv(request, semester=2)  
+        return download_allotments_csv(request, semester=2)
+    if "export" in request.GET:
+        return queue_allotment_export(request, semester=2)  
 
     return render(request, 'admin/view_allotments.html', {
         'allotment_data': get_allotment_data(semester=2),
         'page_name': 'Second Semester Allotments',
-        'semester': 2  # Pass semester to template
+        'semester': 2,  # Pass semester to template
+        **get_run_profiles(semester=2),
     })
 
     
+@group_required('Admin')
+def allocate_late_submissions(request, semester):
+    """Insert preferences submitted after a semester's allotment without re-running it"""
+    view_names = {1: 'view_first_sem_allotments', 2: 'view_second_sem_allotments', 3: 'view_third_sem_allotments'}
+    if semester not in view_names:
+        return render(request, 'error.html', {'message': 'Invalid semester'})
+
+    if request.method == 'POST':
+        try:
+            result = allocate_late_students(semester=semester, academic_year=get_current_academic_year())
+            messages.success(
+                request,
+                f"Checked {len(result['pending_students'])} student(s) with unallotted papers: "
+                f"{result['created']} paper(s) allotted, {result['moved']} seat(s) moved, "
+                f"{result['removed']} seat(s) released."
+            )
+        except Exception as e:
+            messages.error(request, f"An error occurred during late allotment: {e}")
+    return redirect(view_names[semester])
+
 @group_required('Admin')
 def view_allotment_results(request):
     """
@@ -1558,6 +1173,368 @@ def download_filtered_allotments_csv(request):
 
 
 
+@group_required('Admin')
+def download_run_diff_csv(request):
+    """
+    CSV of the seats that changed between a semester's live run and the run
+    it replaced, limited by the same filters as the allotment results.
+    """
+    form = StudentAllotmentFilterForm(request.GET or None)
+    if not form.is_valid() or not form.cleaned_data.get("semester"):
+        messages.error(request, "Select a semester to compare runs.")
+        return redirect('view_allotment_results')
+
+    semester = int(form.cleaned_data["semester"])
+    try:
+        old_run, new_run = get_published_runs(semester, get_current_academic_year())
+    except ValidationError as e:
+        messages.error(request, "; ".join(e.messages))
+        return redirect('view_allotment_results')
+
+    old_allotments = get_run_allotments(old_run)
+    new_allotments = get_run_allotments(new_run)
+    department = form.cleaned_data.get("department")
+    admission_year = form.cleaned_data.get("admission_year")
+    if department:
+        old_allotments = old_allotments.filter(student__department=department)
+        new_allotments = new_allotments.filter(student__department=department)
+    if admission_year:
+        old_allotments = old_allotments.filter(student__admission_year=admission_year)
+        new_allotments = new_allotments.filter(student__admission_year=admission_year)
+
+    writer = csv.writer(Echo())
+    diff = AllotmentDiff(old_allotments, new_allotments)
+    response = StreamingHttpResponse(
+        (writer.writerow(row) for row in iter_diff_rows(diff)), content_type="text/csv"
+    )
+    response["Content-Disposition"] = (
+        f'attachment; filename="allotment_changes_sem{semester}_run{old_run.pk}_run{new_run.pk}.csv"'
+    )
+    return response
+
+
+def queue_allotment_export(request, semester):
+    """Write a semester's allotment sheet to a file in the job worker, for cohorts too large to download directly"""
+    job = enqueue_job(BackgroundJob.EXPORT_ALLOTMENTS, semester=semester)
+    messages.info(request, "The allotment export has been queued; the download link appears when it is ready.")
+    return redirect(f"{request.path}?job={job.pk}")
+
+
+@group_required('Admin')
+def job_status(request, job_id):
+    """Progress of a background job, polled by the admin pages"""
+    job = get_object_or_404(BackgroundJob, pk=job_id)
+    result = job.result or {}
+    data = {
+        'id': job.pk,
+        'kind': job.kind,
+        'status': job.status,
+        'progress': job.progress,
+        'phase': job.phase,
+        'message': result.get('message', ''),
+        'errors': result.get('errors', []),
+        'error': job.error.strip().splitlines()[-1] if job.error else '',
+        'download_url': None,
+    }
+    if job.status == BackgroundJob.DONE and job.kind == BackgroundJob.EXPORT_ALLOTMENTS:
+        data['download_url'] = reverse('download_job_output', args=[job.pk])
+    return JsonResponse(data)
+
+
+@group_required('Admin')
+def download_job_output(request, job_id):
+    job = get_object_or_404(BackgroundJob, pk=job_id, kind=BackgroundJob.EXPORT_ALLOTMENTS, status=BackgroundJob.DONE)
+    try:
+        output = open(get_job_output_path(job), 'rb')
+    except FileNotFoundError:
+        raise Http404("The export file is no longer available")
+    return FileResponse(output, as_attachment=True, filename=job.result['filename'], content_type='text/csv')
+
+
+def get_requested_semester(request):
+    """The semester a page was posted or linked with (1 by default), or None if it is not 1, 2 or 3"""
+    try:
+        semester = int(request.POST.get('semester') or request.GET.get('semester') or 1)
+    except ValueError:
+        return None
+    return semester if semester in (1, 2, 3) else None
+
+
+@group_required('Admin')
+def admin_course_swap(request):
+    """Record batch swap requests and trade all of a semester's pending ones at once"""
+    semester = get_requested_semester(request)
+    if semester is None:
+        return HttpResponseBadRequest("Semester must be 1, 2 or 3")
+    academic_year = get_current_academic_year()
+    form = SwapRequestForm(semester=semester, academic_year=academic_year)
+
+    if request.method == 'POST':
+        action = request.POST.get('action')
+        if action == 'resolve':
+            result = resolve_swap_requests(semester, academic_year, swapped_by=request.user)
+            messages.success(
+                request,
+                f"{result['swapped']} students swapped in {result['cycles']} trade cycles. "
+                f"{result['cancelled']} requests no longer matched their allotment and were cancelled."
+            )
+            return redirect(f"{reverse('admin_course_swap')}?semester={semester}")
+        if action == 'cancel':
+            SwapRequest.objects.filter(pk=request.POST.get('request_id'), status=SwapRequest.PENDING).update(
+                status=SwapRequest.CANCELLED, resolved_at=timezone.now()
+            )
+            messages.info(request, "Swap request cancelled.")
+            return redirect(f"{reverse('admin_course_swap')}?semester={semester}")
+
+        form = SwapRequestForm(request.POST, semester=semester, academic_year=academic_year)
+        if form.is_valid():
+            form.cleaned_data['swap'].save()
+            messages.success(request, "Swap request recorded.")
+            return redirect(f"{reverse('admin_course_swap')}?semester={semester}")
+
+    pending = SwapRequest.objects.filter(
+        status=SwapRequest.PENDING,
+        offered_batch__course__semester=semester,
+        offered_batch__year=academic_year
+    ).select_related('student', 'offered_batch__course', 'wanted_batch__course')
+
+    return render(request, 'admin/course_swap.html', {
+        'form': form,
+        'semester': semester,
+        'pending_requests': pending,
+    })
+
+
+SWAP_HISTORY_LIMIT = 500
+
+@group_required('Admin')
+def swap_history(request):
+    swaps = SwapHistory.objects.select_related(
+        'student', 'old_batch__course', 'new_batch__course', 'swapped_by'
+    )[:SWAP_HISTORY_LIMIT]
+    return render(request, 'admin/swap_history.html', {'swaps': swaps})
+
+
+@group_required('Admin')
+def admin_course_change(request):
+    """Find a student to queue a course change for, and process a semester's queue"""
+    semester = get_requested_semester(request)
+    if semester is None:
+        return HttpResponseBadRequest("Semester must be 1, 2 or 3")
+    academic_year = get_current_academic_year()
+    queue_url = f"{reverse('admin_course_change')}?semester={semester}"
+
+    if request.method == 'POST':
+        action = request.POST.get('action')
+        if action == 'process':
+            result = process_course_change_requests(semester, academic_year, changed_by=request.user)
+            messages.success(
+                request, f"{result['approved']} course changes approved, {result['rejected']} rejected."
+            )
+            return redirect(queue_url)
+        if action == 'cancel':
+            CourseChangeRequest.objects.filter(
+                pk=request.POST.get('request_id'), status=CourseChangeRequest.PENDING
+            ).update(status=CourseChangeRequest.CANCELLED, resolved_at=timezone.now())
+            messages.info(request, "Course change request cancelled.")
+            return redirect(queue_url)
+
+        admission_number = request.POST.get('admission_number', '').strip()
+        student = Student.objects.filter(admission_number=admission_number).first()
+        if student is None:
+            messages.error(request, f"No student with admission number {admission_number}")
+            return redirect(queue_url)
+        current_courses = CourseAllotment.objects.filter(
+            student=student, batch__year=academic_year
+        ).select_related('batch__course').order_by('paper_no')
+        if not current_courses:
+            messages.error(request, f"{student.name} has no allotted courses this academic year")
+            return redirect(queue_url)
+        return render(request, 'admin/select_paper_to_change.html', {
+            'student': student,
+            'current_courses': current_courses,
+        })
+
+    pending = CourseChangeRequest.objects.filter(
+        status=CourseChangeRequest.PENDING,
+        current_batch__course__semester=semester,
+        current_batch__year=academic_year
+    ).select_related('student', 'current_batch__course', 'new_batch__course')
+
+    return render(request, 'admin/initiate_change.html', {
+        'semester': semester,
+        'pending_requests': pending,
+    })
+
+
+@group_required('Admin')
+def select_new_course(request):
+    """List the batches a student's paper can move to"""
+    if request.method != 'POST':
+        return redirect('admin_course_change')
+    current_allotment = get_object_or_404(
+        CourseAllotment.objects.select_related('student', 'batch__course'),
+        student_id=request.POST.get('student_id'),
+        paper_no=request.POST.get('paper_no'),
+        batch__year=get_current_academic_year()
+    )
+    course = current_allotment.batch.course
+    eligible_batches = Batch.objects.filter(
+        course__semester=course.semester,
+        course__course_type=course.course_type,
+        year=current_allotment.batch.year,
+        status=True
+    ).exclude(
+        pk__in=CourseAllotment.objects.filter(student=current_allotment.student).values('batch_id')
+    ).select_related('course').order_by('course__course_code', 'part')
+
+    return render(request, 'admin/select_new_course.html', {
+        'student': current_allotment.student,
+        'current_allotment': current_allotment,
+        'eligible_batches': eligible_batches,
+    })
+
+
+@group_required('Admin')
+def execute_course_change(request):
+    """Queue a course change; seats are checked when the semester's queue is processed"""
+    if request.method != 'POST':
+        return redirect('admin_course_change')
+    allotment = get_object_or_404(
+        CourseAllotment.objects.select_related('student', 'batch__course'),
+        pk=request.POST.get('current_allotment_id'),
+        student_id=request.POST.get('student_id')
+    )
+    semester = allotment.batch.course.semester
+    change = CourseChangeRequest(
+        student=allotment.student,
+        paper_no=allotment.paper_no,
+        current_batch=allotment.batch,
+        new_batch=get_object_or_404(Batch.objects.select_related('course'), pk=request.POST.get('new_batch_id')),
+        reason=request.POST.get('reason', '').strip(),
+        requested_by=request.user
+    )
+    if CourseChangeRequest.objects.filter(
+        student=change.student, paper_no=change.paper_no, status=CourseChangeRequest.PENDING
+    ).exists():
+        messages.error(request, f"{change.student.name} already has a pending change for paper {change.paper_no}")
+        return redirect(f"{reverse('admin_course_change')}?semester={semester}")
+    try:
+        change.clean()
+    except ValidationError as e:
+        messages.error(request, "; ".join(e.messages))
+        return redirect(f"{reverse('admin_course_change')}?semester={semester}")
+
+    change.save()
+    messages.success(request, "Course change queued. It is applied when the queue is processed.")
+    return redirect(f"{reverse('admin_course_change')}?semester={semester}")
+
+
+COURSE_CHANGE_HISTORY_LIMIT = 500
+
+@group_required('Admin')
+def course_change_history(request):
+    changes = CourseChangeHistory.objects.select_related(
+        'student', 'old_batch__course', 'new_batch__course', 'changed_by'
+    )[:COURSE_CHANGE_HISTORY_LIMIT]
+    return render(request, 'admin/course_change_history.html', {'changes': changes})
+
+
+@group_required('Admin')
+def admin_spot_round(request):
+    """Open or close a semester's first-come-first-served spot round and follow its claims"""
+    semester = get_requested_semester(request)
+    if semester is None:
+        return HttpResponseBadRequest("Semester must be 1, 2 or 3")
+    academic_year = get_current_academic_year()
+
+    if request.method == 'POST':
+        is_open = request.POST.get('action') == 'open'
+        set_spot_round_open(semester, academic_year, is_open)
+        messages.success(request, f"Spot round for semester {semester} {'opened' if is_open else 'closed'}.")
+        return redirect(f"{reverse('admin_spot_round')}?semester={semester}")
+
+    spot_round = SpotRound.objects.filter(semester=semester, academic_year=academic_year).first()
+    batches = Batch.objects.filter(
+        course__semester=semester, year=academic_year, status=True
+    ).select_related('course').order_by('course__course_code', 'part')
+    claims = SpotClaim.objects.filter(spot_round=spot_round).select_related(
+        'student', 'batch__course'
+    ).order_by('-claimed_at')[:50] if spot_round else []
+
+    return render(request, 'admin/spot_round.html', {
+        'semester': semester,
+        'spot_round': spot_round,
+        'claim_count': spot_round.claims.count() if spot_round else 0,
+        'batches': batches,
+        'claims': claims,
+    })
+
+
+@group_required('Student')
+def student_spot_round(request):
+    """Claim a leftover seat for a paper while the spot round is open"""
+    try:
+        student = request.user.student
+    except AttributeError:
+        return render(request, 'error.html', {'message': 'Student profile not found'})
+    academic_year = get_current_academic_year()
+    spot_round = get_open_spot_round(student.current_sem, academic_year)
+
+    if request.method == 'POST' and spot_round:
+        try:
+            batch_id = int(request.POST.get('batch_id'))
+            paper_no = int(request.POST.get('paper_no'))
+        except (TypeError, ValueError):
+            messages.error(request, "Choose a course and a paper to claim a seat for.")
+            return redirect('student_spot_round')
+        batch = get_object_or_404(Batch.objects.select_related('course'), pk=batch_id)
+        try:
+            claim_spot_seat(spot_round, student.id, batch, paper_no)
+            messages.success(request, f"You have been allotted {batch.course.course_code} for paper {paper_no}.")
+        except ValidationError as e:
+            messages.error(request, "; ".join(e.messages))
+        return redirect('student_spot_round')
+
+    return render(request, 'student/spot_round.html', {
+        'student': student,
+        'spot_round': spot_round,
+        'options': get_spot_options(student, student.current_sem, academic_year) if spot_round else {},
+    })
+
+
+@group_required('Admin')
+async def allocation_events_stream(request, semester):
+    """
+    Server-sent events of the semester's allocation while it runs in this
+    process: the run starting, each pass, students processed, batches filling
+    and the run finishing. Serve it over ASGI; under WSGI it holds a worker.
+    """
+    topic = get_event_topic(semester, get_current_academic_year())
+
+    async def events():
+        queue = allocation_events.subscribe(topic)
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), SSE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    # Comment line keeping proxies from closing an idle stream
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"event: {event['event']}\ndata: {json.dumps(event)}\n\n"
+                if event['event'] in END_EVENTS:
+                    return
+        finally:
+            allocation_events.unsubscribe(topic, queue)
+
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
 @group_required('Student') 
 def view_student_allotment(request):
     try:
@@ -1665,20 +1642,15 @@ def bulk_student_upload(request):
                 return redirect("bulk_student_upload")
             
             try:
-                decoded_file = csv_file.read().decode("utf-8-sig").splitlines()
-                reader = csv.DictReader(decoded_file)
+                decoded_file = csv_file.read().decode("utf-8-sig")
+                reader = csv.DictReader(decoded_file.splitlines())
                 
                 if not reader.fieldnames:
                     messages.error(request, "The CSV file is empty or improperly formatted.")
                     return redirect("bulk_student_upload")
                 
-                required_fields = [
-                    "Admission Number", "Name", "Date of Birth (DD/MM/YYYY)", 
-                    "Email", "Department", "Pathway"
-                ]
-                
                 # Validate CSV headers
-                missing_fields = [field for field in required_fields 
+                missing_fields = [field for field in REQUIRED_COLUMNS 
                                 if field not in reader.fieldnames]
                 if missing_fields:
                     messages.error(
@@ -1687,144 +1659,10 @@ def bulk_student_upload(request):
                     )
                     return redirect("bulk_student_upload")
                 
-                with transaction.atomic():
-                    student_group = Group.objects.get_or_create(name="Student")[0]
-                    existing_count = 0
-                    success_count = 0
-                    errors = []
-                    
-                    for row_num, row in enumerate(reader, start=2):  # Start at 2 for header row
-                        try:
-                            # Validate required fields
-                            admission_number = row["Admission Number"].strip()
-                            if not admission_number:
-                                raise ValidationError("Admission Number is required")
-                                
-                            if Student.objects.filter(admission_number=admission_number).exists():
-                                existing_count += 1
-                                continue
-                            
-                            # Parse and validate date
-                            dob_str = row["Date of Birth (DD/MM/YYYY)"].strip()
-                            try:
-                                dob = datetime.strptime(dob_str, "%d/%m/%Y").date()
-                                if dob > date.today():
-                                    raise ValidationError("Date of Birth cannot be in the future")
-                            except ValueError:
-                                raise ValidationError("Invalid date format. Use DD/MM/YYYY")
-                            
-                            # Validate email
-                            email = row["Email"].strip().lower()
-                            if not email or "@" not in email:
-                                raise ValidationError("Valid email is required")
-                            if Student.objects.filter(email=email).exists():
-                                raise ValidationError("Email already exists")
-                            
-                            # Validate phone number if provided
-                            phone_number = row.get("Phone Number", "").strip()
-                            if phone_number:
-                                if not phone_number.isdigit() or len(phone_number) != 10:
-                                    raise ValidationError("Phone number must be 10 digits")
-                                if Student.objects.filter(phone_number=phone_number).exists():
-                                    raise ValidationError("Phone number already exists")
-                            
-                            # Validate and get foreign key relationships
-                            department = Department.objects.get(
-                                name__iexact=row["Department"].strip()
-                            )
-                            pathway = Pathway.objects.get(
-                                name__iexact=row["Pathway"].strip()
-                            )
-                            
-                            # Validate admission category
-                            admission_category = row.get("Admission Category", "General").strip()
-                            valid_categories = dict(Student.CATEGORY)
-                            if admission_category not in valid_categories:
-                                raise ValidationError(f"Invalid admission category. Valid options: {', '.join(valid_categories.keys())}")
-                            
-                            # Validate admission year
-                            admission_year = row.get("Admission Year", str(date.today().year)).strip()
-                            try:
-                                admission_year = int(admission_year)
-                                if not (2000 <= admission_year <= date.today().year):
-                                    raise ValidationError(f"Admission year must be between 2000 and {date.today().year}")
-                            except ValueError:
-                                raise ValidationError("Admission year must be a number")
-                            
-                            # Validate current semester
-                            current_sem = row.get("Current Semester", "1").strip()
-                            try:
-                                current_sem = int(current_sem)
-                                if not (1 <= current_sem <= 8):
-                                    raise ValidationError("Current semester must be between 1 and 8")
-                            except ValueError:
-                                raise ValidationError("Current semester must be a number")
-                            
-                            # Validate normalized marks
-                            normalized_marks = row.get("PlusTwo Marks(normalized)", "0").strip()
-                            try:
-                                normalized_marks = int(normalized_marks)
-                                if not (0 <= normalized_marks <= 2000):
-                                    raise ValidationError("Normalized marks must be between 0 and 100")
-                            except ValueError:
-                                raise ValidationError("Normalized marks must be a number")
-                            
-                            # Create user if it doesn't exist
-                            username = admission_number
-                            password = dob.strftime('%d/%m/%y')
-                            
-                            # Check if user already exists
-                            user = None
-                            if User.objects.filter(username=username).exists():
-                                user = User.objects.get(username=username)
-                            else:
-                                # Create the user individually so save() method is called
-                                user = User.objects.create_user(
-                                    username=username,
-                                    email=email,
-                                    password=password  # This correctly hashes the password
-                                )
-                                user.groups.add(student_group)
-                                
-                            # Create the student individually to ensure save() method is called
-                            # This will handle the user relationship correctly
-                            student = Student(
-                                admission_number=admission_number,
-                                name=row["Name"].strip(),
-                                dob=dob,
-                                email=email,
-                                phone_number=phone_number or None,
-                                department=department,
-                                admission_category=admission_category,
-                                admission_year=admission_year,
-                                pathway=pathway,
-                                current_sem=current_sem,
-                                normalized_marks=normalized_marks,
-                                user=user  # Explicitly assign the user
-                            )
-                            student.save()  # This will call the save method and handle any cleanup
-                            success_count += 1
-                            
-                        except Exception as e:
-                            errors.append(f"Row {row_num}: {str(e)}")
-                            continue
-                    
-                    # Prepare result message
-                    result_msg = []
-                    if success_count:
-                        result_msg.append(f"Successfully created {success_count} students")
-                    if existing_count:
-                        result_msg.append(f"Skipped {existing_count} existing students")
-                    if errors:
-                        result_msg.append(f"{len(errors)} rows had errors")
-                        messages.warning(request, "<br>".join(result_msg))
-                        messages.error(request, "<br>".join(errors[:10]))  # Show first 10 errors
-                    elif success_count:
-                        messages.success(request, "<br>".join(result_msg))
-                    else:
-                        messages.warning(request, "No new students were created")
-                    
-                    return redirect("bulk_student_upload")
+                # The rows are created by the job worker; the page polls its progress
+                job = enqueue_job(BackgroundJob.IMPORT_STUDENTS, csv=decoded_file, filename=csv_file.name)
+                messages.info(request, f"{csv_file.name} was queued for import.")
+                return redirect(f"{reverse('bulk_student_upload')}?job={job.pk}")
             
             except Exception as e:
                 messages.error(request, f"Error processing file: {str(e)}")
@@ -1855,6 +1693,10 @@ def promote_students(request):
             count = students.count()
 
             if count > 0:
+                # Preferences are kept until promotion so late submissions can
+                # still be inserted into the semester's allotment
+                CoursePreference.objects.filter(student__in=students).delete()
+
                 # Increment semester for all matching students
                 for student in students:
                     student.current_sem += 1
@@ -1918,11 +1760,15 @@ def student_edit(request, student_id):
 def student_delete(request, student_id):
     """Delete a student without confirmation page."""
     student = get_object_or_404(Student, id=student_id)
-    
-    if student.user is not None:
-        student.user.delete()  # Delete associated user account
-        
-    student.delete()  # Delete student record
+
+    with transaction.atomic():
+        # Hand the student's seats to the next students on the batch waitlists
+        withdraw_student(student)
+
+        if student.user is not None:
+            student.user.delete()  # Delete associated user account
+
+        student.delete()  # Delete student record
     messages.success(request, "Student deleted successfully!")  # Success message
     return redirect('manage_students')  # Redirect to student list page
 
@@ -2046,7 +1892,9 @@ def hod_student_delete(request, student_id):
     """ Delete a student via AJAX request """
     if request.method == "POST":
         student = get_object_or_404(Student, id=student_id)
-        student.delete()
+        with transaction.atomic():
+            withdraw_student(student)
+            student.delete()
         return JsonResponse({"success": True})
     
     return JsonResponse({"success": False, "error": "Invalid request method"})
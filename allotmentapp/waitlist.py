@@ -0,0 +1,86 @@
+"""
+Waitlist promotion for seats that free up after an allotment.
+
+save_allocation() stores, for every batch, the students who wanted it for a
+paper but found it full, in the order the allocation reached them. When a
+seat is released the first eligible entry is promoted with one indexed lookup
+on (batch, position). A promoted student who moves out of another batch frees
+that seat in turn, so promotion cascades only along the chain of moves.
+"""
+from django.db import transaction
+from django.db.models import Count, F
+
+from .models import Batch, BatchWaitlist, CourseAllotment
+
+
+@transaction.atomic
+def fill_vacancies(batch_ids):
+    """Fill free seats in the given batches from their waitlists; returns the number of promotions"""
+    promoted = 0
+    pending = list(batch_ids)
+    while pending:
+        batch = Batch.objects.select_for_update().select_related('course').filter(pk=pending.pop()).first()
+        if batch is None or not batch.status:
+            continue
+
+        while batch.seats_available > 0:
+            entry = BatchWaitlist.objects.filter(batch=batch).order_by('position').select_related('student').first()
+            if entry is None:
+                break
+            entry.delete()
+
+            # A student holding any part of the course, for any paper, keeps it
+            student = entry.student
+            if student.status != 1 or CourseAllotment.objects.filter(
+                student=student, batch__course_id=batch.course_id, batch__year=batch.year
+            ).exists():
+                continue
+
+            current = CourseAllotment.objects.filter(
+                student=student,
+                paper_no=entry.paper_no,
+                batch__course__semester=batch.course.semester,
+                batch__year=batch.year
+            ).first()
+            if current:
+                vacated = current.batch_id
+                current.batch = batch
+                current.save(update_fields=['batch'])
+                Batch.objects.filter(pk=vacated).update(seats_taken=F('seats_taken') - 1)
+                pending.append(vacated)
+            else:
+                CourseAllotment.objects.create(
+                    student=student, batch=batch, paper_no=entry.paper_no, run_id=entry.run_id
+                )
+            Batch.objects.filter(pk=batch.pk).update(seats_taken=F('seats_taken') + 1)
+            batch.seats_taken += 1
+
+            # The new seat is better than every batch listed after it
+            BatchWaitlist.objects.filter(
+                student=student,
+                paper_no=entry.paper_no,
+                preference_rank__gt=entry.preference_rank
+            ).delete()
+            promoted += 1
+
+    return promoted
+
+
+@transaction.atomic
+def release_allotments(allotments):
+    """Delete a CourseAllotment queryset, free its seats and refill them from the waitlists"""
+    released = {
+        row['batch_id']: row['count']
+        for row in allotments.order_by().values('batch_id').annotate(count=Count('id'))
+    }
+    allotments.delete()
+    for batch_id, count in released.items():
+        Batch.objects.filter(pk=batch_id).update(seats_taken=F('seats_taken') - count)
+    return fill_vacancies(released)
+
+
+@transaction.atomic
+def withdraw_student(student):
+    """Take a leaving student off every waitlist and pass their seats on"""
+    BatchWaitlist.objects.filter(student=student).delete()
+    return release_allotments(CourseAllotment.objects.filter(student=student))
@@ -0,0 +1,142 @@
+"""
+What-if evaluation of seat limit and quota scenarios.
+
+Every scenario is run by its own AllocationEngine over one shared
+AllocationSnapshot, so the cohort and its preferences are loaded once no
+matter how many scenarios are compared. Nothing is written to the database.
+
+A scenario is a dict such as::
+
+    {
+        "name": "More MDC seats",
+        "seat_limits": {"KU1MDCENG101": 80},
+        "quotas": {"Physics": {"strength": 60, "department_quota_percentage": 25}}
+    }
+
+Seat limits are keyed by course code and quotas by department name; any
+AllocationSettings field left out keeps its current value.
+"""
+import time
+
+from django.core.exceptions import ValidationError
+
+from .allocation import AllocationEngine, get_allocation_phases
+from .models import AllocationSettings, Department
+
+QUOTA_FIELDS = (
+    'strength',
+    'department_quota_percentage',
+    'general_quota_percentage',
+    'sc_st_quota_percentage',
+    'other_quota_percentage',
+)
+
+
+def get_scenario_seat_limits(snapshot, scenario):
+    """{course_id: seat_limit} for a scenario's course code overrides"""
+    course_ids = {batch.course_code: batch.course_id for batch in snapshot.batches.values()}
+    seat_limits = {}
+    for course_code, seat_limit in scenario.get('seat_limits', {}).items():
+        if course_code not in course_ids:
+            raise ValidationError(f"Unknown course code '{course_code}'")
+        if int(seat_limit) < 1:
+            raise ValidationError(f"Seat limit for {course_code} must be at least 1")
+        seat_limits[course_ids[course_code]] = int(seat_limit)
+    return seat_limits
+
+
+def get_scenario_settings(snapshot, scenario, department_ids):
+    """Unsaved AllocationSettings list with a scenario's quota overrides applied"""
+    quotas = scenario.get('quotas', {})
+    unknown = [name for name in quotas if name not in department_ids]
+    if unknown:
+        raise ValidationError(f"Unknown department(s): {', '.join(unknown)}")
+
+    overrides = {department_ids[name]: values for name, values in quotas.items()}
+    settings = []
+    for setting in snapshot.settings:
+        settings.append(AllocationSettings(
+            department_id=setting.department_id,
+            **{field: getattr(setting, field) for field in QUOTA_FIELDS}
+        ))
+    # Departments without saved settings are added after the existing ones
+    existing = {setting.department_id for setting in settings}
+    for department_id in overrides:
+        if department_id not in existing:
+            settings.append(AllocationSettings(department_id=department_id))
+
+    for setting in settings:
+        values = overrides.get(setting.department_id)
+        if values:
+            for field, value in values.items():
+                if field not in QUOTA_FIELDS:
+                    raise ValidationError(f"Unknown quota field '{field}'")
+                setattr(setting, field, int(value))
+            setting.clean()
+    return settings
+
+
+def score_allocation(engine):
+    """Fill rate, first-preference satisfaction and unallocated counts of a run"""
+    snapshot = engine.snapshot
+    ranking = engine.ranking
+
+    capacity = filled = 0
+    for batch in snapshot.batches.values():
+        if batch.status and batch.semester == snapshot.semester and batch.year == snapshot.academic_year:
+            capacity += engine.seat_limits[batch.id]
+            filled += engine.seats_taken[batch.id]
+
+    papers = [paper_no for kind, paper_nos in get_allocation_phases(snapshot.semester) for paper_no in paper_nos]
+    requested = sum(
+        1 for index in range(len(snapshot.students)) for paper_no in papers
+        if ranking.preferences_for(index, paper_no)
+    )
+    first_choice = 0
+    for student_id, batch_id, paper_no in engine.allotments:
+        listed = ranking.preferences_for(ranking.positions[student_id], paper_no)
+        if listed and listed[0] == batch_id:
+            first_choice += 1
+
+    unallocated_papers = 0
+    unallocated_students = 0
+    for held in engine.allotted_papers:
+        missing = sum(1 for paper_no in papers if paper_no not in held)
+        unallocated_papers += missing
+        unallocated_students += 1 if missing else 0
+
+    return {
+        'fill_rate': round(filled / capacity * 100, 2) if capacity else 0,
+        'first_preference_rate': round(first_choice / requested * 100, 2) if requested else 0,
+        'unallocated_students': unallocated_students,
+        'unallocated_papers': unallocated_papers,
+    }
+
+
+def evaluate_scenarios(snapshot, scenarios):
+    """
+    Run every scenario against one snapshot.
+    The current seat limits and settings are always evaluated first as 'Current'.
+    """
+    department_ids = dict(Department.objects.values_list('name', 'id'))
+    prepared = [('Current', None, None)]
+    for number, scenario in enumerate(scenarios, start=1):
+        name = scenario.get('name') or f"Scenario {number}"
+        try:
+            prepared.append((
+                name,
+                get_scenario_seat_limits(snapshot, scenario),
+                get_scenario_settings(snapshot, scenario, department_ids),
+            ))
+        except ValidationError as e:
+            raise ValidationError(f"{name}: {'; '.join(e.messages)}")
+
+    results = []
+    for name, seat_limits, settings in prepared:
+        started = time.perf_counter()
+        engine = AllocationEngine(snapshot, seat_limits=seat_limits, settings=settings).run()
+        result = score_allocation(engine)
+        result['name'] = name
+        result['seconds'] = round(time.perf_counter() - started, 3)
+        results.append(result)
+    return results
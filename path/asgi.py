@@ -14,3 +14,11 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'path.settings')
 
 application = get_asgi_application()
+
+# Run background jobs inside the server so their allocation events can be streamed
+from django.conf import settings  # noqa: E402
+
+if settings.JOB_WORKER_IN_PROCESS:
+    from allotmentapp.jobqueue import start_worker_thread  # noqa: E402
+
+    start_worker_thread()
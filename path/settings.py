@@ -132,6 +132,16 @@ STATICFILES_DIRS = [
 # Directory for collected static files (when using `collectstatic`)
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 
+# Decision logs written by allocation runs, one file per run
+ALLOCATION_LOG_DIR = os.path.join(BASE_DIR, 'allocation_logs')
+
+# Files written by background jobs, such as allotment exports
+JOB_OUTPUT_DIR = os.path.join(BASE_DIR, 'job_output')
+
+# Run background jobs on a thread of the ASGI server instead of `run_jobs`, so
+# the allotment pages can stream live allocation events from it
+JOB_WORKER_IN_PROCESS = False
+
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field